@@ -10,6 +10,7 @@ if current_dir not in sys.path:
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 from flask import (
     Flask,
+    Request,
     render_template,
     request,
     redirect,
@@ -19,6 +20,8 @@ from flask import (
     make_response,
     session,
     send_from_directory,
+    abort,
+    Response,
 )
 from flask_cors import CORS
 from asgiref.wsgi import WsgiToAsgi
@@ -35,12 +38,14 @@ import re
 import requests
 import json
 import uuid
+import zipfile
 import threading
 import numpy as np
 import onnxruntime as ort
 import cloudinary
 import cloudinary.uploader
 from io import BytesIO
+from urllib.parse import urlparse, parse_qs
 from PIL import Image
 from collections import OrderedDict, deque
 from dotenv import load_dotenv
@@ -55,19 +60,66 @@ from reportlab.platypus import (
     Table,
     TableStyle,
 )
+from sqlalchemy import delete, select, update
 from werkzeug.utils import secure_filename
 from functools import wraps
-from models import user_db, User, db, Feedback
+from models import user_db, User, db, Feedback, sync_schema, migrate_users_if_needed
 from user_data import user_data, QUESTIONNAIRE
-from utils import get_weather_data, get_llm_recommendation
+from utils import get_weather_data, get_llm_recommendation, weather_cache
 from location import location_bp, get_ip_geolocation, reverse_geocode
-from overlay_utils import highlight_infection
-from observability import get_drift_report_html, get_performance_report_html
+from overlay_utils import (
+    DISPATCHER,
+    MIME_TYPES,
+    OVERLAY_FORMAT,
+    lesion_stats_for_file,
+    OVERLAY_MODES,
+    compute_cam,
+    pack_cam,
+    unpack_cam,
+    cam_digest,
+    read_image,
+    render_highlight,
+)
+from highlight_cache import HighlightCache
+from observability import (
+    REPORT_KINDS,
+    get_latest_snapshot,
+    is_generating,
+    report_is_stale,
+    request_report,
+    start_report_scheduler,
+)
+from feedback_queries import (
+    WINDOWS,
+    CONFIDENCE_BANDS,
+    admin_page,
+    count_admin_rows,
+    parse_admin_filters,
+    resolve_window,
+)
+from reference_stats import get_reference_stats
+from image_stats import compute_image_stats, pack_image_stats
+from calibration import get_calibration_summary, pack_probabilities
+from drift_aggregates import backfill_aggregates, discount_feedback, get_drift_summary
+from storage import DeletionQueue, get_storage, public_id_from_url
+from weather_prefetch import WeatherPrefetcher
+from recommendation_cache import (
+    RecommendationCache,
+    generalize_recommendation,
+    personalize_recommendation,
+    recommendation_key,
+)
+from class_names import CLASS_NAMES
+from recommendation_templates import render_base_recommendation
+from zip_ingest import classify_archive, manifest_csv
 
 load_dotenv()
 
 USERNAME_PATTERN = re.compile(r"^[A-Za-z0-9]+$")
 
+# ZIP ingestion limits (archives of field photos for bulk prediction)
+ZIP_MAX_CONTENT_LENGTH = int(os.getenv("ZIP_MAX_CONTENT_LENGTH", 128 * 1024 * 1024))
+
 # CLIP Microservice Configuration
 CLIP_VERIFY_URL = os.getenv("CLIP_VERIFY_URL", "http://127.0.0.1:8000/verify-crop/")
 
@@ -92,11 +144,28 @@ def get_current_user_weather():
             location_query = f"{current_user.latitude},{current_user.longitude}"
         elif current_user.manual_location:
             location_query = current_user.manual_location
+        weather_prefetcher.touch(current_user.id, location_query)
 
-    return get_weather_data(location=location_query)
+    # Never waits on WeatherAPI: the prefetcher keeps active users' locations warm, and on a
+    # cold cache the weather saved with the user's location is used until the fetch lands
+    weather = weather_cache.peek(location_query)
+    if weather is None and current_user.is_authenticated:
+        weather = current_user.weather_data or None
+    return weather
+
+
+class UploadRequest(Request):
+    """Request class that allows larger bodies on the ZIP ingestion route only."""
+
+    @property
+    def max_content_length(self):
+        if self.path == "/predict-zip":
+            return ZIP_MAX_CONTENT_LENGTH
+        return super().max_content_length
 
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app, supports_credentials=True)
 
 # Thread-safe lock for model inference (sequential processing constraint)
@@ -114,6 +183,26 @@ db.init_app(app)
 # Create tables in app context
 with app.app_context():
     db.create_all()
+    sync_schema()
+    migrate_users_if_needed(os.path.join(current_dir, "users.json"))
+    backfill_aggregates()
+    get_reference_stats()  # Parse the reference dataset once, before the first dashboard view
+
+# Evidently reports are regenerated in a background process and served from disk
+if os.getenv("REPORT_SCHEDULER_ENABLED", "true").lower() == "true":
+    start_report_scheduler(app)
+
+# Uploaded images are deleted in batches by a background thread, with retries
+deletion_queue = DeletionQueue(get_storage())
+deletion_queue.start()
+
+# Weather for recently active users is refreshed in the background before it expires
+weather_prefetcher = WeatherPrefetcher(weather_cache)
+if os.getenv("WEATHER_PREFETCH_ENABLED", "true").lower() == "true":
+    weather_prefetcher.start()
+
+# Generated advice is shared between users with the same disease, conditions, region and answers
+recommendation_cache = RecommendationCache()
 
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-key-change-in-production")
 app.config["UPLOAD_FOLDER"] = os.path.join(current_dir, "static", "uploads")
@@ -141,6 +230,110 @@ os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 os.makedirs("data", exist_ok=True)
 
+# Overlays are rendered lazily on first view and kept in a bounded on-disk cache
+highlight_cache = HighlightCache(
+    os.path.join(app.config["UPLOAD_FOLDER"], "highlighted"),
+    max_entries=int(os.getenv("HIGHLIGHT_CACHE_MAX_ENTRIES", 500)),
+    max_bytes=int(os.getenv("HIGHLIGHT_CACHE_MAX_BYTES", 200 * 1024 * 1024)),
+)
+
+
+def overlay_labels(label):
+    """Drawable classes from a label or list of labels, de-duplicated and capped at OVERLAY_TOP_K."""
+    labels = [label] if isinstance(label, str) else list(label or [])
+    labels = [name for name in dict.fromkeys(labels) if DISPATCHER.get(name) is not None]
+    return labels[:OVERLAY_TOP_K]
+
+
+def highlight_url_for(filename, label, cam_token=None):
+    """
+    Returns the lazy overlay URL for an upload, or None when there is nothing to highlight.
+    `label` may be a list of classes (e.g. the top-k predictions) to overlay together.
+    """
+    labels = overlay_labels(label)
+    if not labels:
+        return None
+    params = {"label": labels}
+    if cam_token:
+        params["cam"] = cam_token
+        if OVERLAY_MODE != "heuristic":
+            params["mode"] = OVERLAY_MODE
+    return url_for("highlighted_file", filename=filename, **params)
+
+
+def resolve_highlight(filename, label, mode="heuristic", cam_token=None):
+    """
+    Returns (path, data) for the rendered overlay of an upload, rendering it on a cache miss.
+    `data` holds the freshly encoded bytes on a miss and is None on a cache hit.
+    `label` may be a list of classes, which are drawn from one shared HSV lookup.
+    """
+    labels = overlay_labels(label)
+    filename = secure_filename(os.path.basename(filename or ""))
+    if not filename or not labels:
+        return None, None
+
+    source_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    if not os.path.exists(source_path):
+        return None, None
+
+    cam = unpack_cam(cam_token) if cam_token else None
+    if mode not in OVERLAY_MODES or cam is None:
+        mode = "heuristic"
+
+    def render():
+        image = read_image(source_path)
+        if image is None:
+            return None
+        return render_highlight(image, labels, mode=mode, cam=cam)
+
+    suffix = "" if mode == "heuristic" else f"_{mode}_{cam_digest(cam_token)}"
+    return highlight_cache.get_or_render(highlight_cache_name(filename, labels, suffix, OVERLAY_FORMAT), render)
+
+
+def highlight_cache_name(filename, labels, suffix, extension):
+    """Cache entry name for an upload and its overlay classes."""
+    base = os.path.splitext(filename)[0]
+    label_slug = "+".join(name.lower().replace(" ", "_") for name in labels)
+    return f"{label_slug}_{base}{suffix}.{extension}"
+
+
+def remember_upload(feedback_id, filename):
+    """Records in the signed session that this caller uploaded `filename` as `feedback_id`."""
+    uploads = dict(session.get("uploads", {}))
+    uploads[feedback_id] = filename
+    # Keep the cookie small: a bulk upload is at most MAX_UPLOADS_IN_SESSION files
+    session["uploads"] = dict(list(uploads.items())[-MAX_UPLOADS_IN_SESSION:])
+
+
+def is_own_upload(feedback_id, filename):
+    return bool(feedback_id) and session.get("uploads", {}).get(feedback_id) == filename
+
+
+def safe_overlay_url(url):
+    """Keeps only same-origin /highlights/ and /static/ paths; anything else becomes ''."""
+    parsed = urlparse(url or "")
+    if parsed.scheme or parsed.netloc or not parsed.path.startswith(("/highlights/", "/static/")):
+        return ""
+    return url
+
+
+def lesion_stats_url_for(highlighted_url, feedback_id=None):
+    """Derives the lesion statistics URL from a lazy overlay URL, or None for other URLs."""
+    parsed = urlparse(highlighted_url or "")
+    if not parsed.path.startswith("/highlights/"):
+        return None
+    query = parse_qs(parsed.query)
+    if query.get("mode", ["heuristic"])[0] != "heuristic":
+        # CAM overlays are raster-only
+        return None
+    label = query.get("label", [None])[0]
+    return url_for(
+        "highlight_stats",
+        filename=parsed.path.rsplit("/", 1)[-1],
+        label=label,
+        feedback_id=feedback_id,
+    )
+
 
 # Admin authentication helper
 def admin_required(f):
@@ -162,24 +355,8 @@ def admin_required(f):
     return decorated_function
 
 
-# Disease labels
-CLASS_NAMES = {
-    0: "Aphid",
-    1: "Black Rust",
-    2: "Blast",
-    3: "Brown Rust",
-    4: "Common Root Rot",
-    5: "Fusarium Head Blight",
-    6: "Healthy",
-    7: "Leaf Blight",
-    8: "Mildew",
-    9: "Mite",
-    10: "Septoria",
-    11: "Smut",
-    12: "Stem fly",
-    13: "Tan spot",
-    14: "Yellow Rust",
-}
+# Recorded on every prediction so drift can be tracked per model
+MODEL_VERSION = os.getenv("MODEL_VERSION", "convnext_tiny_clean_int8")
 
 # Load ONNX model
 try:
@@ -193,6 +370,19 @@ except Exception as e:
     print(f"Error loading ONNX model: {e}")
     ort_session = None
 
+# Class activation maps: models exported by train.py also output the final feature map,
+# and the classifier weights saved next to them turn it into a heatmap per class.
+cam_weights = None
+cam_head_path = os.path.join(current_dir, "onnx_models", "convnext_tiny_cam_head.npz")
+if ort_session is not None and len(ort_session.get_outputs()) > 1 and os.path.exists(cam_head_path):
+    cam_weights = np.load(cam_head_path)["weight"]
+    print(f"Class activation maps enabled using: {cam_head_path}")
+
+OVERLAY_MODE = os.getenv("OVERLAY_MODE", "heuristic")
+# Number of top predictions offered as a combined overlay on the result page
+OVERLAY_TOP_K = int(os.getenv("OVERLAY_TOP_K", 3))
+MAX_UPLOADS_IN_SESSION = 10
+
 
 def preprocess_image(image):
     # Resize to 224x224
@@ -220,6 +410,24 @@ def preprocess_image(image):
     return img_data
 
 
+def cam_token_for(ort_outs, class_index):
+    """Builds the packed CAM for the predicted class from the feature-map output, if the model has one."""
+    if cam_weights is None or len(ort_outs) < 2:
+        return None
+    return pack_cam(compute_cam(ort_outs[1][0], cam_weights[class_index]))
+
+
+def run_batch_inference(batch):
+    """Runs the ONNX model on a stacked (N, 3, 224, 224) batch and returns softmax probabilities."""
+    with model_lock:
+        ort_inputs = {ort_session.get_inputs()[0].name: batch}
+        # Only the logits are needed here, so skip fetching the feature map
+        outputs = ort_session.run([ort_session.get_outputs()[0].name], ort_inputs)[0]
+
+    exp_outputs = np.exp(outputs - np.max(outputs, axis=1, keepdims=True))
+    return exp_outputs / np.sum(exp_outputs, axis=1, keepdims=True)
+
+
 # Authentication Routes
 
 
@@ -259,8 +467,12 @@ def signup():
             flash("Username can only contain letters and numbers", "danger")
         elif user_db.get_user_by_username(username):
             flash("Username already exists", "danger")
+        elif email and user_db.get_user_by_email(email):
+            flash("Email already registered", "danger")
+        elif user_db.add_user(username, password, email) is None:
+            # Lost a race with a concurrent signup for the same username or email
+            flash("Username or email already registered", "danger")
         else:
-            user_db.add_user(username, password, email)
             flash("Registration successful! Please log in.", "success")
             return redirect(url_for("login"))
 
@@ -277,12 +489,36 @@ def logout():
 # Admin Routes
 
 
+ADMIN_THUMBNAIL = "c_fill,w_160,h_160,q_auto,f_auto"
+
+
+@app.template_filter("thumbnail")
+def thumbnail_url(image_url):
+    """Cloudinary URL -> small, auto-format thumbnail of it; local uploads are served as-is."""
+    if not image_url.startswith("http"):
+        return "/uploads/" + image_url
+    if "/image/upload/" in image_url:
+        return image_url.replace("/image/upload/", f"/image/upload/{ADMIN_THUMBNAIL}/", 1)
+    return image_url
+
+
 @app.route("/admin")
 @admin_required
 def admin_panel():
-    # Show all images so admin can monitor everything and delete bad data
-    feedbacks = Feedback.query.order_by(Feedback.created_at.desc()).all()
-    return render_template("admin.html", feedbacks=feedbacks, current_user=current_user)
+    # Paged and filtered server-side so the panel stays fast as feedback grows
+    filters = parse_admin_filters(request.args)
+    feedbacks, next_cursor = admin_page(filters, request.args.get("after"))
+    return render_template(
+        "admin.html",
+        feedbacks=feedbacks,
+        total=count_admin_rows(filters),
+        filters=filters,
+        next_cursor=next_cursor,
+        is_first_page=not request.args.get("after"),
+        class_names=[CLASS_NAMES[i] for i in range(len(CLASS_NAMES))],
+        confidence_bands=list(CONFIDENCE_BANDS),
+        current_user=current_user,
+    )
 
 
 @app.route("/admin/observability")
@@ -294,13 +530,118 @@ def admin_observability():
 @app.route("/admin/observability/report/drift")
 @admin_required
 def observability_report_drift():
-    return get_drift_report_html()
+    """Drift summary computed from the incrementally maintained aggregates."""
+    window = request.args.get("window")
+    days = max(1, WINDOWS[window].days) if window in WINDOWS else None
+    return render_template(
+        "drift_summary.html",
+        summary=get_drift_summary(days=days),
+        window=window if window in WINDOWS else None,
+        windows=list(WINDOWS),
+    )
+
+
+@app.route("/admin/observability/api/drift")
+@admin_required
+def observability_api_drift():
+    """
+    Drift metrics as JSON for the dashboard and alerting: PSI, chi-square and Jensen-Shannon
+    for predictions, KS and Wasserstein for confidence and the input image features.
+    Cheap enough to poll every minute. `24h` is the last 24 hours; longer windows are whole UTC days.
+    """
+    window = request.args.get("window")
+    model_version = request.args.get("model_version")
+    if window in WINDOWS and WINDOWS[window].days < 1:
+        since, _ = resolve_window(window)
+        summary = get_drift_summary(model_version=model_version, since=since)
+    else:
+        days = WINDOWS[window].days if window in WINDOWS else None
+        summary = get_drift_summary(days=days, model_version=model_version)
+    if summary is None:
+        return jsonify({"error": "Reference dataset not found"}), 404
+    summary["window"] = window if window in WINDOWS else None
+    results = [*summary["features"].values(), *summary["image_features"].values()]
+    summary["drifted"] = any(result.get("drifted", False) for result in results)
+    return jsonify(summary)
+
+
+@app.route("/admin/observability/api/calibration")
+@admin_required
+def observability_api_calibration():
+    """
+    Calibration analytics from the stored probability vectors: entropy distribution for all
+    predictions, reliability diagram, ECE and top-k accuracy for verified ones.
+    """
+    since, until = resolve_window(request.args.get("window"))
+    class_names = [CLASS_NAMES[i] for i in range(len(CLASS_NAMES))]
+    return jsonify(get_calibration_summary(class_names, since=since, until=until))
+
+
+@app.route("/admin/observability/api/caches")
+@admin_required
+def observability_api_caches():
+    """Hit/miss counters of the in-process caches."""
+    return jsonify(
+        {
+            "weather": weather_cache.metrics(),
+            "weather_prefetch": weather_prefetcher.metrics(),
+            "recommendations": recommendation_cache.metrics(),
+        }
+    )
+
+
+def serve_report_snapshot(kind):
+    """
+    Serves the latest pre-generated Evidently report instantly. `?window=24h|7d|30d` restricts
+    it to recent feedback and `?refresh=1` queues a regeneration in the background; until the
+    first snapshot exists a placeholder is shown.
+    """
+    window = request.args.get("window")
+    window = window if window in WINDOWS else None
+    path, generated_at = get_latest_snapshot(kind, window)
+    if request.args.get("refresh") == "1" or (window and report_is_stale(kind, window)):
+        request_report(kind, app.config["SQLALCHEMY_DATABASE_URI"], window)
+    elif path is None:
+        request_report(kind, app.config["SQLALCHEMY_DATABASE_URI"])
+    if path is None:
+        return (
+            '<meta http-equiv="refresh" content="5">'
+            "<h3>Report is being generated. This page will reload automatically.</h3>"
+        )
+
+    response = send_from_directory(os.path.dirname(path), os.path.basename(path))
+    response.headers["X-Report-Generated-At"] = generated_at.isoformat()
+    return response
+
+
+@app.route("/admin/observability/report/drift/full")
+@admin_required
+def observability_report_drift_full():
+    return serve_report_snapshot("drift")
 
 
 @app.route("/admin/observability/report/performance")
 @admin_required
 def observability_report_performance():
-    return get_performance_report_html()
+    return serve_report_snapshot("performance")
+
+
+@app.route("/admin/observability/report/<kind>/status")
+@admin_required
+def observability_report_status(kind):
+    """Generation timestamp of the latest snapshot and whether a refresh is running."""
+    if kind not in REPORT_KINDS:
+        abort(404)
+    window = request.args.get("window")
+    _, generated_at = get_latest_snapshot(kind, window)
+    return jsonify(
+        {
+            "kind": kind,
+            "window": window if window in WINDOWS else None,
+            "generated_at": generated_at.isoformat() + "Z" if generated_at else None,
+            "generating": is_generating(kind, window),
+        }
+    )
 
 
 @app.route("/admin/observability/download-reference")
@@ -317,22 +658,12 @@ def observability_download_reference():
 @admin_required
 def admin_delete(feedback_id):
     feedback = Feedback.query.get_or_404(feedback_id)
+    public_id = public_id_from_url(feedback.image_url)
 
-    # 1. Attempt to delete from Cloudinary if it's a URL
-    if feedback.image_url and feedback.image_url.startswith("http"):
-        try:
-            # Extract public_id from cloudinary URL
-            # Format: .../folder/public_id.jpg
-            public_id = feedback.image_url.split("/")[-1].split(".")[0]
-            # If it's in a folder, we might need 'wheat_disease/' prefix
-            cloudinary.uploader.destroy(f"wheat_disease/{public_id}")
-            app.logger.info(f"Deleted Cloudinary resource: {public_id}")
-        except Exception as e:
-            app.logger.error(f"Failed to delete from Cloudinary: {e}")
-
-    # 2. Delete from Neon PostgreSQL via SQLAlchemy
+    # Delete from Neon PostgreSQL via SQLAlchemy; the Cloudinary image is removed in the background
     db.session.delete(feedback)
     db.session.commit()
+    deletion_queue.enqueue([public_id])
 
     flash("Entry and image deleted successfully.", "warning")
     return redirect(url_for("admin_panel"))
@@ -348,6 +679,36 @@ def admin_verify(feedback_id):
     return redirect(url_for("admin_panel"))
 
 
+@app.route("/admin/bulk", methods=["POST"])
+@admin_required
+def admin_bulk():
+    """Verifies or deletes all selected rows with a single UPDATE/DELETE ... WHERE id IN (...)."""
+    ids = request.form.getlist("ids")
+    action = request.form.get("action")
+    if not ids or action not in ("verify", "delete"):
+        flash("Select at least one image.", "info")
+        return redirect(request.referrer or url_for("admin_panel"))
+
+    if action == "verify":
+        result = db.session.execute(
+            update(Feedback).where(Feedback.id.in_(ids)).values(is_verified=True)
+        )
+        db.session.commit()
+        flash(f"{result.rowcount} predictions marked as verified.", "success")
+    else:
+        image_urls = db.session.execute(
+            select(Feedback.image_url).where(Feedback.id.in_(ids))
+        ).scalars().all()
+        discount_feedback(ids)
+        result = db.session.execute(
+            delete(Feedback).where(Feedback.id.in_(ids)), execution_options={"synchronize_session": False}
+        )
+        db.session.commit()
+        deletion_queue.enqueue([public_id_from_url(url) for url in image_urls])
+        flash(f"{result.rowcount} entries deleted; their images are being removed.", "warning")
+    return redirect(request.referrer or url_for("admin_panel"))
+
+
 # Main Routes
 
 
@@ -394,7 +755,9 @@ def result():
         cloudinary_url = request.args.get("cloudinary_url") or (
             feedback.image_url if feedback else ""
         )
-        highlighted_path = request.args.get("highlighted_url") or ""
+        highlighted_path = safe_overlay_url(request.args.get("highlighted_url"))
+        top_predictions = []
+        top_k_highlighted_path = ""
         image_path = cloudinary_url  # Fallback for template
 
         weather_data = (
@@ -410,6 +773,8 @@ def result():
             confidence = result_data.get("confidence", "N/A")
             image_path = result_data.get("image_path", "")
             highlighted_path = result_data.get("highlighted_path", "")
+            top_predictions = result_data.get("top_predictions", [])
+            top_k_highlighted_path = result_data.get("top_k_highlighted_path", "")
             cloudinary_url = result_data.get("cloudinary_url", "")
             cloudinary_error = result_data.get("cloudinary_error")
             weather_data = result_data.get("weather_data", {})
@@ -419,6 +784,8 @@ def result():
             confidence = "N/A"
             image_path = ""
             highlighted_path = ""
+            top_predictions = []
+            top_k_highlighted_path = ""
             cloudinary_url = ""
             cloudinary_error = None
             weather_data = {}
@@ -434,6 +801,9 @@ def result():
         confidence=confidence,
         image_path=image_path,
         highlighted_path=highlighted_path,
+        lesion_stats_url=lesion_stats_url_for(highlighted_path, feedback_id),
+        top_predictions=top_predictions,
+        top_k_highlighted_path=top_k_highlighted_path,
         cloudinary_url=cloudinary_url,
         cloudinary_error=cloudinary_error,
         feedback_id=feedback_id,
@@ -581,7 +951,7 @@ def predict():
                             )
                             # Purge from Cloudinary immediately
                             if public_id:
-                                cloudinary.uploader.destroy(public_id)
+                                deletion_queue.enqueue([public_id])
                             if "/static/samples/" not in filepath and os.path.exists(
                                 filepath
                             ):
@@ -656,23 +1026,38 @@ def predict():
                 predicted_class=predicted_label,
                 confidence=float(confidence_score),
                 is_correct=True,  # Default until user feedback
+                model_version=MODEL_VERSION,
+                image_stats=pack_image_stats(compute_image_stats(input_data[0])),
+                probabilities=pack_probabilities(probabilities),
             )
             db.session.add(new_feedback)
             db.session.commit()
+            remember_upload(new_feedback.id, os.path.basename(filepath))
 
             # Get weather data for current user if available
             weather_data = get_current_user_weather()
 
-            # Apply infection highlighting
-            highlighted_url = None
-            if predicted_label != "Healthy":
-                highlighted_filename = f"highlighted_{os.path.basename(filepath)}"
-                highlighted_path = os.path.join(
-                    app.config["UPLOAD_FOLDER"], highlighted_filename
-                )
-                if highlight_infection(filepath, predicted_label, highlighted_path):
-                    highlighted_url = f"/uploads/{highlighted_filename}"
-                    app.logger.info(f"Highlighted image saved to {highlighted_path}")
+            # Infection highlighting is rendered on first view of this URL
+            highlighted_url = highlight_url_for(
+                os.path.basename(filepath),
+                predicted_label,
+                cam_token=cam_token_for(ort_outs, int(predicted_class)),
+            )
+
+            # Top-k candidates share one overlay, drawn from a single HSV lookup
+            flat_probabilities = np.ravel(probabilities)
+            top_indices = np.argsort(flat_probabilities)[::-1][:OVERLAY_TOP_K]
+            top_predictions = [
+                {
+                    "label": CLASS_NAMES.get(int(index), "Unknown"),
+                    "confidence": f"{float(flat_probabilities[index]) * 100:.2f}%",
+                }
+                for index in top_indices
+            ]
+            top_k_highlighted_url = highlight_url_for(
+                os.path.basename(filepath),
+                [prediction["label"] for prediction in top_predictions],
+            )
 
             # Prepare response data
             image_url = f"/uploads/{os.path.basename(filepath)}"
@@ -685,6 +1070,8 @@ def predict():
                 "confidence": f"{confidence_score:.2f}%",
                 "image_url": image_url,
                 "highlighted_url": highlighted_url,
+                "top_predictions": top_predictions,
+                "top_k_highlighted_url": top_k_highlighted_url,
                 "cloudinary_url": cloudinary_url,
                 "cloudinary_error": cloudinary_error,
                 "feedback_id": new_feedback.id,
@@ -699,6 +1086,8 @@ def predict():
                 "confidence": f"{confidence_score:.2f}%",
                 "image_path": image_url,
                 "highlighted_path": highlighted_url,
+                "top_predictions": top_predictions,
+                "top_k_highlighted_path": top_k_highlighted_url,
                 "cloudinary_url": cloudinary_url,
                 "cloudinary_error": cloudinary_error,
                 "feedback_id": new_feedback.id,
@@ -831,23 +1220,24 @@ def predict_bulk():
                 predicted_label = CLASS_NAMES.get(predicted_class, "Unknown")
                 confidence_score = float(np.max(probabilities))
 
-                highlighted_url = None
-                if predicted_label != "Healthy":
-                    highlighted_filename = f"highlighted_{save_name}"
-                    highlighted_path = os.path.join(
-                        app.config["UPLOAD_FOLDER"], highlighted_filename
-                    )
-                    if highlight_infection(filepath, predicted_label, highlighted_path):
-                        highlighted_url = f"/uploads/{highlighted_filename}"
+                highlighted_url = highlight_url_for(
+                    save_name,
+                    predicted_label,
+                    cam_token=cam_token_for(ort_outs, predicted_class),
+                )
 
                 new_feedback = Feedback(
                     image_url=cloudinary_url,
                     predicted_class=predicted_label,
                     confidence=float(confidence_score * 100),
                     is_correct=True,
+                    model_version=MODEL_VERSION,
+                    image_stats=pack_image_stats(compute_image_stats(input_data[0])),
+                    probabilities=pack_probabilities(probabilities),
                 )
                 db.session.add(new_feedback)
                 db.session.commit()
+                remember_upload(new_feedback.id, save_name)
 
                 item["status"] = "completed"
                 item["label"] = predicted_label
@@ -883,6 +1273,54 @@ def predict_bulk():
         return jsonify({"error": "Failed to process bulk upload"}), 500
 
 
+@app.route("/predict-zip", methods=["POST"])
+@login_required
+def predict_zip():
+    """
+    Classifies every image inside an uploaded ZIP archive and returns a per-file manifest.
+    Members are decoded on a background thread and fed to the model in fixed-size batches.
+    Images are not uploaded to Cloudinary or recorded as feedback; this is a classification-only path.
+    """
+    try:
+        archive = request.files.get("archive") or request.files.get("file")
+        if archive is None or archive.filename == "":
+            return jsonify({"error": "No archive uploaded"}), 400
+        if not archive.filename.lower().endswith(".zip"):
+            return jsonify({"error": "Invalid file type. Please upload a ZIP archive."}), 400
+
+        manifest_format = (request.args.get("format") or request.form.get("format") or "json").lower()
+        if manifest_format not in ("json", "csv"):
+            return jsonify({"error": "Unsupported manifest format"}), 400
+
+        try:
+            results = classify_archive(
+                archive.stream, preprocess_image, run_batch_inference, CLASS_NAMES
+            )
+        except zipfile.BadZipFile:
+            return jsonify({"error": "Uploaded file is not a valid ZIP archive"}), 400
+
+        completed = sum(1 for r in results if r["status"] == "completed")
+        summary = {
+            "total": len(results),
+            "completed": completed,
+            "failed": len(results) - completed,
+        }
+
+        if manifest_format == "csv":
+            response = make_response(manifest_csv(results))
+            response.headers["Content-Type"] = "text/csv"
+            response.headers["Content-Disposition"] = (
+                f"attachment; filename={os.path.splitext(secure_filename(archive.filename))[0]}_manifest.csv"
+            )
+            return response
+
+        return jsonify({"success": True, "results": results, "summary": summary})
+
+    except Exception as e:
+        app.logger.error(f"Error in predict_zip: {str(e)}", exc_info=True)
+        return jsonify({"error": "Failed to process ZIP archive"}), 500
+
+
 @app.route("/update-location", methods=["POST"])
 @login_required
 def update_location():
@@ -917,7 +1355,7 @@ def update_location():
         current_user.latitude = lat
         current_user.longitude = lon
         current_user.weather_data = weather_data
-        user_db.save_users()
+        user_db.save_user(current_user._get_current_object())
 
         return jsonify(
             {
@@ -955,7 +1393,7 @@ def submit_questionnaire():
 
         # Store responses in user profile
         current_user.questionnaire_responses = form_data
-        user_db.save_users()
+        user_db.save_user(current_user._get_current_object())
 
         # Return success response with confirmation message
         return jsonify(
@@ -1064,7 +1502,7 @@ def update_answers():
 
         # Update user's responses
         current_user.questionnaire_responses.update(updated_responses)
-        user_db.save_users()
+        user_db.save_user(current_user._get_current_object())
 
         return jsonify({"success": True, "message": "Answers updated successfully."})
     except Exception as e:
@@ -1080,70 +1518,85 @@ def update_answers():
         )
 
 
+def build_recommendation_user_data(data):
+    """Assembles the disease, location, weather and questionnaire context sent to the LLM."""
+    # Get the most up-to-date weather for the user
+    weather_data = get_current_user_weather() or data.get("weather_data", {})
+    if isinstance(weather_data, str):
+        try:
+            weather_data = json.loads(weather_data)
+        except json.JSONDecodeError:
+            weather_data = {}
+
+    # Prepare location data
+    # Prioritize saved user location info
+    city = "Unknown"
+    region = "Unknown"
+    country = "IN"
+    loc = "0,0"
+
+    if current_user.weather_data and "location" in current_user.weather_data:
+        # WeatherAPI returns "City, Country" in location string
+        loc_parts = current_user.weather_data["location"].split(",")
+        city = loc_parts[0].strip()
+        if len(loc_parts) > 1:
+            country = loc_parts[-1].strip()
+
+    if current_user.latitude and current_user.longitude:
+        loc = f"{current_user.latitude},{current_user.longitude}"
+    elif current_user.manual_location:
+        loc = current_user.manual_location
+
+    # Prepare user data with proper structure for OpenAI API
+    user_data = {
+        "user_id": current_user.id,
+        "location": {
+            "city": city,
+            "region": region,
+            "country": country,
+            "loc": loc,
+            "timezone": "Asia/Kolkata",
+        },
+        "weather": {
+            "temp_c": weather_data.get("temperature", 25.0),
+            "humidity": weather_data.get("humidity", 60),
+            "condition": weather_data.get("conditions", "Clear"),
+            "wind_kph": weather_data.get("wind_speed", 10.0),
+            "precip_mm": weather_data.get("precipitation", 0.0),
+            "last_updated": weather_data.get("last_updated", "N/A"),
+        },
+        "questionnaire_answers": getattr(
+            current_user, "questionnaire_responses", {}
+        )
+        or {},
+        "crop_condition": (
+            "Healthy" if data.get("disease") == "Healthy" else "Affected"
+        ),
+        "disease_detected": data.get("disease", "None"),
+    }
+    return user_data
+
+
 @app.route("/get-recommendations", methods=["POST"])
 @login_required
 def get_recommendations():
     try:
         data = request.get_json()
-
-        # Get the most up-to-date weather for the user
-        weather_data = get_current_user_weather() or data.get("weather_data", {})
-        if isinstance(weather_data, str):
-            try:
-                weather_data = json.loads(weather_data)
-            except json.JSONDecodeError:
-                weather_data = {}
-
-        # Prepare location data
-        # Prioritize saved user location info
-        city = "Unknown"
-        region = "Unknown"
-        country = "IN"
-        loc = "0,0"
-
-        if current_user.weather_data and "location" in current_user.weather_data:
-            # WeatherAPI returns "City, Country" in location string
-            loc_parts = current_user.weather_data["location"].split(",")
-            city = loc_parts[0].strip()
-            if len(loc_parts) > 1:
-                country = loc_parts[-1].strip()
-
-        if current_user.latitude and current_user.longitude:
-            loc = f"{current_user.latitude},{current_user.longitude}"
-        elif current_user.manual_location:
-            loc = current_user.manual_location
-
-        # Prepare user data with proper structure for OpenAI API
-        user_data = {
-            "user_id": current_user.id,
-            "location": {
-                "city": city,
-                "region": region,
-                "country": country,
-                "loc": loc,
-                "timezone": "Asia/Kolkata",
-            },
-            "weather": {
-                "temp_c": weather_data.get("temperature", 25.0),
-                "humidity": weather_data.get("humidity", 60),
-                "condition": weather_data.get("conditions", "Clear"),
-                "wind_kph": weather_data.get("wind_speed", 10.0),
-                "precip_mm": weather_data.get("precipitation", 0.0),
-                "last_updated": weather_data.get("last_updated", "N/A"),
-            },
-            "questionnaire_answers": getattr(
-                current_user, "questionnaire_responses", {}
-            )
-            or {},
-            "crop_condition": (
-                "Healthy" if data.get("disease") == "Healthy" else "Affected"
-            ),
-            "disease_detected": data.get("disease", "None"),
-        }
+        user_data = build_recommendation_user_data(data)
 
         # Store user_data in session for export later
         session["last_user_data"] = user_data
 
+        cache_key = recommendation_key(user_data)
+        session["last_recommendation_key"] = cache_key
+        cached = recommendation_cache.get(cache_key)
+        if cached is not None:
+            cached = personalize_recommendation(cached, user_data)
+            session["last_recommendation"] = cached
+            session["last_image_path"] = data.get("image_path")
+            session["last_highlighted_path"] = data.get("highlighted_url")
+            return jsonify({"status": "success", "recommendation": cached, "cached": True})
+
         # Get recommendations from OpenAI
         try:
             from openai_integration import get_openai_recommendation
@@ -1151,6 +1604,9 @@ def get_recommendations():
             result = get_openai_recommendation(user_data)
 
             if result["status"] == "success":
+                recommendation_cache.put(
+                    cache_key, generalize_recommendation(result["recommendation"], user_data)
+                )
                 # Store recommendation in session for export
                 session["last_recommendation"] = result["recommendation"]
                 session["last_image_path"] = data.get("image_path")
@@ -1194,11 +1650,89 @@ def get_recommendations():
         )
 
 
+@app.route("/get-recommendations/stream", methods=["POST"])
+@login_required
+def stream_recommendations():
+    """
+    Streams the recommendation HTML as server-sent events while it is generated: an optional
+    `event: base` with the filled per-disease template, one `data:` event per generated chunk
+    (JSON-encoded text), then `event: done` or `event: error`. The response
+    headers, and so the session cookie, go out before the text exists, so the session only
+    keeps the cache key; the assembled text is stored in the recommendation cache for export.
+    """
+    data = request.get_json() or {}
+    user_data = build_recommendation_user_data(data)
+    cache_key = recommendation_key(user_data)
+    session["last_user_data"] = user_data
+    session["last_recommendation_key"] = cache_key
+    session.pop("last_recommendation", None)
+    session["last_image_path"] = data.get("image_path")
+    session["last_highlighted_path"] = data.get("highlighted_url")
+
+    def sse(payload, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+    def generate():
+        cached = recommendation_cache.get(cache_key)
+        if cached is not None:
+            yield sse(personalize_recommendation(cached, user_data))
+            yield sse({"cached": True}, "done")
+            return
+
+        from openai_integration import stream_openai_recommendation, stream_personalized_section
+
+        # With a prebuilt template for the disease the page is complete at once and only the
+        # farm-specific section is generated; otherwise the whole recommendation is streamed
+        base = render_base_recommendation(user_data)
+        if base is not None:
+            yield sse(base, "base")
+            chunks = stream_personalized_section(user_data)
+        else:
+            chunks = stream_openai_recommendation(user_data)
+
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse(chunk)
+        except Exception as e:
+            app.logger.error(f"Recommendation stream failed: {e}")
+            yield sse({"message": "Recommendation service currently unavailable. Please try again in a few moments."}, "error")
+            return
+
+        text = "".join(parts).strip()
+        if text and base is not None:
+            text = render_base_recommendation(user_data, personalized=text)
+        if text:
+            recommendation_cache.put(cache_key, generalize_recommendation(text, user_data))
+        yield sse({"cached": False}, "done")
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/export-report")
 @login_required
 def export_report():
     user_data = session.get("last_user_data")
-    recommendation = session.get("last_recommendation")
+    # Streamed recommendations are kept in the cache, with only their key in the session
+    # and the template-only version is used if the personalised section never completed
+    cached = recommendation_cache.get(session.get("last_recommendation_key", ""))
+    recommendation = (
+        session.get("last_recommendation")
+        or (personalize_recommendation(cached, user_data) if cached and user_data else None)
+        or (
+            render_base_recommendation(
+                user_data, personalized="<p>Farm-specific advice could not be generated.</p>"
+            )
+            if user_data
+            else None
+        )
+    )
     image_path = session.get("last_image_path")
     highlighted_path = session.get("last_highlighted_path")
 
@@ -1290,10 +1824,20 @@ def export_report():
         # Highlighted Image (OpenCV Processed)
         if highlighted_path:
             try:
-                high_filename = os.path.basename(highlighted_path)
-                full_highlight_path = os.path.join(app.root_path, "static", "uploads", high_filename)
+                parsed = urlparse(highlighted_path)
+                if parsed.path.startswith("/highlights/"):
+                    query = parse_qs(parsed.query)
+                    full_highlight_path, _ = resolve_highlight(
+                        parsed.path.rsplit("/", 1)[-1],
+                        query.get("label", [None])[0],
+                        mode=query.get("mode", ["heuristic"])[0],
+                        cam_token=query.get("cam", [None])[0],
+                    )
+                else:
+                    high_filename = os.path.basename(parsed.path)
+                    full_highlight_path = os.path.join(app.root_path, "static", "uploads", high_filename)
 
-                if os.path.exists(full_highlight_path):
+                if full_highlight_path and os.path.exists(full_highlight_path):
                     img = RLImage(full_highlight_path, width=240, height=180)
                     images_to_add.append([Paragraph("<b>AI Infection Highlighting</b>", styles["BodyText"]), img])
             except Exception as e:
@@ -1409,13 +1953,78 @@ def uploaded_file(filename):
     return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
 
 
+@app.route("/highlights/<filename>")
+def highlighted_file(filename):
+    """
+    Serves the infection overlay for an upload, rendering it in memory on the first request.
+    Repeating `label` overlays several classes at once. `mode` picks the heuristic overlay, the model CAM heatmap (`cam` query value) or both.
+    """
+    path, data = resolve_highlight(
+        filename,
+        request.args.getlist("label"),
+        mode=request.args.get("mode", "heuristic"),
+        cam_token=request.args.get("cam"),
+    )
+    if not path:
+        abort(404)
+    if data is None:
+        return send_from_directory(highlight_cache.directory, os.path.basename(path))
+
+    # Fresh render: respond with the encoded bytes directly instead of re-reading the file
+    response = make_response(data)
+    response.headers["Content-Type"] = MIME_TYPES.get(OVERLAY_FORMAT, "application/octet-stream")
+    return response
+
+
+@app.route("/highlights/<filename>/stats")
+def highlight_stats(filename):
+    """
+    Returns lesion polygons, bounding boxes, count and infected-area percentage as JSON
+    so the client can draw the overlay as SVG over the original image.
+    Computed once per upload and label and kept in the overlay cache. When `feedback_id` is the
+    caller's own upload, the count and area are stored on that Feedback row.
+    """
+    labels = overlay_labels(request.args.get("label"))
+    filename = secure_filename(os.path.basename(filename or ""))
+    source_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    if not labels or not filename or not os.path.exists(source_path):
+        abort(404)
+
+    def render():
+        stats = lesion_stats_for_file(source_path, labels[0])
+        return json.dumps(stats).encode() if stats is not None else None
+
+    path, data = highlight_cache.get_or_render(highlight_cache_name(filename, labels, "_stats", "json"), render)
+    if not path:
+        abort(404)
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    stats = json.loads(data)
+
+    feedback_id = request.args.get("feedback_id")
+    if is_own_upload(feedback_id, filename):
+        try:
+            feedback = db.session.get(Feedback, feedback_id)
+            if feedback and feedback.lesion_count is None and feedback.predicted_class == labels[0]:
+                feedback.lesion_count = stats["lesion_count"]
+                feedback.infected_area_pct = stats["infected_area_pct"]
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Failed to store lesion stats: {e}")
+
+    return jsonify(stats)
+
+
 # Create ASGI application
 asgi_app = WsgiToAsgi(app)
 
 if __name__ == "__main__":
     # Create admin user if not exists
-    if not user_db.get_user_by_username("admin"):
-        admin = user_db.add_user("admin", "admin123", "admin@example.com")
+    with app.app_context():
+        if not user_db.get_user_by_username("admin"):
+            admin = user_db.add_user("admin", "admin123", "admin@example.com")
 
     # For development, you can still run with Flask's development server
     if os.environ.get("ENV") == "development":
@@ -0,0 +1,105 @@
+"""Calibration analytics over the float16 probability vectors stored on each Feedback row."""
+import numpy as np
+
+from feedback_queries import iter_feedback_chunks
+
+PROBABILITY_DTYPE = np.float16
+RELIABILITY_BINS = 10
+ENTROPY_BINS = 10
+TOP_K = (1, 3, 5)
+
+
+def pack_probabilities(probabilities):
+    """Softmax vector -> float16 bytes for the Feedback.probabilities column."""
+    return np.asarray(probabilities, dtype=PROBABILITY_DTYPE).ravel().tobytes()
+
+
+def load_probability_matrix(num_classes, since=None, until=None):
+    """
+    Returns (matrix, true_labels, verified) for the rows that have a stored vector: an
+    (N, num_classes) float32 matrix, the corrected class name per row (the user's or admin's
+    correction when the prediction was marked wrong) and a boolean is_verified mask.
+    """
+    columns = ["probabilities", "predicted_class", "correct_class", "is_correct", "is_verified"]
+    blobs, labels, verified = [], [], []
+    row_bytes = num_classes * np.dtype(PROBABILITY_DTYPE).itemsize
+    for chunk in iter_feedback_chunks(columns, since=since, until=until):
+        for blob, predicted_class, correct_class, is_correct, is_verified in chunk:
+            if blob is None or len(blob) != row_bytes:
+                continue
+            blobs.append(blob)
+            labels.append(correct_class if (correct_class and not is_correct) else predicted_class)
+            verified.append(bool(is_verified))
+
+    matrix = np.frombuffer(b"".join(blobs), dtype=PROBABILITY_DTYPE).reshape(-1, num_classes)
+    return matrix.astype(np.float32), np.array(labels, dtype=object), np.array(verified, dtype=bool)
+
+
+def reliability_diagram(confidence, correct, bins=RELIABILITY_BINS):
+    """Per-bin count, mean confidence and accuracy on equal-width bins, plus the ECE and MCE."""
+    edges = np.linspace(0, 1, bins + 1)
+    index = np.clip(np.searchsorted(edges, confidence, side="right") - 1, 0, bins - 1)
+    counts = np.bincount(index, minlength=bins)
+    safe = np.maximum(counts, 1)
+    mean_confidence = np.bincount(index, weights=confidence, minlength=bins) / safe
+    accuracy = np.bincount(index, weights=correct.astype(np.float64), minlength=bins) / safe
+
+    gaps = np.abs(accuracy - mean_confidence)
+    total = max(counts.sum(), 1)
+    return {
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+        "confidence": mean_confidence.tolist(),
+        "accuracy": accuracy.tolist(),
+        "ece": float(np.sum(counts / total * gaps)),
+        "mce": float(gaps[counts > 0].max()) if counts.any() else 0.0,
+    }
+
+
+def normalized_entropy(matrix):
+    """Shannon entropy of each row divided by log(num_classes), so 0 is certain and 1 is uniform."""
+    p = np.clip(matrix, 1e-12, 1.0)
+    p = p / p.sum(axis=1, keepdims=True)
+    return np.clip(-(p * np.log(p)).sum(axis=1) / np.log(matrix.shape[1]), 0.0, 1.0)
+
+
+def top_k_accuracy(matrix, label_index, ks=TOP_K):
+    """Fraction of rows whose true class index is among the k most probable classes."""
+    ranks = np.argsort(-matrix, axis=1)
+    hits = ranks == label_index[:, None]
+    return {f"top_{k}": float(hits[:, :k].any(axis=1).mean()) for k in ks if k <= matrix.shape[1]}
+
+
+def get_calibration_summary(class_names, since=None, until=None):
+    """
+    Entropy distribution over all stored predictions, plus reliability diagram, ECE and
+    top-k accuracy over the verified ones.
+    """
+    num_classes = len(class_names)
+    matrix, labels, verified_mask = load_probability_matrix(num_classes, since=since, until=until)
+    entropy = normalized_entropy(matrix) if len(matrix) else np.array([])
+    entropy_counts, entropy_edges = np.histogram(entropy, bins=ENTROPY_BINS, range=(0, 1))
+
+    summary = {
+        "rows": int(len(matrix)),
+        "mean_confidence": float(matrix.max(axis=1).mean()) if len(matrix) else None,
+        "entropy": {
+            "mean": float(entropy.mean()) if len(entropy) else None,
+            "edges": entropy_edges.tolist(),
+            "counts": entropy_counts.tolist(),
+        },
+        "verified_rows": 0,
+        "reliability": None,
+        "top_k": None,
+    }
+
+    class_index = {name: i for i, name in enumerate(class_names)}
+    label_index = np.array([class_index.get(label, -1) for label in labels], dtype=np.int64)
+    known = verified_mask & (label_index >= 0)
+    verified, label_index = matrix[known], label_index[known]
+    if len(verified):
+        predicted = verified.argmax(axis=1)
+        summary["verified_rows"] = int(len(verified))
+        summary["reliability"] = reliability_diagram(verified.max(axis=1), predicted == label_index)
+        summary["top_k"] = top_k_accuracy(verified, label_index)
+    return summary
@@ -0,0 +1,19 @@
+"""Disease labels in the order of the model's output logits."""
+
+CLASS_NAMES = {
+    0: "Aphid",
+    1: "Black Rust",
+    2: "Blast",
+    3: "Brown Rust",
+    4: "Common Root Rot",
+    5: "Fusarium Head Blight",
+    6: "Healthy",
+    7: "Leaf Blight",
+    8: "Mildew",
+    9: "Mite",
+    10: "Septoria",
+    11: "Smut",
+    12: "Stem fly",
+    13: "Tan spot",
+    14: "Yellow Rust",
+}
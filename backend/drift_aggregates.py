@@ -0,0 +1,248 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Feedback, DriftAggregate
+from feedback_queries import iter_feedback_chunks
+from drift_metrics import CONFIDENCE_BIN_EDGES, bin_indices, categorical_drift, numeric_drift
+from reference_stats import get_reference_stats
+from image_stats import IMAGE_FEATURE_BINS, STAT_INDEX, unpack_image_stats
+
+UNKNOWN_MODEL_VERSION = "unknown"
+
+KEY_COLUMNS = ["day", "model_version", "feature", "bucket"]
+FEEDBACK_COLUMNS = ["created_at", "model_version", "predicted_class", "confidence", "image_stats"]
+UPSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def confidence_bucket(confidence):
+    """Returns the fixed confidence bin index (as a string) for a confidence in percent."""
+    return str(int(bin_indices(confidence)))
+
+
+def aggregate_keys(day, model_version, predicted_class, confidence, image_stats=None):
+    """Returns the aggregate rows a single prediction contributes to."""
+    model_version = model_version or UNKNOWN_MODEL_VERSION
+    keys = [(day, model_version, "prediction", predicted_class)]
+    if confidence is not None:
+        keys.append((day, model_version, "confidence", confidence_bucket(confidence)))
+    stats = unpack_image_stats(image_stats)
+    if stats is not None:
+        for feature, edges in IMAGE_FEATURE_BINS.items():
+            bucket = str(int(bin_indices(float(stats[STAT_INDEX[feature]]), edges)))
+            keys.append((day, model_version, feature, bucket))
+    return keys
+
+
+def increment_aggregates(connection, counts):
+    """Adds {(day, model_version, feature, bucket): n} to the aggregate table in one upsert."""
+    if not counts:
+        return
+    table = DriftAggregate.__table__
+    values = [dict(zip(KEY_COLUMNS, key), count=n) for key, n in counts.items()]
+
+    upsert = UPSERTS.get(connection.dialect.name)
+    if upsert is not None:
+        stmt = upsert(table).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=KEY_COLUMNS,
+            set_={"count": table.c.count + stmt.excluded.count},
+        )
+        connection.execute(stmt)
+        return
+
+    # Other databases: update first, insert the rows that did not exist yet
+    for row in values:
+        result = connection.execute(
+            table.update()
+            .where(*(table.c[column] == row[column] for column in KEY_COLUMNS))
+            .values(count=table.c.count + row["count"])
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def decrement_aggregates(connection, counts):
+    """Subtracts {(day, model_version, feature, bucket): n} and drops rows that reach zero."""
+    if not counts:
+        return
+    table = DriftAggregate.__table__
+    for key, n in counts.items():
+        connection.execute(
+            table.update()
+            .where(*(table.c[column] == value for column, value in zip(KEY_COLUMNS, key)))
+            .values(count=table.c.count - n)
+        )
+    connection.execute(table.delete().where(table.c.count <= 0))
+
+
+def feedback_keys(created_at, model_version, predicted_class, confidence, image_stats):
+    day = (created_at or datetime.utcnow()).date()
+    return aggregate_keys(day, model_version, predicted_class, confidence, image_stats)
+
+
+@event.listens_for(Feedback, "after_insert")
+def update_aggregates_on_insert(mapper, connection, target):
+    """Counts each new prediction in the same transaction that stores it."""
+    keys = feedback_keys(*(getattr(target, column) for column in FEEDBACK_COLUMNS))
+    increment_aggregates(connection, Counter(keys))
+
+
+@event.listens_for(Feedback, "after_delete")
+def update_aggregates_on_delete(mapper, connection, target):
+    """Uncounts a prediction deleted through the ORM (session.delete)."""
+    keys = feedback_keys(*(getattr(target, column) for column in FEEDBACK_COLUMNS))
+    decrement_aggregates(connection, Counter(keys))
+
+
+def discount_feedback(ids):
+    """
+    Uncounts the given feedback rows ahead of a bulk DELETE, which bypasses the ORM listeners.
+    Call it in the same transaction as the DELETE.
+    """
+    counts = Counter()
+    columns = [getattr(Feedback, column) for column in FEEDBACK_COLUMNS]
+    for row in db.session.execute(select(*columns).where(Feedback.id.in_(ids))):
+        counts.update(feedback_keys(*row))
+    decrement_aggregates(db.session.connection(), counts)
+
+
+def rollup_aggregates():
+    """
+    Rebuilds the aggregate table from the full Feedback history.
+    Used to backfill rows recorded before the aggregates existed, or to repair the table if it
+    was changed outside the app; reads only the needed columns in chunks.
+    """
+    counts = Counter()
+    for chunk in iter_feedback_chunks(FEEDBACK_COLUMNS):
+        for row in chunk:
+            counts.update(feedback_keys(*row))
+
+    db.session.query(DriftAggregate).delete()
+    increment_aggregates(db.session.connection(), counts)
+    db.session.commit()
+    return sum(counts.values())
+
+
+def backfill_aggregates():
+    """Runs the rollup once when feedback exists but no aggregates have been recorded yet."""
+    if db.session.query(DriftAggregate.day).first() is not None:
+        return
+    if db.session.query(Feedback.id).first() is None:
+        return
+    print(f"Backfilled drift aggregates from {rollup_aggregates()} feedback entries")
+
+
+def window_start(days):
+    return datetime.utcnow().date() - timedelta(days=days - 1)
+
+
+def empty_histograms():
+    return {feature: {} for feature in ["prediction", "confidence", *IMAGE_FEATURE_BINS]}
+
+
+def get_current_histograms(days=None, model_version=None, before=None):
+    """
+    Sums the aggregate rows into {feature: {bucket: count}}, optionally for recent days or one model.
+    `days` counts whole UTC days including today; `before` instead selects the days before that date.
+    """
+    query = db.session.query(
+        DriftAggregate.feature,
+        DriftAggregate.bucket,
+        func.sum(DriftAggregate.count),
+    )
+    if days:
+        query = query.filter(DriftAggregate.day >= window_start(days))
+    if before:
+        query = query.filter(DriftAggregate.day < before)
+    if model_version:
+        query = query.filter(DriftAggregate.model_version == model_version)
+
+    histograms = empty_histograms()
+    for feature, bucket, count in query.group_by(DriftAggregate.feature, DriftAggregate.bucket):
+        histograms.setdefault(feature, {})[bucket] = int(count)
+    return histograms
+
+
+def get_recent_histograms(since, model_version=None):
+    """
+    Same shape as get_current_histograms, counted from the feedback rows since `since`.
+    For windows shorter than the daily aggregates, such as the last 24 hours.
+    """
+    counts = Counter()
+    for chunk in iter_feedback_chunks(FEEDBACK_COLUMNS, since=since):
+        for row in chunk:
+            if model_version and (row[1] or UNKNOWN_MODEL_VERSION) != model_version:
+                continue
+            counts.update(feedback_keys(*row))
+
+    histograms = empty_histograms()
+    for (_, _, feature, bucket), count in counts.items():
+        bucket_counts = histograms.setdefault(feature, {})
+        bucket_counts[bucket] = bucket_counts.get(bucket, 0) + count
+    return histograms
+
+
+def get_drift_summary(days=None, model_version=None, since=None):
+    """
+    Computes per-feature drift metrics from the aggregate table against the reference dataset.
+    Cost depends on the number of days and buckets only, not on the number of feedback rows.
+    A `since` datetime counts that exact window from the feedback rows instead of whole days.
+    Returns None when the reference dataset is missing.
+    """
+    stats = get_reference_stats()
+    if stats is None:
+        return None
+    reference = {"prediction": stats.class_counts, "confidence": stats.confidence_histogram}
+    if since is not None:
+        current = get_recent_histograms(since, model_version=model_version)
+        window_day = since.date()
+    else:
+        current = get_current_histograms(days=days, model_version=model_version)
+        window_day = window_start(days) if days else None
+
+    features = {
+        "prediction": categorical_drift(reference["prediction"], current["prediction"]),
+        "confidence": numeric_drift(reference["confidence"], current["confidence"], CONFIDENCE_BIN_EDGES),
+    }
+    for feature, result in features.items():
+        result["reference"] = reference[feature]
+        result["current"] = current[feature]
+
+    # The reference set has no image statistics, so input drift compares the window against
+    # the history before it; the all-time view only shows the distributions.
+    baseline = get_current_histograms(model_version=model_version, before=window_day) if window_day else None
+    image_features = {}
+    for feature, edges in IMAGE_FEATURE_BINS.items():
+        result = {}
+        if baseline and baseline[feature] and current[feature]:
+            result = numeric_drift(baseline[feature], current[feature], edges)
+        result["reference"] = baseline[feature] if baseline else {}
+        result["current"] = current[feature]
+        result["bins"] = [f"{low:g}-{high:g}" for low, high in zip(edges, edges[1:])]
+        image_features[feature] = result
+
+    versions = (
+        db.session.query(DriftAggregate.model_version, func.sum(DriftAggregate.count))
+        .filter(DriftAggregate.feature == "prediction")
+        .group_by(DriftAggregate.model_version)
+        .all()
+    )
+    return {
+        "total": sum(current["prediction"].values()),
+        "features": features,
+        "image_features": image_features,
+        "model_versions": {version: int(count) for version, count in versions},
+        "reference": {
+            "rows": stats.rows,
+            "sha256": stats.digest,
+            "accuracy": stats.accuracy,
+            "confusion": stats.confusion_dict(),
+        },
+        "confidence_bins": [
+            f"{low:g}-{high:g}%" for low, high in zip(CONFIDENCE_BIN_EDGES, CONFIDENCE_BIN_EDGES[1:])
+        ],
+    }
@@ -0,0 +1,178 @@
+"""Drift metrics over binned counts in plain NumPy: PSI, chi-square, Jensen-Shannon, KS and Wasserstein."""
+import math
+
+import numpy as np
+
+# PSI thresholds commonly used to grade distribution shift
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# p-value below which a test statistic is reported as drifted
+P_VALUE_THRESHOLD = 0.05
+EPSILON = 1e-4
+
+# Confidence is stored in percent and clusters near 100, so the fixed bins are finer at the top
+CONFIDENCE_BIN_EDGES = [0, 50, 60, 70, 80, 90, 95, 99, 99.9, 100]
+
+
+def bin_indices(values, edges=CONFIDENCE_BIN_EDGES):
+    """Vectorised fixed-bin index of each value; values outside the edges go to the end bins."""
+    indices = np.searchsorted(edges, np.asarray(values, dtype=np.float64), side="right") - 1
+    return np.clip(indices, 0, len(edges) - 2)
+
+
+def binned_counts(values, edges=CONFIDENCE_BIN_EDGES):
+    """{bin index as string: count} histogram of the values, in the format the aggregates use."""
+    counts = np.bincount(bin_indices(values, edges), minlength=len(edges) - 1)
+    return {str(i): int(n) for i, n in enumerate(counts) if n}
+
+
+def align_histograms(reference, current, buckets=None):
+    """Turns two {bucket: count} dicts into aligned float arrays over `buckets` (default: the union)."""
+    if buckets is None:
+        buckets = sorted(set(reference) | set(current))
+    ref = np.array([reference.get(b, 0) for b in buckets], dtype=np.float64)
+    cur = np.array([current.get(b, 0) for b in buckets], dtype=np.float64)
+    return buckets, ref, cur
+
+
+def proportions(counts, epsilon=EPSILON):
+    """Normalises counts, flooring empty buckets at `epsilon` so logs and ratios stay finite."""
+    total = counts.sum()
+    if total == 0:
+        return np.full_like(counts, 1.0 / max(len(counts), 1))
+    p = np.maximum(counts / total, epsilon)
+    return p / p.sum()
+
+
+def population_stability_index(ref, cur):
+    p, q = proportions(ref), proportions(cur)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def jensen_shannon_distance(ref, cur):
+    """JS distance (base 2, so in [0, 1]) between the two binned distributions."""
+    p, q = proportions(ref, 0), proportions(cur, 0)
+    m = 0.5 * (p + q)
+
+    def kl(a):
+        mask = a > 0
+        return np.sum(a[mask] * np.log2(a[mask] / m[mask]))
+
+    return float(math.sqrt(max(0.5 * kl(p) + 0.5 * kl(q), 0.0)))
+
+
+def chi2_sf(x, dof):
+    """Survival function of the chi-square distribution (regularised upper incomplete gamma)."""
+    if x <= 0 or dof <= 0:
+        return 1.0
+    a, x = dof / 2.0, x / 2.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Series for the lower incomplete gamma
+        term = total = 1.0 / a
+        n = a
+        for _ in range(500):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-12:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+
+    # Continued fraction for the upper incomplete gamma (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 500):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-12:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+
+def chi_square_test(ref, cur):
+    """Goodness-of-fit of current counts against reference proportions. Returns (statistic, p_value)."""
+    n = cur.sum()
+    if n == 0:
+        return 0.0, 1.0
+    expected = proportions(ref) * n
+    statistic = float(np.sum((cur - expected) ** 2 / expected))
+    return statistic, chi2_sf(statistic, len(cur) - 1)
+
+
+def kolmogorov_sf(statistic, n_ref, n_cur):
+    """Asymptotic two-sample KS p-value."""
+    if n_ref == 0 or n_cur == 0:
+        return 1.0
+    en = math.sqrt(n_ref * n_cur / (n_ref + n_cur))
+    lam = (en + 0.12 + 0.11 / en) * statistic
+    if lam < 1e-3:
+        return 1.0
+    k = np.arange(1, 101)
+    return float(min(1.0, max(0.0, 2 * np.sum((-1) ** (k - 1) * np.exp(-2 * (k * lam) ** 2)))))
+
+
+def ks_binned(ref, cur):
+    """Two-sample KS statistic from binned CDFs (a lower bound of the unbinned statistic)."""
+    ref_cdf = np.cumsum(ref) / max(ref.sum(), 1)
+    cur_cdf = np.cumsum(cur) / max(cur.sum(), 1)
+    statistic = float(np.max(np.abs(ref_cdf - cur_cdf))) if len(ref) else 0.0
+    return statistic, kolmogorov_sf(statistic, ref.sum(), cur.sum())
+
+
+def wasserstein_binned(ref, cur, edges):
+    """Earth mover's distance in feature units, integrating the CDF gap across each bin width."""
+    widths = np.diff(np.asarray(edges, dtype=np.float64))
+    ref_cdf = np.cumsum(ref) / max(ref.sum(), 1)
+    cur_cdf = np.cumsum(cur) / max(cur.sum(), 1)
+    return float(np.sum(np.abs(ref_cdf - cur_cdf) * widths))
+
+
+def drift_status(psi):
+    if psi >= PSI_SIGNIFICANT:
+        return "significant"
+    if psi >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
+
+
+def categorical_drift(reference, current):
+    """PSI, chi-square and JS distance between two {category: count} histograms."""
+    _, ref, cur = align_histograms(reference, current)
+    psi = population_stability_index(ref, cur)
+    chi2, chi2_p = chi_square_test(ref, cur)
+    return {
+        "psi": psi,
+        "chi_square": chi2,
+        "chi_square_p_value": chi2_p,
+        "jensen_shannon": jensen_shannon_distance(ref, cur),
+        "status": drift_status(psi),
+        "drifted": psi >= PSI_SIGNIFICANT or chi2_p < P_VALUE_THRESHOLD,
+    }
+
+
+def numeric_drift(reference, current, edges):
+    """PSI, KS and Wasserstein between two histograms keyed by bin index (as strings) on `edges`."""
+    buckets = [str(i) for i in range(len(edges) - 1)]
+    _, ref, cur = align_histograms(reference, current, buckets)
+    psi = population_stability_index(ref, cur)
+    ks, ks_p = ks_binned(ref, cur)
+    return {
+        "psi": psi,
+        "ks": ks,
+        "ks_p_value": ks_p,
+        "wasserstein": wasserstein_binned(ref, cur, edges),
+        "jensen_shannon": jensen_shannon_distance(ref, cur),
+        "status": drift_status(psi),
+        "drifted": psi >= PSI_SIGNIFICANT or ks_p < P_VALUE_THRESHOLD,
+    }
@@ -0,0 +1,155 @@
+"""
+Column-projected, time-windowed reads of the feedback table for analytics.
+Rows are streamed in chunks straight into DataFrames instead of materialising ORM objects.
+"""
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import load_only
+
+from models import db, Feedback
+
+# Named windows accepted by the analytics endpoints
+WINDOWS = {
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+CHUNK_SIZE = 1000
+
+ADMIN_PAGE_SIZE = 50
+# Confidence bands for the admin filter, in percent as stored on Feedback.confidence
+CONFIDENCE_BANDS = {
+    "low": (0, 50),
+    "medium": (50, 80),
+    "high": (80, None),
+}
+# Columns the admin list renders; the blob columns are never loaded
+ADMIN_COLUMNS = [
+    "id", "image_url", "predicted_class", "confidence", "correct_class",
+    "is_correct", "is_verified", "created_at",
+]
+
+
+def resolve_window(window=None, since=None, until=None):
+    """Turns a named window ('24h', '7d', '30d') into a (since, until) pair. Unknown names mean all time."""
+    if window in WINDOWS and since is None:
+        since = (until or datetime.utcnow()) - WINDOWS[window]
+    return since, until
+
+
+def feedback_select(columns, since=None, until=None, verified_only=False):
+    """SELECT of only the given Feedback column names, filtered on the indexed created_at."""
+    stmt = select(*(getattr(Feedback, name) for name in columns))
+    if since is not None:
+        stmt = stmt.where(Feedback.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(Feedback.created_at < until)
+    if verified_only:
+        stmt = stmt.where(Feedback.is_verified.is_(True))
+    return stmt
+
+
+def iter_feedback_chunks(columns, since=None, until=None, verified_only=False, chunk_size=CHUNK_SIZE, connection=None):
+    """
+    Yields lists of row tuples, at most `chunk_size` at a time.
+    Uses the Flask-SQLAlchemy session unless a `connection` is given (e.g. in the report worker).
+    """
+    stmt = feedback_select(columns, since, until, verified_only).execution_options(yield_per=chunk_size)
+    result = (connection or db.session).execute(stmt)
+    for partition in result.partitions():
+        yield partition
+
+
+def load_feedback_frame(columns, since=None, until=None, verified_only=False, chunk_size=CHUNK_SIZE, connection=None):
+    """Returns the selected columns as a DataFrame, built chunk by chunk."""
+    frames = [
+        pd.DataFrame.from_records(chunk, columns=columns)
+        for chunk in iter_feedback_chunks(columns, since, until, verified_only, chunk_size, connection)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def count_feedback(since=None, until=None, verified_only=False):
+    """COUNT(*) over a window without loading any rows."""
+    stmt = feedback_select(["id"], since, until, verified_only)
+    return db.session.execute(select(db.func.count()).select_from(stmt.subquery())).scalar()
+
+
+def parse_admin_filters(args):
+    """Reads the admin panel filters from request args, dropping unknown or malformed values."""
+    filters = {}
+    if args.get("class"):
+        filters["class"] = args["class"]
+    if args.get("confidence") in CONFIDENCE_BANDS:
+        filters["confidence"] = args["confidence"]
+    if args.get("status") in ("verified", "unverified"):
+        filters["status"] = args["status"]
+    for key in ("from", "to"):
+        try:
+            datetime.strptime(args.get(key) or "", "%Y-%m-%d")
+            filters[key] = args[key]
+        except ValueError:
+            pass
+    return filters
+
+
+def apply_admin_filters(query, filters):
+    if "class" in filters:
+        query = query.filter(Feedback.predicted_class == filters["class"])
+    if "confidence" in filters:
+        low, high = CONFIDENCE_BANDS[filters["confidence"]]
+        query = query.filter(Feedback.confidence >= low)
+        if high is not None:
+            query = query.filter(Feedback.confidence < high)
+    if "status" in filters:
+        query = query.filter(Feedback.is_verified.is_(filters["status"] == "verified"))
+    if "from" in filters:
+        query = query.filter(Feedback.created_at >= datetime.strptime(filters["from"], "%Y-%m-%d"))
+    if "to" in filters:
+        end = datetime.strptime(filters["to"], "%Y-%m-%d") + timedelta(days=1)
+        query = query.filter(Feedback.created_at < end)
+    return query
+
+
+def encode_cursor(feedback):
+    return f"{feedback.created_at.isoformat()}|{feedback.id}"
+
+
+def decode_cursor(cursor):
+    """'<created_at iso>|<id>' -> (created_at, id), or None if the cursor is malformed."""
+    try:
+        created_at, feedback_id = cursor.split("|", 1)
+        return datetime.fromisoformat(created_at), feedback_id
+    except (AttributeError, ValueError):
+        return None
+
+
+def admin_page(filters, cursor=None, limit=ADMIN_PAGE_SIZE):
+    """
+    One page of the admin list, newest first, using keyset pagination on (created_at, id):
+    each page seeks past the last row of the previous one instead of using OFFSET.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = apply_admin_filters(Feedback.query, filters).options(
+        load_only(*(getattr(Feedback, name) for name in ADMIN_COLUMNS))
+    )
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, feedback_id = position
+        query = query.filter(
+            or_(
+                Feedback.created_at < created_at,
+                and_(Feedback.created_at == created_at, Feedback.id < feedback_id),
+            )
+        )
+    rows = query.order_by(Feedback.created_at.desc(), Feedback.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def count_admin_rows(filters):
+    return apply_admin_filters(Feedback.query, filters).order_by(None).count()
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class HighlightCache:
+    """
+    Bounded on-disk cache for rendered overlay images.
+    Entries are evicted least-recently-used once either the entry or byte budget is exceeded.
+    """
+
+    def __init__(self, directory, max_entries=500, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # filename -> size in bytes, oldest first
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.render_locks = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self.load_entries()
+
+    def load_entries(self):
+        """Rebuilds the LRU index from files already on disk, ordered by modification time."""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+            self.total_bytes += size
+        self.evict()
+
+    def path_for(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name):
+        """Returns the cached file path and marks it recently used, or None on a miss."""
+        with self.lock:
+            if name not in self.entries:
+                return None
+            path = self.path_for(name)
+            if not os.path.exists(path):
+                self.total_bytes -= self.entries.pop(name)
+                return None
+            self.entries.move_to_end(name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, name, data):
+        """Writes encoded bytes into the cache atomically and registers the entry."""
+        path = self.path_for(name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            self.total_bytes += len(data)
+            self.evict()
+        return path
+
+    def evict(self):
+        """Drops the oldest entries until the cache fits its budgets. Caller holds the lock."""
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            name, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path_for(name))
+            except OSError:
+                pass
+
+    def get_or_render(self, name, render):
+        """
+        Returns (path, data) for a cache entry, calling `render()` for the encoded bytes on a miss.
+        `data` is the freshly rendered bytes on a miss so callers can respond without re-reading
+        the file, and None on a hit. Concurrent requests for the same entry wait for a single render.
+        """
+        path = self.get(name)
+        if path:
+            return path, None
+
+        with self.lock:
+            render_lock = self.render_locks.setdefault(name, threading.Lock())
+
+        with render_lock:
+            path = self.get(name)
+            if path:
+                return path, None
+            try:
+                data = render()
+                if not data:
+                    return None, None
+                return self.put(name, data), data
+            finally:
+                with self.lock:
+                    self.render_locks.pop(name, None)
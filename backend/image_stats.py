@@ -0,0 +1,65 @@
+"""Per-image statistics for input drift monitoring, computed from the normalised model input."""
+import cv2
+import numpy as np
+
+# Model input normalisation, undone to get RGB in [0, 1]
+INPUT_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+INPUT_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+HISTOGRAM_BINS = 4  # Per channel
+HISTOGRAM_EDGES = (np.arange(1, HISTOGRAM_BINS, dtype=np.float32) / HISTOGRAM_BINS).reshape(1, -1, 1)
+
+# Layout of the packed float16 vector
+STAT_NAMES = (
+    ["mean_r", "mean_g", "mean_b", "std_r", "std_g", "std_b", "brightness", "blur"]
+    + [f"hist_{channel}{i}" for channel in "rgb" for i in range(HISTOGRAM_BINS)]
+)
+STAT_INDEX = {name: i for i, name in enumerate(STAT_NAMES)}
+
+# Fixed bins used by the drift aggregates for the scalar image features
+IMAGE_FEATURE_BINS = {
+    "brightness": [0, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 1.0],
+    # log10 of the Laplacian variance on a 0-255 scale: low values mean blurry images
+    "blur": [0, 1, 1.5, 2, 2.5, 3, 3.5, 5],
+}
+
+
+def compute_image_stats(tensor):
+    """
+    Returns a float16 vector of channel means and stds, brightness, log10 Laplacian variance
+    and a per-channel colour histogram for one normalised CHW input tensor.
+    """
+    rgb = tensor * INPUT_STD + INPUT_MEAN
+    flat = rgb.reshape(3, -1)
+    means = flat.mean(axis=1)
+    stds = flat.std(axis=1)
+    gray = 0.299 * rgb[0] + 0.587 * rgb[1] + 0.114 * rgb[2]
+    brightness = gray.mean()
+
+    # 4-neighbour Laplacian variance in 0-255 units
+    blur = np.log10(cv2.Laplacian(gray * 255.0, cv2.CV_32F).var() + 1.0)
+
+    # Per-channel histogram on every other pixel, from cumulative threshold counts
+    # (much cheaper than bincount over 150k values)
+    sample = rgb[:, ::2, ::2].reshape(3, 1, -1)
+    above = np.count_nonzero(sample >= HISTOGRAM_EDGES, axis=2) / sample.shape[2]
+    cumulative = np.concatenate([np.ones((3, 1)), above, np.zeros((3, 1))], axis=1)
+    histogram = (cumulative[:, :-1] - cumulative[:, 1:]).ravel()
+
+    return np.concatenate([means, stds, [brightness, blur], histogram]).astype(np.float16)
+
+
+def pack_image_stats(stats):
+    """float16 vector -> bytes for the Feedback.image_stats column."""
+    return None if stats is None else np.asarray(stats, dtype=np.float16).tobytes()
+
+
+def unpack_image_stats(blob):
+    """bytes -> float16 vector, or None for rows recorded without stats."""
+    if not blob or len(blob) != 2 * len(STAT_NAMES):
+        return None
+    return np.frombuffer(blob, dtype=np.float16)
+
+
+def image_stats_dict(blob):
+    stats = unpack_image_stats(blob)
+    return None if stats is None else {name: float(stats[i]) for i, name in enumerate(STAT_NAMES)}
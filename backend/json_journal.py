@@ -0,0 +1,102 @@
+import os
+import json
+import atexit
+import threading
+
+
+class JournaledJsonStore:
+    """
+    Keyed JSON store with write-behind journaling.
+    `path` holds the last compacted snapshot ({key: value}); changes are appended to
+    `path + ".journal"` as one JSON line per record. Changes to the same key within
+    `flush_interval` seconds are coalesced into one journal line, and the snapshot is rewritten
+    (temp file + atomic rename) once the journal holds `compact_after` lines.
+    """
+
+    def __init__(self, path, flush_interval=0.5, compact_after=500):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.data = {}
+        self.dirty = {}
+        self.journal_lines = 0
+        self.lock = threading.RLock()
+        self.timer = None
+        atexit.register(self.flush)
+
+    def load(self):
+        """Reads the snapshot and replays the journal; a torn final line from a crash is ignored."""
+        with self.lock:
+            self.data = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as f:
+                        self.data = json.load(f)
+                except (json.JSONDecodeError, OSError) as e:
+                    print(f"Error loading {self.path}: {e}")
+
+            self.journal_lines = 0
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            break
+                        if entry.get("deleted"):
+                            self.data.pop(entry["key"], None)
+                        else:
+                            self.data[entry["key"]] = entry["value"]
+                        self.journal_lines += 1
+            return dict(self.data)
+
+    def set(self, key, value):
+        """Records a new value for `key`; it reaches disk on the next flush."""
+        self._mark(str(key), {"key": str(key), "value": value})
+
+    def delete(self, key):
+        self._mark(str(key), {"key": str(key), "deleted": True})
+
+    def _mark(self, key, entry):
+        # Serialise now so later in-place edits by the caller can't change what gets written
+        line = json.dumps(entry)
+        with self.lock:
+            if entry.get("deleted"):
+                self.data.pop(key, None)
+            else:
+                self.data[key] = entry["value"]
+            self.dirty[key] = line
+            if self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Appends coalesced changes to the journal and compacts it when it grows too long."""
+        with self.lock:
+            self.timer = None
+            if not self.dirty:
+                return
+            lines = list(self.dirty.values())
+            self.dirty = {}
+            with open(self.journal_path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_lines += len(lines)
+            if self.journal_lines >= self.compact_after:
+                self.compact()
+
+    def compact(self):
+        """Writes the full snapshot via temp file + atomic rename, then empties the journal."""
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # Changes not yet flushed stay in `dirty` and are journaled on the next flush
+            open(self.journal_path, "w").close()
+            self.journal_lines = 0
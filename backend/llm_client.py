@@ -0,0 +1,241 @@
+"""
+Shared LLM client: calls run on one background event loop with a concurrency limit, retries
+and a deadline. Request threads use the synchronous chat() and stream() facades.
+"""
+import os
+import time
+import queue
+import random
+import asyncio
+import threading
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 5))  # Seconds to wait for a free slot
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 60))  # Seconds per call, retries included
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 1))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 10))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class LLMUnavailableError(LLMError):
+    """No API key, or the client could not be created."""
+
+
+class LLMBusyError(LLMError):
+    """All concurrency slots stayed taken for LLM_QUEUE_TIMEOUT."""
+
+
+class LLMTimeoutError(LLMError):
+    """The call did not finish within its deadline."""
+
+
+_lock = threading.Lock()
+_loop = None
+_semaphore = None
+_client = None
+_settings = {}  # Overrides from configure(); the key is otherwise read from the environment at first use
+
+
+def configure(api_key=None, base_url=None):
+    """Points the client at another key or endpoint (e.g. a local fake server in tests)."""
+    global _client
+    with _lock:
+        _settings.update(api_key=api_key, base_url=base_url)
+        _client = None
+
+
+def api_key():
+    return _settings.get("api_key") or os.getenv("OPENAI_API_KEY")
+
+
+def is_configured():
+    return bool(api_key())
+
+
+def get_loop():
+    """The background event loop, started on first use."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name="llm-loop").start()
+        return _loop
+
+
+def get_client():
+    """AsyncOpenAI client bound to the background loop. Retries are handled here, not by the SDK."""
+    global _client
+    with _lock:
+        if _client is None:
+            if not api_key():
+                raise LLMUnavailableError("OPENAI_API_KEY not found in environment variables")
+            try:
+                from openai import AsyncOpenAI
+
+                _client = AsyncOpenAI(
+                    api_key=api_key(),
+                    base_url=_settings.get("base_url") or os.getenv("OPENAI_BASE_URL"),
+                    max_retries=0,
+                )
+            except Exception as e:
+                raise LLMUnavailableError(f"Failed to initialize OpenAI client: {e}")
+        return _client
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUS or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+async def acquire_slot(deadline_at):
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    wait = min(LLM_QUEUE_TIMEOUT, deadline_at - loop.time())
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), timeout=max(0, wait))
+    except asyncio.TimeoutError:
+        raise LLMBusyError("LLM capacity exhausted (503), too many concurrent requests")
+    return _semaphore
+
+
+async def with_retries(attempt_call, deadline):
+    """
+    Runs `attempt_call()` (a coroutine factory) holding a slot per attempt, retrying retryable
+    errors with backoff while the deadline allows. The slot is released during backoff.
+    """
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
+    attempt = 0
+    while True:
+        semaphore = await acquire_slot(deadline_at)
+        try:
+            return await asyncio.wait_for(attempt_call(), timeout=max(0, deadline_at - loop.time()))
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"LLM call exceeded its {deadline:.0f}s deadline")
+        except Exception as e:
+            error = e
+        finally:
+            semaphore.release()
+
+        delay = backoff_delay(attempt)
+        attempt += 1
+        if not is_retryable(error) or attempt >= LLM_MAX_RETRIES or loop.time() + delay >= deadline_at:
+            raise error
+        print(f"LLM call failed ({error}), retry {attempt} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def achat(messages, max_tokens=2048, temperature=0.4, deadline=LLM_DEADLINE):
+    """Completion text for a chat request."""
+    client = get_client()
+
+    async def attempt():
+        response = await client.chat.completions.create(
+            model=LLM_MODEL, messages=messages, temperature=temperature, max_tokens=max_tokens
+        )
+        if not response.choices:
+            return ""
+        return response.choices[0].message.content or ""
+
+    return await with_retries(attempt, deadline)
+
+
+async def astream(messages, max_tokens=2048, temperature=0.4, deadline=LLM_DEADLINE):
+    """
+    Yields completion text deltas. Opening the stream is retried like achat; once text has
+    been yielded a failure is raised, since the caller has already used part of the answer.
+    The concurrency slot is held until the stream ends.
+    """
+    client = get_client()
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
+    attempt = 0
+    while True:
+        semaphore = await acquire_slot(deadline_at)
+        started = False
+        try:
+            stream = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=LLM_MODEL, messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True
+                ),
+                timeout=max(0, deadline_at - loop.time()),
+            )
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    started = True
+                    yield event.choices[0].delta.content
+            return
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"LLM call exceeded its {deadline:.0f}s deadline")
+        except Exception as e:
+            if started:
+                raise
+            error = e
+        finally:
+            semaphore.release()
+
+        delay = backoff_delay(attempt)
+        attempt += 1
+        if not is_retryable(error) or attempt >= LLM_MAX_RETRIES or loop.time() + delay >= deadline_at:
+            raise error
+        print(f"LLM stream failed ({error}), retry {attempt} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def chat(messages, max_tokens=2048, temperature=0.4, deadline=LLM_DEADLINE):
+    """Synchronous facade for request threads: blocks until the text is ready or the deadline passes."""
+    future = asyncio.run_coroutine_threadsafe(
+        achat(messages, max_tokens, temperature, deadline), get_loop()
+    )
+    try:
+        return future.result(timeout=deadline + 1)
+    except TimeoutError:
+        future.cancel()
+        raise LLMTimeoutError(f"LLM call exceeded its {deadline:.0f}s deadline")
+
+
+def stream(messages, max_tokens=2048, temperature=0.4, deadline=LLM_DEADLINE):
+    """Synchronous generator over astream; closing it early cancels the request."""
+    chunks = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for delta in astream(messages, max_tokens, temperature, deadline):
+                chunks.put(delta)
+            chunks.put(done)
+        except BaseException as e:
+            chunks.put(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_loop())
+    deadline_at = time.monotonic() + deadline + 1
+    try:
+        while True:
+            try:
+                item = chunks.get(timeout=max(0.1, deadline_at - time.monotonic()))
+            except queue.Empty:
+                raise LLMTimeoutError(f"LLM call exceeded its {deadline:.0f}s deadline")
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        future.cancel()
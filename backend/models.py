@@ -1,15 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.mutable import MutableDict
 from werkzeug.security import generate_password_hash, check_password_hash
-import json
 import os
+import threading
 from datetime import datetime
 import uuid
 
+from json_journal import JournaledJsonStore
+
 db = SQLAlchemy()
 
 class Feedback(db.Model):
     __tablename__ = 'feedback'
+    __table_args__ = (
+        # Export and observability filters, and the admin panel's per-class listing
+        db.Index('ix_feedback_verified_training', 'is_verified', 'used_in_training'),
+        db.Index('ix_feedback_class_created', 'predicted_class', 'created_at'),
+    )
     
     id = db.Column(
         db.String(36),
@@ -23,12 +33,67 @@ class Feedback(db.Model):
     is_correct = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)  # Added for Human-in-the-Loop review
     used_in_training = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    lesion_count = db.Column(db.Integer, nullable=True)  # Heuristic lesion stats, stored when the uploader first views them
+    infected_area_pct = db.Column(db.Float, nullable=True)
+    model_version = db.Column(db.String, nullable=True)  # Model that produced the prediction
+    image_stats = db.Column(db.LargeBinary, nullable=True)  # float16 input statistics, see image_stats.py
+    probabilities = db.Column(db.LargeBinary, nullable=True)  # float16 softmax vector, see calibration.py
 
     def __repr__(self):
         return f'<Feedback {self.id}: {self.predicted_class} (Correct: {self.is_correct})>'
 
-class User(UserMixin):
+
+class DriftAggregate(db.Model):
+    """Prediction counts per day, model version and histogram bucket, maintained on each Feedback insert and delete."""
+    __tablename__ = 'drift_aggregates'
+
+    day = db.Column(db.Date, primary_key=True)
+    model_version = db.Column(db.String, primary_key=True)
+    feature = db.Column(db.String, primary_key=True)  # 'prediction', 'confidence', or an image feature such as 'brightness' or 'blur'
+    bucket = db.Column(db.String, primary_key=True)  # Class name, or the bin index for numeric features
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DriftAggregate {self.day} {self.feature}={self.bucket}: {self.count}>'
+
+
+def sync_schema():
+    """Adds columns and indexes declared on the models that are missing from tables created by older versions."""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            print(f"Added column {table.name}.{column.name}")
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=db.engine)
+                print(f"Created index {index.name}")
+
+class User(UserMixin, db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    username = db.Column(db.String, nullable=False, unique=True, index=True)
+    password_hash = db.Column(db.String, nullable=False)
+    email = db.Column(db.String, nullable=True, unique=True, index=True)
+    location_type = db.Column(db.String, nullable=True)  # 'automatic' or 'manual'
+    manual_location = db.Column(db.String, nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    # MutableDict so in-place updates (e.g. questionnaire_responses.update) are persisted
+    weather_data = db.Column(MutableDict.as_mutable(db.JSON), default=dict)
+    questionnaire_responses = db.Column(MutableDict.as_mutable(db.JSON), default=dict)
+
     def __init__(
         self,
         id,
@@ -42,16 +107,18 @@ class User(UserMixin):
         weather_data=None,
         questionnaire_responses=None,
     ):
-        self.id = id
-        self.username = username
-        self.password_hash = password_hash
-        self.email = email
-        self.location_type = location_type  # 'automatic' or 'manual'
-        self.manual_location = manual_location
-        self.latitude = latitude
-        self.longitude = longitude
-        self.weather_data = weather_data or {}
-        self.questionnaire_responses = questionnaire_responses or {}
+        super().__init__(
+            id=id,
+            username=username,
+            password_hash=password_hash,
+            email=email,
+            location_type=location_type,
+            manual_location=manual_location,
+            latitude=latitude,
+            longitude=longitude,
+            weather_data=weather_data or {},
+            questionnaire_responses=questionnaire_responses or {},
+        )
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -62,13 +129,21 @@ class User(UserMixin):
     def update_questionnaire_responses(self, responses):
         """Update user's questionnaire responses."""
         self.questionnaire_responses = responses
-        user_db.save_users()  # Save changes to database
+        user_db.save_user(self)  # Save changes to database
 
 
 class UserDB:
+    """
+    Legacy store keeping every user in users.json. Selected with USER_STORE=json.
+    Changes go through a write-behind journal, so saving one user appends one line instead of
+    rewriting the file.
+    """
+
     def __init__(self, filename="users.json"):
         self.filename = filename
         self.users = {}
+        self.store = JournaledJsonStore(filename)
+        self.lock = threading.Lock()
         self.load_users()
 
     def update_user(self, user_id, **kwargs):
@@ -81,78 +156,127 @@ class UserDB:
             if hasattr(user, key):
                 setattr(user, key, value)
 
-        self.save_users()
+        self.save_user(user)
         return user
 
     def load_users(self):
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, "r") as f:
-                    data = json.load(f)
-                    self.users = {}
-                    for uid, user_data in data.items():
-                        # Ensure all required fields are present
-                        user_data.setdefault("email", None)
-                        user_data.setdefault("location_type", "manual")
-                        user_data.setdefault("manual_location", None)
-                        user_data.setdefault("latitude", None)
-                        user_data.setdefault("longitude", None)
-                        user_data.setdefault("weather_data", {})
-                        user_data.setdefault("questionnaire_responses", {})
-
-                        # Clean up old fields that no longer exist in the User class
-                        for field in [
-                            "location_consent",
-                            "last_location_address",
-                            "location_updated_at",
-                            "location_accuracy_km",
-                            "location_source",
-                        ]:
-                            user_data.pop(field, None)
-
-                        self.users[uid] = User(
-                            id=user_data["id"],
-                            username=user_data["username"],
-                            password_hash=user_data["password_hash"],
-                            email=user_data["email"],
-                            location_type=user_data.get("location_type"),
-                            manual_location=user_data.get("manual_location"),
-                            latitude=user_data.get("latitude"),
-                            longitude=user_data.get("longitude"),
-                            weather_data=user_data.get("weather_data", {}),
-                            questionnaire_responses=user_data.get(
-                                "questionnaire_responses", {}
-                            ),
-                        )
-            except (json.JSONDecodeError, Exception) as e:
-                print(f"Error loading users: {e}")
-                self.users = {}
+        try:
+            data = self.store.load()
+            self.users = {}
+            for uid, user_data in data.items():
+                # Ensure all required fields are present
+                user_data.setdefault("email", None)
+                user_data.setdefault("location_type", "manual")
+                user_data.setdefault("manual_location", None)
+                user_data.setdefault("latitude", None)
+                user_data.setdefault("longitude", None)
+                user_data.setdefault("weather_data", {})
+                user_data.setdefault("questionnaire_responses", {})
+
+                # Clean up old fields that no longer exist in the User class
+                for field in [
+                    "location_consent",
+                    "last_location_address",
+                    "location_updated_at",
+                    "location_accuracy_km",
+                    "location_source",
+                ]:
+                    user_data.pop(field, None)
+
+                self.users[uid] = User(
+                    id=user_data["id"],
+                    username=user_data["username"],
+                    password_hash=user_data["password_hash"],
+                    email=user_data["email"],
+                    location_type=user_data.get("location_type"),
+                    manual_location=user_data.get("manual_location"),
+                    latitude=user_data.get("latitude"),
+                    longitude=user_data.get("longitude"),
+                    weather_data=user_data.get("weather_data", {}),
+                    questionnaire_responses=user_data.get(
+                        "questionnaire_responses", {}
+                    ),
+                )
+        except Exception as e:
+            print(f"Error loading users: {e}")
+            self.users = {}
+
+    def user_record(self, user):
+        return {
+            "id": user.id,
+            "username": user.username,
+            "password_hash": user.password_hash,
+            "email": user.email,
+            "location_type": user.location_type,
+            "manual_location": user.manual_location,
+            "latitude": user.latitude,
+            "longitude": user.longitude,
+            "weather_data": dict(user.weather_data or {}),
+            "questionnaire_responses": dict(user.questionnaire_responses or {}),
+        }
+
+    def save_user(self, user):
+        """Journals just this user's record."""
+        self.store.set(user.id, self.user_record(user))
 
     def save_users(self):
-        with open(self.filename, "w") as f:
-            users_data = {}
-            for uid, user in self.users.items():
-                users_data[uid] = {
-                    "id": user.id,
-                    "username": user.username,
-                    "password_hash": user.password_hash,
-                    "email": user.email,
-                    "location_type": user.location_type,
-                    "manual_location": user.manual_location,
-                    "latitude": user.latitude,
-                    "longitude": user.longitude,
-                    "weather_data": user.weather_data,
-                    "questionnaire_responses": user.questionnaire_responses,
-                }
-            json.dump(users_data, f, indent=2)
+        for user in self.users.values():
+            self.save_user(user)
+
+    def add_user(self, username, password, email=None, **kwargs):
+        # Sequential ids: hold the lock so concurrent signups can't pick the same one
+        with self.lock:
+            user_id = str(len(self.users) + 1)
+            user = User(
+                id=user_id,
+                username=username,
+                password_hash=generate_password_hash(password),
+                email=email,
+                location_type=kwargs.get("location_type", "manual"),
+                manual_location=kwargs.get("manual_location"),
+                latitude=kwargs.get("latitude"),
+                longitude=kwargs.get("longitude"),
+                weather_data=kwargs.get("weather_data", {}),
+                questionnaire_responses=kwargs.get("questionnaire_responses", {}),
+            )
+            self.users[user_id] = user
+        self.save_user(user)
+        return user
+
+    def get_user_by_username(self, username):
+        for user in list(self.users.values()):
+            if user.username == username:
+                return user
+        return None
+
+    def get_user_by_email(self, email):
+        for user in list(self.users.values()):
+            if email and user.email == email:
+                return user
+        return None
+
+    def get_user_by_id(self, user_id):
+        return self.users.get(str(user_id))
+
+
+class SQLUserDB:
+    """User store backed by the users table; lookups use the unique username/email indexes."""
+
+    def get_user_by_id(self, user_id):
+        return db.session.get(User, str(user_id))
+
+    def get_user_by_username(self, username):
+        return User.query.filter_by(username=username).first()
+
+    def get_user_by_email(self, email):
+        return User.query.filter_by(email=email).first() if email else None
 
     def add_user(self, username, password, email=None, **kwargs):
-        user_id = str(len(self.users) + 1)
         user = User(
-            id=user_id,
+            id=str(uuid.uuid4()),
             username=username,
             password_hash=generate_password_hash(password),
-            email=email,
+            email=email or None,
             location_type=kwargs.get("location_type", "manual"),
             manual_location=kwargs.get("manual_location"),
             latitude=kwargs.get("latitude"),
@@ -160,19 +284,68 @@ class UserDB:
             weather_data=kwargs.get("weather_data", {}),
             questionnaire_responses=kwargs.get("questionnaire_responses", {}),
         )
-        self.users[user_id] = user
-        self.save_users()
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Username or email taken by a concurrent signup
+            db.session.rollback()
+            return None
         return user
 
-    def get_user_by_username(self, username):
-        for user in self.users.values():
-            if user.username == username:
-                return user
-        return None
+    def update_user(self, user_id, **kwargs):
+        """Update user attributes."""
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return None
 
-    def get_user_by_id(self, user_id):
-        return self.users.get(str(user_id))
+        for key, value in kwargs.items():
+            if hasattr(user, key):
+                setattr(user, key, value)
+
+        db.session.commit()
+        return user
+
+    def save_user(self, user):
+        """Writes only this user's row."""
+        db.session.add(user)
+        db.session.commit()
+
+    def save_users(self):
+        db.session.commit()
+
+
+def migrate_users_json(filename="users.json"):
+    """
+    One-time import of users.json into the users table. Existing ids and usernames are kept
+    (so login sessions stay valid); rows that already exist are skipped, and a user whose email
+    is already taken is imported without one.
+    """
+    if not os.path.exists(filename) and not os.path.exists(f"{filename}.journal"):
+        return 0
+    imported = 0
+    for user in UserDB(filename).users.values():
+        if db.session.get(User, user.id) or User.query.filter_by(username=user.username).first():
+            continue
+        user.email = user.email or None
+        if user.email and User.query.filter_by(email=user.email).first():
+            print(f"Warning: email {user.email} of user {user.username} is already in use, imported without an email")
+            user.email = None
+        db.session.add(user)
+        imported += 1
+    db.session.commit()
+    return imported
+
+
+def migrate_users_if_needed(filename="users.json"):
+    """Runs the users.json import when the SQL store is active and the users table is still empty."""
+    if USER_STORE != "sql" or db.session.query(User.id).first() is not None:
+        return
+    imported = migrate_users_json(filename)
+    if imported:
+        print(f"Migrated {imported} users from {filename}")
 
 
-# Initialize user database
-user_db = UserDB()
+# Initialize user database: the users table by default, users.json with USER_STORE=json
+USER_STORE = os.getenv("USER_STORE", "sql")
+user_db = SQLUserDB() if USER_STORE == "sql" else UserDB()
@@ -1,77 +1,157 @@
 import os
-import pandas as pd
-from evidently.legacy.report import Report
-from evidently.legacy.metric_preset import DataDriftPreset, ClassificationPreset
-from evidently.legacy.pipeline.column_mapping import ColumnMapping
-from models import Feedback
-
-def get_drift_report_html():
-    """Generates an Evidently Data & Target Drift report comparing reference to production predictions."""
-    reference_path = os.path.join(os.path.dirname(__file__), "static", "reference_data.csv")
-    if not os.path.exists(reference_path):
-        return "<h3>Reference dataset not found. Please pre-generate the reference CSV.</h3>"
-
-    # 1. Load reference dataset (filter to columns present in current_data to avoid partial column errors)
-    ref_df = pd.read_csv(reference_path)[["prediction", "confidence"]]
-
-    # 2. Load current production predictions
-    all_feedback = Feedback.query.all()
-    if not all_feedback:
-        return "<h3>No production predictions recorded yet. Submit feedback to see drift analysis.</h3>"
-
-    current_records = []
-    for f in all_feedback:
-        current_records.append({
-            "prediction": f.predicted_class,
-            "confidence": f.confidence,
-        })
-    curr_df = pd.DataFrame(current_records)
-
-    # Define ColumnMapping for prediction and confidence
-    column_mapping = ColumnMapping()
-    column_mapping.prediction = "prediction"
-    column_mapping.numerical_features = ["confidence"]
-
-    report = Report(metrics=[DataDriftPreset(columns=["prediction", "confidence"])])
-    report.run(reference_data=ref_df, current_data=curr_df, column_mapping=column_mapping)
-    return report.get_html()
-
-def get_performance_report_html():
-    """Generates an Evidently Classification Performance report based on admin-verified feedback."""
-    reference_path = os.path.join(os.path.dirname(__file__), "static", "reference_data.csv")
-    if not os.path.exists(reference_path):
-        return "<h3>Reference dataset not found. Please pre-generate the reference CSV.</h3>"
-
-    # 1. Load reference dataset
-    ref_df = pd.read_csv(reference_path)
-
-    # 2. Load verified production feedback
-    verified_feedback = Feedback.query.filter_by(is_verified=True).all()
-    if len(verified_feedback) < 3:
-        return (
-            "<h3>Insufficient verified data.</h3>"
-            f"<p>Currently, there are only {len(verified_feedback)} verified feedback records. "
-            "At least 3 verified records are required to generate the classification performance report.</p>"
-            "<p>To add verified feedback, go to the Admin panel and verify uploaded predictions.</p>"
-        )
-
-    current_records = []
-    for f in verified_feedback:
-        # Target is the correct class if incorrect and correct_class is specified, else predicted_class
-        target_class = f.correct_class if (f.correct_class and not f.is_correct) else f.predicted_class
-        current_records.append({
-            "target": target_class,
-            "prediction": f.predicted_class,
-            "confidence": f.confidence,
-        })
-    curr_df = pd.DataFrame(current_records)
-
-    # Define ColumnMapping mapping
-    column_mapping = ColumnMapping()
-    column_mapping.target = "target"
-    column_mapping.prediction = "prediction"
-    column_mapping.numerical_features = ["confidence"]
-
-    report = Report(metrics=[ClassificationPreset()])
-    report.run(reference_data=ref_df, current_data=curr_df, column_mapping=column_mapping)
-    return report.get_html()
+import sys
+import glob
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from feedback_queries import WINDOWS, count_feedback, resolve_window
+from report_worker import REPORT_BUILDERS
+
+REPORTS_DIR = os.getenv("REPORTS_DIR", os.path.join(os.path.dirname(__file__), "data", "reports"))
+REPORT_KINDS = tuple(REPORT_BUILDERS)
+
+# Scheduler: check every REPORT_CHECK_INTERVAL seconds; regenerate once a snapshot is older than
+# REPORT_MAX_AGE seconds and has new data, or as soon as REPORT_NEW_ROWS_THRESHOLD rows arrive.
+REPORT_CHECK_INTERVAL = int(os.getenv("REPORT_CHECK_INTERVAL", 60))
+REPORT_MAX_AGE = int(os.getenv("REPORT_MAX_AGE", 6 * 3600))
+REPORT_NEW_ROWS_THRESHOLD = int(os.getenv("REPORT_NEW_ROWS_THRESHOLD", 100))
+REPORT_SNAPSHOTS_KEPT = int(os.getenv("REPORT_SNAPSHOTS_KEPT", 3))
+REPORT_TIMEOUT = int(os.getenv("REPORT_TIMEOUT", 600))
+REPORT_WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "report_worker.py")
+
+_executor = None
+_pending = {}  # snapshot name -> Future of the running generation
+_lock = threading.Lock()
+_scheduler = None
+
+
+def get_executor():
+    """One generation at a time; the thread only waits on the report subprocess."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+    return _executor
+
+
+def snapshot_name(kind, window=None):
+    """Snapshots are keyed by kind plus an optional window, e.g. 'drift' or 'drift-7d'."""
+    return f"{kind}-{window}" if window in WINDOWS else kind
+
+
+def run_report_process(kind, database_url, window=None):
+    """
+    Generates a report in a fresh Python process so Evidently and pandas never run inside
+    the web worker. The database URL is passed through the environment, not the command line.
+    Returns the snapshot path.
+    """
+    command = [sys.executable, REPORT_WORKER_PATH, kind, REPORTS_DIR]
+    if window in WINDOWS:
+        since, _ = resolve_window(window)
+        command += [snapshot_name(kind, window), since.isoformat()]
+    result = subprocess.run(
+        command,
+        env={**os.environ, "DATABASE_URL": database_url},
+        capture_output=True,
+        text=True,
+        timeout=REPORT_TIMEOUT,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-1000:] or "report worker failed")
+    return result.stdout.strip()
+
+
+def list_snapshots(name):
+    """Snapshot paths for a snapshot name, oldest first (timestamps sort lexicographically)."""
+    return sorted(glob.glob(os.path.join(REPORTS_DIR, f"{name}_*.html")))
+
+
+def snapshot_time(path):
+    stamp = os.path.splitext(os.path.basename(path))[0].rsplit("_", 1)[-1]
+    return datetime.strptime(stamp, "%Y%m%dT%H%M%S")
+
+
+def get_latest_snapshot(kind, window=None):
+    """Returns (path, generated_at) of the newest snapshot, or (None, None)."""
+    snapshots = list_snapshots(snapshot_name(kind, window))
+    if not snapshots:
+        return None, None
+    return snapshots[-1], snapshot_time(snapshots[-1])
+
+
+def prune_snapshots(name):
+    for path in list_snapshots(name)[:-REPORT_SNAPSHOTS_KEPT]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def is_generating(kind, window=None):
+    with _lock:
+        future = _pending.get(snapshot_name(kind, window))
+        return future is not None and not future.done()
+
+
+def request_report(kind, database_url, window=None):
+    """Queues a background regeneration unless one is already running. Returns the Future."""
+    name = snapshot_name(kind, window)
+    with _lock:
+        future = _pending.get(name)
+        if future is not None and not future.done():
+            return future
+        future = get_executor().submit(run_report_process, kind, database_url, window)
+        _pending[name] = future
+
+    def finished(done):
+        try:
+            print(f"Generated {name} report snapshot: {done.result()}")
+            prune_snapshots(name)
+        except Exception as e:
+            print(f"Error generating {name} report: {e}")
+
+    future.add_done_callback(finished)
+    return future
+
+
+def report_is_stale(kind, window=None):
+    """
+    A report needs regenerating when missing, or when new data arrived and it is old or far behind.
+    Windowed reports also go stale with age alone, since old rows leave the window.
+    """
+    _, generated_at = get_latest_snapshot(kind, window)
+    if generated_at is None:
+        return True
+    age = (datetime.utcnow() - generated_at).total_seconds()
+    if window in WINDOWS and age >= REPORT_MAX_AGE:
+        return True
+    new_rows = count_feedback(since=generated_at, verified_only=kind == "performance")
+    if new_rows == 0:
+        return False
+    return new_rows >= REPORT_NEW_ROWS_THRESHOLD or age >= REPORT_MAX_AGE
+
+
+def run_scheduler(app, stop_event):
+    database_url = app.config["SQLALCHEMY_DATABASE_URI"]
+    while not stop_event.is_set():
+        try:
+            with app.app_context():
+                for kind in REPORT_KINDS:
+                    if not is_generating(kind) and report_is_stale(kind):
+                        request_report(kind, database_url)
+        except Exception as e:
+            print(f"Report scheduler error: {e}")
+        stop_event.wait(REPORT_CHECK_INTERVAL)
+
+
+def start_report_scheduler(app):
+    """Starts the daemon thread that keeps the all-time report snapshots fresh."""
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run_scheduler, args=(app, stop_event), daemon=True)
+    thread.start()
+    _scheduler = (thread, stop_event)
+    return _scheduler
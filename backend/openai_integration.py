@@ -1,25 +1,13 @@
-import os
-import time
 from dotenv import load_dotenv
-from openai import OpenAI
+
+import llm_client
+from llm_client import LLMError
 
 # Load environment variables
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
 # Use stable OpenAI model
-MODEL_TO_USE = "gpt-4o-mini"
-
-# Initialize OpenAI client safely at import time so any
-# library/env mismatch doesn't raise during a request.
-openai_client = None
-if OPENAI_API_KEY:
-    try:
-        openai_client = OpenAI(api_key=OPENAI_API_KEY)
-    except Exception as e:
-        # Log and continue; callers will see a clean error message instead
-        print(f"Failed to initialize OpenAI client in openai_integration: {e}")
+MODEL_TO_USE = llm_client.LLM_MODEL
 
 # Sample user data for testing
 sample_user_data = {
@@ -51,20 +39,10 @@ sample_user_data = {
 }
 
 
-def get_openai_recommendation(user_data):
-    if not OPENAI_API_KEY:
-        return {
-            "status": "error",
-            "message": "OPENAI_API_KEY not found in environment variables",
-        }
+SYSTEM_PROMPT = "You are an expert agricultural consultant specializing in wheat pathology and sustainable farming."
 
-    if openai_client is None:
-        # Either initialization failed or key is missing/invalid
-        return {
-            "status": "error",
-            "message": "LLM integration is currently unavailable. Please check your OpenAI configuration.",
-        }
 
+def build_recommendation_prompt(user_data):
     weather = user_data.get("weather", {})
     weather_condition = weather.get("condition", "Clear")
 
@@ -123,53 +101,129 @@ INSTRUCTIONS:
 - Ensure the HTML is valid and all tags are properly closed.
 - DO NOT use any markdown symbols like #, *, or backticks anywhere in your response.
 """
+    return prompt
+
+
+def recommendation_messages(user_data):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_recommendation_prompt(user_data)},
+    ]
 
-    for attempt in range(3):
-        try:
-            print(f"Attempting OpenAI recommendation, attempt={attempt + 1}")
-
-            response = openai_client.chat.completions.create(
-                model=MODEL_TO_USE,
-                messages=[
-                    {"role": "system", "content": "You are an expert agricultural consultant specializing in wheat pathology and sustainable farming."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4,
-                max_tokens=2048,
-            )
-
-            text = response.choices[0].message.content
-
-            # Clean up the output if the LLM still insists on markdown wrappers
-            if text.startswith("```"):
-                # Remove the first line if it contains "```html" or "```"
-                lines = text.splitlines()
-                if lines and lines[0].startswith("```"):
-                    lines = lines[1:]
-                # Remove the last line if it's "```"
-                if lines and lines[-1].strip() == "```":
-                    lines = lines[:-1]
-                text = "\n".join(lines).strip()
-
-            if text.strip():
-                return {"status": "success", "recommendation": text.strip()}
-
-        except Exception as e:
-            print(f"Error on attempt {attempt + 1}: {str(e)}")
-            if attempt < 2:
-                time.sleep(2 ** attempt)
-            else:
-                return {
-                    "status": "error",
-                    "message": f"OpenAI API failure: {str(e)}",
-                }
 
+def strip_code_fence(text):
+    """Removes a markdown code block wrapper if the LLM still insists on one."""
+    if text.startswith("```"):
+        # Remove the first line if it contains "```html" or "```"
+        lines = text.splitlines()
+        if lines and lines[0].startswith("```"):
+            lines = lines[1:]
+        # Remove the last line if it's "```"
+        if lines and lines[-1].strip() == "```":
+            lines = lines[:-1]
+        text = "\n".join(lines).strip()
+    return text
+
+
+def get_openai_recommendation(user_data):
+    """
+    Full recommendation HTML through the shared LLM client, which handles retries with backoff,
+    the concurrency limit and the deadline.
+    """
+    try:
+        text = strip_code_fence(llm_client.chat(recommendation_messages(user_data)).strip())
+    except LLMError as e:
+        return {"status": "error", "message": str(e)}
+    except Exception as e:
+        print(f"Error generating OpenAI recommendation: {str(e)}")
+        return {
+            "status": "error",
+            "message": f"OpenAI API failure: {str(e)}",
+        }
+
+    if text.strip():
+        return {"status": "success", "recommendation": text.strip()}
     return {
         "status": "error",
-        "message": "OpenAI API failure after multiple attempts",
+        "message": "OpenAI API returned an empty recommendation",
     }
 
 
+def without_code_fence(chunks):
+    """
+    Streaming counterpart of strip_code_fence: drops an opening ```html line and holds back
+    trailing backticks until it is clear they are not the closing fence.
+    """
+    buffer = ""
+    started = False
+    for chunk in chunks:
+        buffer += chunk
+        if not started:
+            head = buffer.lstrip()
+            if not head or (head.startswith("`") and "\n" not in head):
+                continue  # Might still be an opening fence
+            buffer = head.split("\n", 1)[1] if head.startswith("```") else head
+            started = True
+        cut = len(buffer.rstrip().rstrip("`"))
+        if cut:
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer.strip().strip("`"):
+        yield buffer
+
+
+def stream_chat(messages, max_tokens=2048):
+    """
+    Yields completion text as it is generated, through the shared LLM client.
+    Raises LLMError when the LLM is not configured, busy or past its deadline.
+    """
+    yield from without_code_fence(llm_client.stream(messages, max_tokens=max_tokens))
+
+
+def stream_openai_recommendation(user_data):
+    """Streams the full recommendation HTML."""
+    yield from stream_chat(recommendation_messages(user_data))
+
+
+def build_personalized_prompt(user_data):
+    """
+    Prompt for only the farm-specific part of a recommendation; the disease biology,
+    standard treatments and prevention come from the prebuilt per-disease template.
+    """
+    weather = user_data.get("weather", {})
+    location = user_data.get("location", {})
+    answers = user_data.get("questionnaire_answers", {})
+    answers_str = (
+        "\n".join(f"- {k.replace('_', ' ').title()}: {v}" for k, v in answers.items() if v)
+        or "- No questionnaire data available"
+    )
+    return f"""
+A farmer's wheat crop has {user_data.get('disease_detected', 'an unidentified issue')}. They already have
+general guidance on the disease's biology, standard treatments and long-term prevention.
+Write ONLY the part specific to this farm today (120-200 words).
+
+FARM CONTEXT:
+- Location: {location.get('city', 'Unknown')}, {location.get('country', 'Unknown')}
+- Weather now: {weather.get('condition', 'Clear')}, {weather.get('temp_c', 25.0)}°C, Humidity: {weather.get('humidity', 'N/A')}%, Precipitation: {weather.get('precip_mm', 0)} mm
+{answers_str}
+
+Explain how today's weather changes the risk and timing of spraying or field work, and adjust
+the standard advice to the soil, irrigation, fertilizer and pesticide history above.
+
+Return ONLY HTML: a <p class="text-gray-700 mb-3"> summary followed by a <ul class="list-disc pl-5 space-y-2">
+with 3-5 <li> items using <strong> for the key action. No headings, no markdown, no code blocks.
+"""
+
+
+def stream_personalized_section(user_data):
+    """Streams the farm-specific section that completes a per-disease template."""
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_personalized_prompt(user_data)},
+    ]
+    yield from stream_chat(messages, max_tokens=600)
+
+
 def test_openai_integration():
     print("Starting OpenAI API Test...")
     res = get_openai_recommendation(sample_user_data)
@@ -1,247 +1,555 @@
+import base64
 import cv2
+import hashlib
 import numpy as np
 import os
+from functools import lru_cache
+from PIL import Image
+
+# Masks are computed on a working copy whose longest side is at most WORK_MAX_SIDE, and the
+# annotated output is rendered with its longest side capped at DISPLAY_MAX_SIDE. Kernel sizes
+# and the contour noise filter are expressed for an image whose longest side is REFERENCE_SIDE
+# and rescaled from there, so results don't depend on the upload resolution.
+WORK_MAX_SIDE = int(os.getenv("OVERLAY_WORK_MAX_SIDE", 768))
+DISPLAY_MAX_SIDE = int(os.getenv("OVERLAY_DISPLAY_MAX_SIDE", 1280))
+REFERENCE_SIDE = 512
+MIN_CONTOUR_AREA = 20
+
+# Rendered overlays default to quality-tuned WebP
+OVERLAY_FORMAT = os.getenv("OVERLAY_FORMAT", "webp")
+OVERLAY_QUALITY = int(os.getenv("OVERLAY_QUALITY", 80))
+ENCODE_PARAMS = {
+    "webp": cv2.IMWRITE_WEBP_QUALITY,
+    "jpg": cv2.IMWRITE_JPEG_QUALITY,
+    "jpeg": cv2.IMWRITE_JPEG_QUALITY,
+}
+MIME_TYPES = {
+    "webp": "image/webp",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+# Overlay mode: heuristic HSV masks, model class activation map, or both
+OVERLAY_MODES = ("heuristic", "cam", "both")
+CAM_ALPHA = 0.4
+
+# Cap on polygons returned by analyze_lesions (largest first) to bound response size
+MAX_LESIONS = int(os.getenv("OVERLAY_MAX_LESIONS", 200))
+
+# JPEG can be decoded directly at 1/2, 1/4 or 1/8 scale
+REDUCED_READ_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+MORPH_OPS = {
+    "close": cv2.MORPH_CLOSE,
+    "open": cv2.MORPH_OPEN,
+}
+
+@lru_cache(maxsize=None)
+def get_kernel(shape, size):
+    """Returns a cached structuring element so specs don't rebuild kernels per image."""
+    return cv2.getStructuringElement(shape, (size, size))
+
+def scaled_kernel_size(size, scale):
+    """Scales a reference kernel size, keeping it odd and at least 1."""
+    scaled = max(1, int(round(size * scale)))
+    return scaled if scaled % 2 == 1 else scaled + 1
+
+def resize_to_max_side(image, max_side):
+    """Downscales an image so its longest side is at most `max_side`; smaller images are returned as-is."""
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if longest <= max_side:
+        return image
+    ratio = max_side / longest
+    size = (max(1, int(round(width * ratio))), max(1, int(round(height * ratio))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def draw_contours(image, contours, color=(0, 0, 255), label=None, scale=1.0, label_row=0, copy=True):
+    """Draws contours and an optional label on the image, with stroke sizes scaled."""
+    output = image.copy() if copy else image
+    thickness = max(1, int(round(2 * scale)))
+    cv2.drawContours(output, contours, -1, color, thickness)
 
-def apply_color_mask(image, lower_thresh, upper_thresh):
-    """Applies a color mask and returns the filtered regions."""
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    mask = cv2.inRange(hsv, lower_thresh, upper_thresh)
-    result = cv2.bitwise_and(image, image, mask=mask)
-    return result, mask
-
-def draw_highlight(image, mask, color=(0, 0, 255), label=None):
-    """Draws contours around the mask on the image."""
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    output = image.copy()
-    for cnt in contours:
-        if cv2.contourArea(cnt) > 20: # Filter noise
-            cv2.drawContours(output, [cnt], -1, color, 2)
-    
     if label:
-        cv2.putText(output, label, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+        origin = (int(round(10 * scale)), int(round(30 * (label_row + 1) * scale)))
+        cv2.putText(output, label, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
     return output
 
-def get_leaf_mask(image):
+def get_leaf_mask(image, blurred=None, kernel=None):
     """Detects the leaf using edge detection and returns a mask."""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    if blurred is None:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
     edged = cv2.Canny(blurred, 30, 150)
-    
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+    if kernel is None:
+        kernel = get_kernel(cv2.MORPH_RECT, 5)
     closed = cv2.morphologyEx(edged, cv2.MORPH_CLOSE, kernel)
     contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
+
     leaf_mask = np.zeros(image.shape[:2], dtype=np.uint8)
     if contours:
         largest_cnt = max(contours, key=cv2.contourArea)
         cv2.drawContours(leaf_mask, [largest_cnt], -1, 255, -1)
     return leaf_mask
 
-# --- Heuristic Functions for 15 Diseases ---
-
-def highlight_black_rust(image):
-    # Elongated, dark reddish-brown to black pustules on stems/sheaths
-    lower_black = np.array([0, 50, 20])
-    upper_black = np.array([20, 255, 100])
-    
-    lower_brown = np.array([5, 100, 50])
-    upper_brown = np.array([15, 255, 200])
-
-    _, mask_black = apply_color_mask(image, lower_black, upper_black)
-    _, mask_brown = apply_color_mask(image, lower_brown, upper_brown)
-    
-    combined_mask = cv2.bitwise_or(mask_black, mask_brown)
-    return draw_highlight(image, combined_mask, color=(0, 0, 0), label="Black Rust (with brown spots)")
-
-def highlight_yellow_rust(image):
-    # Bright yellow pustules in linear rows (stripes)
-    lower = np.array([20, 100, 100])
-    upper = np.array([35, 255, 255])
-    _, mask = apply_color_mask(image, lower, upper)
-    return draw_highlight(image, mask, color=(0, 255, 255), label="Yellow Rust")
-
-def highlight_brown_rust(image):
-    # Small, orange-brown pustules scattered irregularly
-    leaf_mask = get_leaf_mask(image)
-    
-    # Precise HSV range for reddish-brown spots based on uploaded image
-    # The spots are quite "rusty" (Hue: 0-20, Sat: 50-255, Val: 40-200)
-    lower = np.array([0, 50, 40])
-    upper = np.array([20, 255, 200])
-    
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    color_mask = cv2.inRange(hsv, lower, upper)
-    
-    # Increased closing kernel to join the dense scattered spots seen in the image
-    kernel_close = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
-    color_mask = cv2.morphologyEx(color_mask, cv2.MORPH_CLOSE, kernel_close)
-    
-    # Remove very tiny noise
-    kernel_open = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-    color_mask = cv2.morphologyEx(color_mask, cv2.MORPH_OPEN, kernel_open)
-    
-    # CRITICAL: Intersection with leaf mask to ONLY highlight spots on the leaf
-    combined_mask = cv2.bitwise_and(color_mask, leaf_mask)
-    
-    return draw_highlight(image, combined_mask, color=(0, 69, 139), label="Brown Rust")
-
-def highlight_fusarium_head_blight(image):
-    # Bleached or tan spikelets, pink/orange/yellowish-brown fungal growth
-    leaf_mask = get_leaf_mask(image)
-    
-    # Wider range to include tan, pinkish, and yellowish-brown
-    lower1 = np.array([0, 30, 100])  # Pinkish/Reddish
-    upper1 = np.array([20, 255, 255])
-    
-    lower2 = np.array([20, 40, 100]) # Yellowish/Tan
-    upper2 = np.array([40, 255, 255])
-    
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    mask1 = cv2.inRange(hsv, lower1, upper1)
-    mask2 = cv2.inRange(hsv, lower2, upper2)
-    
-    color_mask = cv2.bitwise_or(mask1, mask2)
-    
-    # Morphological cleaning
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-    color_mask = cv2.morphologyEx(color_mask, cv2.MORPH_CLOSE, kernel)
-    
-    combined_mask = cv2.bitwise_and(color_mask, leaf_mask)
-    
-    return draw_highlight(image, combined_mask, color=(0, 0, 139), label="Fusarium Head Blight")
-
-def highlight_wheat_blast(image):
-    # Sudden bleaching, eye-shaped lesion on stem
-    lower = np.array([0, 0, 180])
-    upper = np.array([180, 30, 255])
-    _, mask = apply_color_mask(image, lower, upper)
-    return draw_highlight(image, mask, color=(255, 255, 255), label="Wheat Blast")
-
-def highlight_smut(image):
-    # Dusty mass of olive-black spores
-    # Focusing on the dark-reddish-brownish part
-    leaf_mask = get_leaf_mask(image)
-    lower = np.array([0, 50, 20])
-    upper = np.array([20, 255, 150])
-    
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    color_mask = cv2.inRange(hsv, lower, upper)
-    combined_mask = cv2.bitwise_and(color_mask, leaf_mask)
-    
-    return draw_highlight(image, combined_mask, color=(50, 50, 50), label="Smut")
-
-def highlight_powdery_mildew(image):
-    # White to greyish-white powdery coating
-    leaf_mask = get_leaf_mask(image)
-    lower = np.array([0, 0, 200])
-    upper = np.array([180, 40, 255])
-    
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    color_mask = cv2.inRange(hsv, lower, upper)
-    combined_mask = cv2.bitwise_and(color_mask, leaf_mask)
-    
-    return draw_highlight(image, combined_mask, color=(255, 255, 255), label="Powdery Mildew")
-
-def highlight_septoria(image):
-    # Tan, lens-shaped lesions with yellow halo and tiny black specks
-    leaf_mask = get_leaf_mask(image)
-    lower = np.array([10, 50, 50])
-    upper = np.array([30, 255, 200])
-    
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    color_mask = cv2.inRange(hsv, lower, upper)
-    combined_mask = cv2.bitwise_and(color_mask, leaf_mask)
-    
-    return draw_highlight(image, combined_mask, color=(0, 255, 0), label="Septoria")
-
-def highlight_tan_spot(image):
-    # Oval-shaped, tan lesions with dark brown center and yellow halo
-    lower = np.array([10, 40, 40])
-    upper = np.array([25, 255, 255])
-    _, mask = apply_color_mask(image, lower, upper)
-    return draw_highlight(image, mask, color=(50, 100, 150), label="Tan Spot")
-
-def highlight_common_root_rot(image):
-    # Dark brown to black discolouration and decay at base
-    lower = np.array([0, 0, 0])
-    upper = np.array([20, 255, 80])
-    _, mask = apply_color_mask(image, lower, upper)
-    return draw_highlight(image, mask, color=(40, 40, 40), label="Common Root Rot")
-
-def highlight_aphid(image):
-    # Small, green or brown insects
-    lower = np.array([30, 50, 50])
-    upper = np.array([90, 255, 255]) # Green aphids
-    _, mask = apply_color_mask(image, lower, upper)
-    return draw_highlight(image, mask, color=(0, 100, 0), label="Aphids")
-
-def highlight_mite(image):
-    # Stippling (tiny white or yellow spots)
-    # Focusing on light green spots
-    leaf_mask = get_leaf_mask(image)
-    lower_light_green = np.array([35, 40, 100])
-    upper_light_green = np.array([85, 255, 255])
-    
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    color_mask = cv2.inRange(hsv, lower_light_green, upper_light_green)
-    combined_mask = cv2.bitwise_and(color_mask, leaf_mask)
-    
-    return draw_highlight(image, combined_mask, color=(255, 255, 0), label="Mites")
-
-def highlight_stem_fly(image):
-    # Central leaf withering (dead heart), tunneling
-    lower = np.array([0, 0, 100])
-    upper = np.array([180, 30, 200]) # Example for withered/dried tissue
-    _, mask = apply_color_mask(image, lower, upper)
-    return draw_highlight(image, mask, color=(128, 128, 128), label="Stem Fly")
-
-def highlight_leaf_blight(image):
-    leaf_mask = get_leaf_mask(image)
-    lower_yellow_brown = np.array([10, 50, 20])
-    upper_yellow_brown = np.array([30, 255, 200])
-    
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    color_mask = cv2.inRange(hsv, lower_yellow_brown, upper_yellow_brown)
-    combined_mask = cv2.bitwise_and(color_mask, leaf_mask)
-    
-    return draw_highlight(image, combined_mask, color=(0, 50, 100), label="Leaf Blight")
-
-def highlight_healthy(image):
-    return image
-
-# --- Dispatcher ---
+class MaskContext:
+    """
+    Per-image intermediates shared by every highlight spec.
+    All masks are computed on the downscaled working image; HSV, the blurred grayscale
+    and the leaf mask are each computed at most once per image.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.work = resize_to_max_side(image, WORK_MAX_SIDE)
+        self.scale = max(self.work.shape[:2]) / REFERENCE_SIDE
+        self._hsv = None
+        self._class_bits = None
+        self._blurred = None
+        self._leaf_mask = None
+
+    @property
+    def hsv(self):
+        if self._hsv is None:
+            self._hsv = cv2.cvtColor(self.work, cv2.COLOR_BGR2HSV)
+        return self._hsv
+
+    @property
+    def class_bits(self):
+        """Per-pixel class-membership bitmask from a single HSV_LUT lookup."""
+        if self._class_bits is None:
+            hsv = self.hsv
+            index = (
+                (hsv[..., 0].astype(np.int32) << 16)
+                | (hsv[..., 1].astype(np.int32) << 8)
+                | hsv[..., 2]
+            )
+            self._class_bits = np.take(HSV_LUT.reshape(-1), index)
+        return self._class_bits
+
+    def color_mask(self, predicted_class):
+        """Returns the 0/255 HSV-range mask of one class as a bit test on `class_bits`."""
+        bits = cv2.bitwise_and(self.class_bits, CLASS_BITS[predicted_class])
+        return cv2.compare(bits, 0, cv2.CMP_GT)
+
+    @property
+    def blurred(self):
+        if self._blurred is None:
+            gray = cv2.cvtColor(self.work, cv2.COLOR_BGR2GRAY)
+            ksize = scaled_kernel_size(5, self.scale)
+            self._blurred = cv2.GaussianBlur(gray, (ksize, ksize), 0)
+        return self._blurred
+
+    @property
+    def leaf_mask(self):
+        if self._leaf_mask is None:
+            self._leaf_mask = get_leaf_mask(
+                self.work, blurred=self.blurred, kernel=self.kernel(cv2.MORPH_RECT, 5)
+            )
+        return self._leaf_mask
+
+    def kernel(self, shape, size):
+        """Returns the structuring element for a reference kernel size at this image's scale."""
+        return get_kernel(shape, scaled_kernel_size(size, self.scale))
+
+    def find_contours(self, mask):
+        """Finds external contours in a working-size mask, dropping resolution-normalized noise."""
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = MIN_CONTOUR_AREA * self.scale ** 2
+        return [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
+
+# --- Declarative Heuristics for 15 Diseases ---
+# Each spec lists HSV (lower, upper) ranges that are OR-ed together, morphology steps
+# applied in order as (op, kernel shape, kernel size), whether the result is clipped
+# to the detected leaf, and the contour color (BGR) and label used for drawing.
 
 DISPATCHER = {
-    "Black Rust": highlight_black_rust,
-    "Yellow Rust": highlight_yellow_rust,
-    "Brown Rust": highlight_brown_rust,
-    "Blast": highlight_wheat_blast,
-    "Fusarium Head Blight": highlight_fusarium_head_blight,
-    "Smut": highlight_smut,
-    "Mildew": highlight_powdery_mildew,
-    "Septoria": highlight_septoria,
-    "Tan spot": highlight_tan_spot,
-    "Common Root Rot": highlight_common_root_rot,
-    "Aphid": highlight_aphid,
-    "Mite": highlight_mite,
-    "Stem fly": highlight_stem_fly,
-    "Leaf Blight": highlight_leaf_blight,
-    "Healthy": highlight_healthy
+    "Black Rust": {
+        # Elongated, dark reddish-brown to black pustules on stems/sheaths
+        "ranges": [([0, 50, 20], [20, 255, 100]), ([5, 100, 50], [15, 255, 200])],
+        "morphology": [],
+        "use_leaf_mask": False,
+        "color": (0, 0, 0),
+        "label": "Black Rust (with brown spots)",
+    },
+    "Yellow Rust": {
+        # Bright yellow pustules in linear rows (stripes)
+        "ranges": [([20, 100, 100], [35, 255, 255])],
+        "morphology": [],
+        "use_leaf_mask": False,
+        "color": (0, 255, 255),
+        "label": "Yellow Rust",
+    },
+    "Brown Rust": {
+        # Small, orange-brown pustules scattered irregularly; the spots are quite "rusty".
+        # Closing joins the dense scattered spots, opening removes very tiny noise.
+        "ranges": [([0, 50, 40], [20, 255, 200])],
+        "morphology": [("close", cv2.MORPH_ELLIPSE, 7), ("open", cv2.MORPH_ELLIPSE, 3)],
+        "use_leaf_mask": True,
+        "color": (0, 69, 139),
+        "label": "Brown Rust",
+    },
+    "Blast": {
+        # Sudden bleaching, eye-shaped lesion on stem
+        "ranges": [([0, 0, 180], [180, 30, 255])],
+        "morphology": [],
+        "use_leaf_mask": False,
+        "color": (255, 255, 255),
+        "label": "Wheat Blast",
+    },
+    "Fusarium Head Blight": {
+        # Bleached or tan spikelets, pink/orange/yellowish-brown fungal growth
+        "ranges": [([0, 30, 100], [20, 255, 255]), ([20, 40, 100], [40, 255, 255])],
+        "morphology": [("close", cv2.MORPH_RECT, 5)],
+        "use_leaf_mask": True,
+        "color": (0, 0, 139),
+        "label": "Fusarium Head Blight",
+    },
+    "Smut": {
+        # Dusty mass of olive-black spores, focusing on the dark-reddish-brownish part
+        "ranges": [([0, 50, 20], [20, 255, 150])],
+        "morphology": [],
+        "use_leaf_mask": True,
+        "color": (50, 50, 50),
+        "label": "Smut",
+    },
+    "Mildew": {
+        # White to greyish-white powdery coating
+        "ranges": [([0, 0, 200], [180, 40, 255])],
+        "morphology": [],
+        "use_leaf_mask": True,
+        "color": (255, 255, 255),
+        "label": "Powdery Mildew",
+    },
+    "Septoria": {
+        # Tan, lens-shaped lesions with yellow halo and tiny black specks
+        "ranges": [([10, 50, 50], [30, 255, 200])],
+        "morphology": [],
+        "use_leaf_mask": True,
+        "color": (0, 255, 0),
+        "label": "Septoria",
+    },
+    "Tan spot": {
+        # Oval-shaped, tan lesions with dark brown center and yellow halo
+        "ranges": [([10, 40, 40], [25, 255, 255])],
+        "morphology": [],
+        "use_leaf_mask": False,
+        "color": (50, 100, 150),
+        "label": "Tan Spot",
+    },
+    "Common Root Rot": {
+        # Dark brown to black discolouration and decay at base
+        "ranges": [([0, 0, 0], [20, 255, 80])],
+        "morphology": [],
+        "use_leaf_mask": False,
+        "color": (40, 40, 40),
+        "label": "Common Root Rot",
+    },
+    "Aphid": {
+        # Small, green or brown insects
+        "ranges": [([30, 50, 50], [90, 255, 255])],
+        "morphology": [],
+        "use_leaf_mask": False,
+        "color": (0, 100, 0),
+        "label": "Aphids",
+    },
+    "Mite": {
+        # Stippling (tiny white or yellow spots), focusing on light green spots
+        "ranges": [([35, 40, 100], [85, 255, 255])],
+        "morphology": [],
+        "use_leaf_mask": True,
+        "color": (255, 255, 0),
+        "label": "Mites",
+    },
+    "Stem fly": {
+        # Central leaf withering (dead heart), tunneling; withered/dried tissue
+        "ranges": [([0, 0, 100], [180, 30, 200])],
+        "morphology": [],
+        "use_leaf_mask": False,
+        "color": (128, 128, 128),
+        "label": "Stem Fly",
+    },
+    "Leaf Blight": {
+        # Yellow-brown necrotic lesions
+        "ranges": [([10, 50, 20], [30, 255, 200])],
+        "morphology": [],
+        "use_leaf_mask": True,
+        "color": (0, 50, 100),
+        "label": "Leaf Blight",
+    },
+    # Healthy leaves are returned unchanged
+    "Healthy": None,
 }
 
+# --- HSV Lookup Table ---
+# Every (H, S, V) triple maps to a uint16 whose bit k is set when the colour falls inside
+# any range of the k-th spec, so one lookup per pixel yields the colour masks of all classes.
+# Built once at import (180 * 256 * 256 entries, about 24 MB).
+
+CLASS_BITS = {}
+HSV_LUT = np.zeros((180, 256, 256), dtype=np.uint16)
+
+def build_hsv_lut():
+    """Fills HSV_LUT and CLASS_BITS from the DISPATCHER ranges."""
+    HSV_LUT.fill(0)
+    CLASS_BITS.clear()
+    for bit_index, (predicted_class, spec) in enumerate(
+        (name, spec) for name, spec in DISPATCHER.items() if spec is not None
+    ):
+        bit = 1 << bit_index
+        CLASS_BITS[predicted_class] = bit
+        for lower, upper in spec["ranges"]:
+            HSV_LUT[
+                lower[0]:upper[0] + 1,
+                lower[1]:upper[1] + 1,
+                lower[2]:upper[2] + 1,
+            ] |= bit
+
+build_hsv_lut()
+
+# --- Engine ---
+
+def build_mask(context, predicted_class):
+    """Builds the binary mask for one class using the shared per-image context."""
+    spec = DISPATCHER[predicted_class]
+    mask = context.color_mask(predicted_class)
+
+    for op, shape, size in spec["morphology"]:
+        mask = cv2.morphologyEx(mask, MORPH_OPS[op], context.kernel(shape, size))
+
+    if spec["use_leaf_mask"]:
+        # CRITICAL: Intersection with leaf mask to ONLY highlight spots on the leaf
+        mask = cv2.bitwise_and(mask, context.leaf_mask)
+    return mask
+
+def highlight(image, predicted_class, context=None, base=None):
+    """
+    Applies the spec for `predicted_class` to a BGR image and returns a display-size annotated copy.
+    `predicted_class` may also be a list of classes (e.g. the top-k predictions), which are all
+    drawn from the same per-image LUT lookup. Masks come from the working image; only the
+    contours are scaled up for drawing. `base` optionally replaces the display image the
+    contours are drawn on (e.g. a CAM blend).
+    """
+    classes = [predicted_class] if isinstance(predicted_class, str) else list(predicted_class)
+    display = base if base is not None else resize_to_max_side(image, DISPLAY_MAX_SIDE)
+    classes = [name for name in classes if DISPATCHER[name] is not None]
+    if not classes:
+        return display
+
+    context = context or MaskContext(image)
+    display_side = max(display.shape[:2])
+    to_display = display_side / max(context.work.shape[:2])
+    output = display.copy()
+    for row, name in enumerate(classes):
+        spec = DISPATCHER[name]
+        contours = context.find_contours(build_mask(context, name))
+        contours = [np.round(cnt * to_display).astype(np.int32) for cnt in contours]
+        draw_contours(
+            output,
+            contours,
+            color=spec["color"],
+            label=spec["label"],
+            scale=display_side / REFERENCE_SIDE,
+            label_row=row,
+            copy=False,
+        )
+    return output
+
+# --- Class Activation Maps ---
+
+def compute_cam(features, class_weights):
+    """
+    Builds a class activation map from a (C, H, W) feature map and the classifier
+    weights (C,) of one class with a single matmul. Returns an (H, W) map in [0, 1].
+    """
+    channels, height, width = features.shape
+    cam = class_weights.astype(np.float32) @ features.reshape(channels, height * width)
+    cam = np.maximum(cam, 0)
+    peak = cam.max()
+    if peak > 0:
+        cam /= peak
+    return cam.reshape(height, width)
+
+def pack_cam(cam):
+    """Packs a low-resolution CAM as URL-safe base64 (height, width, then uint8 values)."""
+    height, width = cam.shape
+    payload = bytes([height, width]) + np.round(cam * 255).astype(np.uint8).tobytes()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def unpack_cam(token):
+    """Inverse of pack_cam; returns None for malformed input."""
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        height, width = payload[0], payload[1]
+        values = np.frombuffer(payload[2:], dtype=np.uint8)
+        if values.size != height * width:
+            return None
+        return values.reshape(height, width).astype(np.float32) / 255.0
+    except Exception:
+        return None
+
+def cam_digest(token):
+    """Short stable digest of a packed CAM, used in cache keys."""
+    return hashlib.sha1(token.encode()).hexdigest()[:10]
+
+def render_cam(image, cam, alpha=CAM_ALPHA):
+    """Blends an upsampled CAM heatmap over a display-size copy of the image."""
+    display = resize_to_max_side(image, DISPLAY_MAX_SIDE)
+    height, width = display.shape[:2]
+    heat = cv2.resize(cam, (width, height), interpolation=cv2.INTER_CUBIC)
+    heat = np.clip(heat * 255, 0, 255).astype(np.uint8)
+    heatmap = cv2.applyColorMap(heat, cv2.COLORMAP_JET)
+    return cv2.addWeighted(display, 1 - alpha, heatmap, alpha, 0)
+
+def bgr_to_hex(color):
+    """Converts a BGR tuple to a CSS hex color."""
+    blue, green, red = color
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+def analyze_lesions(image, predicted_class, context=None, output_size=None, max_lesions=MAX_LESIONS):
+    """
+    Returns structured lesion results instead of a rendered overlay.
+    Components come from cv2.connectedComponentsWithStats on the working-size mask; bounding
+    boxes and simplified polygons are reported in `output_size` (width, height) pixel
+    coordinates, defaulting to the image's own size, and the infected area is the share of
+    leaf-mask pixels covered by kept lesions.
+    """
+    spec = DISPATCHER.get(predicted_class)
+    width, height = output_size or (image.shape[1], image.shape[0])
+    result = {
+        "label": predicted_class,
+        "width": width,
+        "height": height,
+        "color": None,
+        "lesion_count": 0,
+        "infected_area_pct": 0.0,
+        "lesions": [],
+    }
+    if spec is None:
+        return result
+
+    context = context or MaskContext(image)
+    mask = build_mask(context, predicted_class)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    # Component 0 is the background
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    min_area = MIN_CONTOUR_AREA * context.scale ** 2
+    kept = np.flatnonzero(areas > min_area) + 1
+
+    leaf = context.leaf_mask > 0
+    if not leaf.any():
+        leaf = np.ones_like(leaf)
+    infected = np.isin(labels, kept) & leaf
+    to_original = width / context.work.shape[1]
+    epsilon = 1.5 * context.scale
+
+    lesions = []
+    for index in kept[np.argsort(-stats[kept, cv2.CC_STAT_AREA])][:max_lesions]:
+        x, y, w, h, area = stats[index]
+        component = (labels[y:y + h, x:x + w] == index).astype(np.uint8)
+        contours, _ = cv2.findContours(component, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        polygon = cv2.approxPolyDP(max(contours, key=cv2.contourArea), epsilon, True)
+        polygon = (polygon.reshape(-1, 2) + (x, y)) * to_original
+        lesions.append(
+            {
+                "bbox": [int(round(v * to_original)) for v in (x, y, w, h)],
+                "area": int(round(area * to_original ** 2)),
+                "polygon": np.round(polygon).astype(int).tolist(),
+            }
+        )
+
+    result.update(
+        {
+            "color": bgr_to_hex(spec["color"]),
+            "lesion_count": int(len(kept)),
+            "infected_area_pct": round(100.0 * np.count_nonzero(infected) / np.count_nonzero(leaf), 2),
+            "lesions": lesions,
+        }
+    )
+    return result
+
+def read_image(image_path):
+    """
+    Decodes an upload as BGR for overlay rendering.
+    Large JPEGs are decoded at a reduced scale as long as the result still covers the display size.
+    """
+    flag = cv2.IMREAD_COLOR
+    try:
+        with Image.open(image_path) as header:
+            longest = max(header.size)
+            is_jpeg = header.format == "JPEG"
+    except Exception:
+        return None
+
+    if is_jpeg:
+        for factor, reduced_flag in REDUCED_READ_FLAGS:
+            if longest // factor >= DISPLAY_MAX_SIDE:
+                flag = reduced_flag
+                break
+    return cv2.imread(image_path, flag)
+
+def encode_image(image, fmt=None, quality=None):
+    """Encodes a BGR image in memory and returns the bytes, or None if encoding fails."""
+    fmt = (fmt or OVERLAY_FORMAT).lower().lstrip(".")
+    quality = OVERLAY_QUALITY if quality is None else quality
+    params = [ENCODE_PARAMS[fmt], quality] if fmt in ENCODE_PARAMS else []
+    ok, buffer = cv2.imencode(f".{fmt}", image, params)
+    return buffer.tobytes() if ok else None
+
+def render_highlight(image, predicted_class, fmt=None, quality=None, mode="heuristic", cam=None):
+    """
+    Renders the overlay for an already-decoded BGR image and returns encoded bytes.
+    Output is display-size and defaults to WebP, so nothing touches the disk.
+    `predicted_class` may be a list of classes to overlay together. `mode` selects the heuristic overlay, the CAM heatmap (needs `cam`), or both.
+    """
+    classes = [predicted_class] if isinstance(predicted_class, str) else list(predicted_class)
+    if not classes or any(name not in DISPATCHER for name in classes):
+        return None
+    if mode == "heuristic" or cam is None:
+        rendered = highlight(image, predicted_class)
+    elif mode == "cam":
+        rendered = render_cam(image, cam)
+    else:
+        rendered = highlight(image, predicted_class, base=render_cam(image, cam))
+    return encode_image(rendered, fmt=fmt, quality=quality)
+
+def lesion_stats_for_file(image_path, predicted_class):
+    """Computes lesion statistics for an upload, in the coordinates of the stored file."""
+    try:
+        with Image.open(image_path) as header:
+            output_size = header.size
+            # Browsers and cv2 both honour EXIF rotation, so report the oriented size
+            if header.getexif().get(0x0112) in (5, 6, 7, 8):
+                output_size = output_size[::-1]
+    except Exception:
+        return None
+    image = read_image(image_path)
+    if image is None:
+        return None
+    return analyze_lesions(image, predicted_class, output_size=output_size)
+
 def highlight_infection(image_path, predicted_class, output_path):
     """
     Main entry point to apply highlighting based on prediction.
+    The output format follows the extension of `output_path`.
     """
-    image = cv2.imread(image_path)
+    image = read_image(image_path)
     if image is None:
         return False
-    
-    if predicted_class in DISPATCHER:
-        processed_image = DISPATCHER[predicted_class](image)
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        cv2.imwrite(output_path, processed_image)
-        return True
-    else:
+
+    data = render_highlight(image, predicted_class, fmt=os.path.splitext(output_path)[1])
+    if data is None:
         return False
+
+    # Ensure directory exists
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return True
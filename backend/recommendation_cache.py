@@ -0,0 +1,167 @@
+"""
+Cache for generated treatment recommendations, keyed by disease, weather bands, a ~1 degree
+location cell and a hash of the questionnaire answers. Place names and weather readings are
+stored as $placeholders and filled in for each farm when served.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from string import Template
+
+from json_journal import JournaledJsonStore
+from recommendation_templates import TEMPLATE_FIELDS, template_values
+
+RECOMMENDATION_TTL = int(os.getenv("RECOMMENDATION_TTL", 24 * 3600))
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", 1000))
+# Optional persistence across restarts; empty disables it
+RECOMMENDATION_CACHE_PATH = os.getenv("RECOMMENDATION_CACHE_PATH", "")
+LOCATION_GRID_DEGREES = 1.0
+
+# Band edges; a value falls in band i when edges[i-1] <= value < edges[i]
+TEMPERATURE_BANDS = [10, 15, 20, 25, 30, 35]  # deg C
+HUMIDITY_BANDS = [40, 60, 80]  # %
+PRECIPITATION_BANDS = [0.1, 2, 10]  # mm
+
+# Farm-specific strings the prompt puts in the text: names, and readings with the unit that follows them
+PLACEHOLDER_NAMES = ("city", "country", "condition")
+PLACEHOLDER_READINGS = {"temp_c": r"\s?°\s?C", "humidity": r"\s?%", "precip_mm": r"\s?mm"}
+
+COORDINATES_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def band(value, edges):
+    try:
+        return bisect_right(edges, float(value))
+    except (TypeError, ValueError):
+        return "na"
+
+
+def coarse_location(location):
+    """'lat,lon' -> rounded cell, anything else -> lowercased place name."""
+    loc = str(location.get("loc") or "")
+    match = COORDINATES_PATTERN.match(loc)
+    if match and loc.replace(" ", "") != "0,0":
+        lat, lon = (round(float(value) / LOCATION_GRID_DEGREES) * LOCATION_GRID_DEGREES for value in match.groups())
+        return f"{lat:.0f},{lon:.0f}"
+    place = loc if loc and loc != "0,0" else location.get("city", "")
+    return re.sub(r"\s+", " ", str(place).strip().lower()) or "unknown"
+
+
+def questionnaire_fingerprint(answers):
+    """Order-, case- and whitespace-insensitive hash of the non-empty answers."""
+    normalized = {}
+    for key, value in (answers or {}).items():
+        if isinstance(value, list):
+            value = sorted(str(item).strip().lower() for item in value if str(item).strip())
+        else:
+            value = str(value).strip().lower() if value is not None else ""
+        if value:
+            normalized[str(key).strip().lower()] = value
+    payload = json.dumps(normalized, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def recommendation_key(user_data):
+    """Cache key for the user_data dict passed to get_openai_recommendation."""
+    weather = user_data.get("weather", {})
+    return "|".join(
+        [
+            str(user_data.get("disease_detected", "None")).strip().lower(),
+            f"t{band(weather.get('temp_c'), TEMPERATURE_BANDS)}",
+            f"h{band(weather.get('humidity'), HUMIDITY_BANDS)}",
+            f"p{band(weather.get('precip_mm'), PRECIPITATION_BANDS)}",
+            coarse_location(user_data.get("location", {})),
+            questionnaire_fingerprint(user_data.get("questionnaire_answers")),
+        ]
+    )
+
+
+def generalize_recommendation(text, user_data):
+    """Replaces this farm's place name and weather readings in generated HTML with $placeholders."""
+    values = template_values(user_data)
+    text = text.replace("$", "$$")
+    for field in PLACEHOLDER_NAMES:
+        value = values[field]
+        if value == TEMPLATE_FIELDS[field] or len(value) < 3:
+            continue
+        text = re.sub(rf"(?<!\w){re.escape(value)}(?!\w)", f"${{{field}}}", text, flags=re.IGNORECASE)
+    for field, unit in PLACEHOLDER_READINGS.items():
+        try:
+            number = float(values[field])
+        except ValueError:
+            continue
+        for form in sorted({values[field], f"{number:g}", f"{number:.1f}", str(round(number))}, key=len, reverse=True):
+            text = re.sub(rf"(?<![\d.]){re.escape(form)}(?={unit})", f"${{{field}}}", text)
+    return text
+
+
+def personalize_recommendation(text, user_data):
+    """Fills the placeholders left by generalize_recommendation with this farm's values."""
+    return Template(text).safe_substitute(template_values(user_data))
+
+
+class RecommendationCache:
+    """TTL + LRU cache of recommendation HTML, optionally persisted through a write-behind journal."""
+
+    def __init__(self, ttl=RECOMMENDATION_TTL, max_entries=RECOMMENDATION_CACHE_MAX_ENTRIES, path=RECOMMENDATION_CACHE_PATH):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (created_at epoch seconds, text), least recently used first
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+        self.store = JournaledJsonStore(path) if path else None
+        if self.store is not None:
+            self.load()
+
+    def load(self):
+        """Restores unexpired entries from disk, oldest first."""
+        now = time.time()
+        records = sorted(
+            (record["created_at"], key, record["text"])
+            for key, record in self.store.load().items()
+            if now - record.get("created_at", 0) < self.ttl
+        )
+        for created_at, key, text in records[-self.max_entries:]:
+            self.entries[key] = (created_at, text)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] >= self.ttl:
+                self.drop(key)
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+    def put(self, key, text):
+        created_at = time.time()
+        with self.lock:
+            self.entries[key] = (created_at, text)
+            self.entries.move_to_end(key)
+            if self.store is not None:
+                self.store.set(key, {"created_at": created_at, "text": text})
+            while len(self.entries) > self.max_entries:
+                self.drop(next(iter(self.entries)))
+
+    def drop(self, key):
+        """Removes an entry. Caller holds the lock."""
+        self.entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+
+    def metrics(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["entries"] = len(self.entries)
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_ratio"] = round(counters["hits"] / lookups, 4) if lookups else None
+        return counters
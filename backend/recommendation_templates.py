@@ -0,0 +1,165 @@
+"""
+Per-disease recommendation templates, generated offline with `python recommendation_templates.py`.
+Only the farm-specific section is left for the LLM, streamed into PERSONALIZED_SLOT.
+"""
+import os
+import sys
+import json
+import html
+import threading
+from datetime import datetime
+from string import Template
+
+from class_names import CLASS_NAMES
+
+TEMPLATES_PATH = os.getenv(
+    "RECOMMENDATION_TEMPLATES_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "recommendation_templates.json"),
+)
+
+# Placeholders a template may use, and the value shown when the farmer didn't provide one
+TEMPLATE_FIELDS = {
+    "city": "your area",
+    "country": "",
+    "temp_c": "N/A",
+    "humidity": "N/A",
+    "condition": "current",
+    "precip_mm": "0",
+    "soil_type": "not specified",
+    "irrigation_method": "not specified",
+    "fertilizer_used": "not specified",
+    "pesticide_used": "not specified",
+    "crop_rotation": "not specified",
+}
+
+PERSONALIZED_SLOT = '<div id="personalizedSection"></div>'
+PERSONALIZED_SECTION = """
+<div class="personalized-section mb-6 bg-indigo-50 p-4 rounded-lg border-l-4 border-indigo-500">
+  <h3 class="text-xl font-bold text-indigo-800 mb-3">IV. For Your Farm Today</h3>
+  {slot}
+</div>
+"""
+
+_lock = threading.Lock()
+_cached = None  # (mtime, templates)
+
+
+def get_templates():
+    """{disease: template HTML}, reloaded only when the file changes. Empty if never built."""
+    global _cached
+    try:
+        mtime = os.path.getmtime(TEMPLATES_PATH)
+    except OSError:
+        return {}
+    with _lock:
+        if _cached is None or _cached[0] != mtime:
+            try:
+                with open(TEMPLATES_PATH, "r") as f:
+                    _cached = (mtime, json.load(f).get("templates", {}))
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Error loading recommendation templates: {e}")
+                _cached = (mtime, {})
+        return _cached[1]
+
+
+def template_values(user_data):
+    """Escaped placeholder values from the user_data passed to the recommendation functions."""
+    weather = user_data.get("weather", {})
+    location = user_data.get("location", {})
+    answers = user_data.get("questionnaire_answers", {}) or {}
+    raw = {
+        "city": location.get("city"),
+        "country": location.get("country"),
+        "temp_c": weather.get("temp_c"),
+        "humidity": weather.get("humidity"),
+        "condition": weather.get("condition"),
+        "precip_mm": weather.get("precip_mm"),
+        **{key: answers.get(key) for key in TEMPLATE_FIELDS if key in answers},
+    }
+    values = {}
+    for key, default in TEMPLATE_FIELDS.items():
+        value = raw.get(key)
+        if isinstance(value, list):
+            value = ", ".join(str(item) for item in value)
+        if value in (None, "", "Unknown"):
+            value = default
+        values[key] = html.escape(str(value))
+    return values
+
+
+def render_base_recommendation(user_data, personalized=None):
+    """
+    Fills the disease's template for this farm and appends the personalised section, holding
+    `personalized` HTML if given or an empty slot to stream into. None if there is no template.
+    """
+    template = get_templates().get(user_data.get("disease_detected"))
+    if not template:
+        return None
+    body = Template(template).safe_substitute(template_values(user_data))
+    slot = (
+        PERSONALIZED_SLOT.replace("></div>", f">{personalized}</div>")
+        if personalized
+        else PERSONALIZED_SLOT
+    )
+    return body + PERSONALIZED_SECTION.format(slot=slot)
+
+
+def build_template_prompt(disease):
+    placeholders = ", ".join(f"${name}" for name in TEMPLATE_FIELDS)
+    return f"""
+Write the general part of a treatment recommendation for wheat affected by {disease}, for farmers in India.
+It is shown to many farmers, so do not assume any particular farm. Where a sentence depends on the farm,
+use these placeholders exactly as written and nothing else starting with $: {placeholders}.
+
+Return ONLY HTML, no markdown and no code blocks, with exactly these sections:
+
+<div class="analysis-section mb-6">
+  <h3 class="text-xl font-bold text-blue-800 border-b-2 border-blue-200 pb-2 mb-4">I. Scientific Analysis</h3>
+  [Pathogen or pest biology, lifecycle, spread and the weather conditions that favour it. Mention that
+  conditions in $city are currently $condition at $temp_c°C and $humidity% humidity.]
+</div>
+<div class="actions-section mb-6 bg-red-50 p-4 rounded-lg border-l-4 border-red-500">
+  <h3 class="text-xl font-bold text-red-800 mb-3">II. Immediate Rescue Actions</h3>
+  [<ul class="list-disc pl-5 space-y-3"> of cultural actions, active ingredients with how they work,
+  dosage, timing and safety.]
+</div>
+<div class="prevention-section mb-6 bg-green-50 p-4 rounded-lg border-l-4 border-green-500">
+  <h3 class="text-xl font-bold text-green-800 mb-3">III. Long-term Management Plan</h3>
+  [<ul class="list-disc pl-5 space-y-3"> on soil and nutrients (the farm's soil is $soil_type), irrigation
+  ($irrigation_method), rotation and resistant varieties.]
+</div>
+"""
+
+
+def build_templates(diseases=None, path=TEMPLATES_PATH):
+    """Generates a template per disease with the LLM and writes them atomically to `path`."""
+    from openai_integration import MODEL_TO_USE, SYSTEM_PROMPT, stream_chat
+
+    templates = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            templates = json.load(f).get("templates", {})
+
+    for disease in diseases or list(CLASS_NAMES.values()):
+        print(f"Generating template for {disease}...")
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_template_prompt(disease)},
+        ]
+        templates[disease] = "".join(stream_chat(messages)).strip()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {"generated_at": datetime.utcnow().isoformat(), "model": MODEL_TO_USE, "templates": templates},
+            f,
+            indent=2,
+        )
+    os.replace(tmp_path, path)
+    print(f"Wrote {len(templates)} templates to {path}")
+
+
+if __name__ == "__main__":
+    # python recommendation_templates.py [disease ...]  (defaults to every class)
+    build_templates(sys.argv[1:] or None)
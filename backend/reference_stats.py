@@ -0,0 +1,152 @@
+"""
+In-memory statistics of the reference dataset (class counts, confidence histogram, confusion
+counts), reloaded only when the file changes.
+A compact npz sidecar (`python reference_stats.py`) is preferred over the CSV when it is at least as new.
+"""
+import os
+import hashlib
+import threading
+from collections import Counter
+
+import numpy as np
+
+from drift_metrics import binned_counts
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+REFERENCE_PATH = os.path.join(STATIC_DIR, "reference_data.csv")
+REFERENCE_SIDECAR_PATH = os.path.join(STATIC_DIR, "reference_data.npz")
+REFERENCE_COLUMNS = ("target", "prediction", "confidence")
+
+_lock = threading.Lock()
+_cached = None
+
+
+class ReferenceStats:
+    """Precomputed summaries of one version of the reference dataset."""
+
+    def __init__(self, source, mtime, digest, target, prediction, confidence, confusion=None):
+        self.source = source
+        self.mtime = mtime
+        self.digest = digest
+        self.rows = len(prediction)
+        self.class_counts = {str(k): int(v) for k, v in Counter(prediction.tolist()).items()}
+        self.confidence_histogram = binned_counts(confidence[~np.isnan(confidence)])
+        self.accuracy = float(np.mean(target == prediction)) if self.rows else None
+        # confusion[i, j] = rows with target classes[i] predicted as classes[j]
+        self.classes, self.confusion = confusion or confusion_counts(target, prediction)
+
+    def confusion_dict(self):
+        return {"classes": self.classes.tolist(), "matrix": self.confusion.tolist()}
+
+
+def confusion_counts(target, prediction):
+    """(classes, (n_classes, n_classes) count matrix) over the union of target and predicted labels."""
+    classes, codes = np.unique(np.concatenate([target, prediction]).astype(str), return_inverse=True)
+    matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    np.add.at(matrix, (codes[: len(target)], codes[len(target):]), 1)
+    return classes, matrix
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def read_reference_csv(path):
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=list(REFERENCE_COLUMNS))
+    return (
+        df["target"].astype(str).to_numpy(),
+        df["prediction"].astype(str).to_numpy(),
+        df["confidence"].to_numpy(dtype=np.float64),
+    )
+
+
+def read_reference_sidecar(path):
+    with np.load(path, allow_pickle=False) as data:
+        return data["target"], data["prediction"], data["confidence"].astype(np.float64)
+
+
+def read_sidecar_confusion(path):
+    """The (classes, matrix) pair stored by write_reference_sidecar, or None for older sidecars."""
+    with np.load(path, allow_pickle=False) as data:
+        if "confusion" not in data.files:
+            return None
+        return data["classes"], data["confusion"]
+
+
+def reference_source():
+    """The sidecar when it is present and not older than the CSV, otherwise the CSV."""
+    if os.path.exists(REFERENCE_SIDECAR_PATH) and (
+        not os.path.exists(REFERENCE_PATH)
+        or os.path.getmtime(REFERENCE_SIDECAR_PATH) >= os.path.getmtime(REFERENCE_PATH)
+    ):
+        return REFERENCE_SIDECAR_PATH
+    if os.path.exists(REFERENCE_PATH):
+        return REFERENCE_PATH
+    return None
+
+
+def read_reference(source):
+    """(target, prediction, confidence) arrays from the sidecar or the CSV."""
+    reader = read_reference_sidecar if source.endswith(".npz") else read_reference_csv
+    return reader(source)
+
+
+def load_reference_frame():
+    """The reference columns as a DataFrame, read from the sidecar when available. None if missing."""
+    import pandas as pd
+
+    source = reference_source()
+    if source is None:
+        return None
+    return pd.DataFrame(dict(zip(REFERENCE_COLUMNS, read_reference(source))))
+
+
+def get_reference_stats():
+    """
+    Returns the cached ReferenceStats, reloading only when the source file changes.
+    A changed mtime with identical content (e.g. a fresh checkout) keeps the cache.
+    Returns None when no reference dataset exists.
+    """
+    global _cached
+    source = reference_source()
+    if source is None:
+        return None
+    mtime = os.path.getmtime(source)
+
+    with _lock:
+        if _cached is not None and _cached.source == source and _cached.mtime == mtime:
+            return _cached
+        digest = file_digest(source)
+        if _cached is not None and _cached.source == source and _cached.digest == digest:
+            _cached.mtime = mtime
+            return _cached
+
+        confusion = read_sidecar_confusion(source) if source.endswith(".npz") else None
+        _cached = ReferenceStats(source, mtime, digest, *read_reference(source), confusion=confusion)
+        print(f"Loaded reference statistics from {source} ({_cached.rows} rows)")
+        return _cached
+
+
+def write_reference_sidecar(csv_path=REFERENCE_PATH, sidecar_path=REFERENCE_SIDECAR_PATH):
+    """Converts the reference CSV into a compact npz with fixed-width string columns and the confusion counts."""
+    target, prediction, confidence = read_reference_csv(csv_path)
+    classes, confusion = confusion_counts(target, prediction)
+    np.savez_compressed(
+        sidecar_path,
+        target=target.astype(str),
+        prediction=prediction.astype(str),
+        confidence=confidence,
+        classes=classes,
+        confusion=confusion,
+    )
+    return sidecar_path
+
+
+if __name__ == "__main__":
+    print(f"Wrote {write_reference_sidecar()}")
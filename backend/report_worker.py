@@ -0,0 +1,120 @@
+"""
+Evidently report generation, run in a separate process by the observability scheduler:
+DATABASE_URL=... python report_worker.py <drift|performance> <output_dir> [<name> <since ISO>]
+It does not import the Flask app, so a spawned worker stays light.
+"""
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from feedback_queries import load_feedback_frame
+from reference_stats import load_reference_frame
+
+MIN_VERIFIED_RECORDS = 3
+REPORT_COLUMNS = {
+    "drift": ["predicted_class", "confidence"],
+    "performance": ["predicted_class", "confidence", "correct_class", "is_correct"],
+}
+
+
+def load_current_data(database_url, kind, since=None):
+    """Reads only the columns a report needs, optionally from `since` onwards, into a DataFrame."""
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            frame = load_feedback_frame(
+                REPORT_COLUMNS[kind], since=since, verified_only=kind != "drift", connection=conn
+            )
+    finally:
+        engine.dispose()
+    return frame.rename(columns={"predicted_class": "prediction"})
+
+
+def drift_report_html(ref_df, curr_df):
+    """Evidently Data & Target Drift report comparing reference to production predictions."""
+    if curr_df.empty:
+        return "<h3>No production predictions recorded yet. Submit feedback to see drift analysis.</h3>"
+
+    from evidently.legacy.report import Report
+    from evidently.legacy.metric_preset import DataDriftPreset
+    from evidently.legacy.pipeline.column_mapping import ColumnMapping
+
+    # Filter reference to the columns present in current_data to avoid partial column errors
+    ref_df = ref_df[["prediction", "confidence"]]
+
+    column_mapping = ColumnMapping()
+    column_mapping.prediction = "prediction"
+    column_mapping.numerical_features = ["confidence"]
+
+    report = Report(metrics=[DataDriftPreset(columns=["prediction", "confidence"])])
+    report.run(reference_data=ref_df, current_data=curr_df, column_mapping=column_mapping)
+    return report.get_html()
+
+
+def performance_report_html(ref_df, curr_df):
+    """Evidently Classification Performance report based on admin-verified feedback."""
+    if len(curr_df) < MIN_VERIFIED_RECORDS:
+        return (
+            "<h3>Insufficient verified data.</h3>"
+            f"<p>Currently, there are only {len(curr_df)} verified feedback records. "
+            f"At least {MIN_VERIFIED_RECORDS} verified records are required to generate the classification performance report.</p>"
+            "<p>To add verified feedback, go to the Admin panel and verify uploaded predictions.</p>"
+        )
+
+    from evidently.legacy.report import Report
+    from evidently.legacy.metric_preset import ClassificationPreset
+    from evidently.legacy.pipeline.column_mapping import ColumnMapping
+
+    # Target is the correct class if incorrect and correct_class is specified, else predicted_class
+    wrong = curr_df["correct_class"].notna() & ~curr_df["is_correct"].astype(bool)
+    curr_df = pd.DataFrame({
+        "target": curr_df["correct_class"].where(wrong, curr_df["prediction"]),
+        "prediction": curr_df["prediction"],
+        "confidence": curr_df["confidence"],
+    })
+
+    column_mapping = ColumnMapping()
+    column_mapping.target = "target"
+    column_mapping.prediction = "prediction"
+    column_mapping.numerical_features = ["confidence"]
+
+    report = Report(metrics=[ClassificationPreset()])
+    report.run(reference_data=ref_df, current_data=curr_df, column_mapping=column_mapping)
+    return report.get_html()
+
+
+REPORT_BUILDERS = {
+    "drift": drift_report_html,
+    "performance": performance_report_html,
+}
+
+
+def generate_report(kind, database_url, output_dir, name=None, since=None):
+    """
+    Builds one report and writes it atomically as `{name}_{timestamp}.html` in `output_dir`.
+    `name` defaults to the kind; windowed reports pass their own name and `since`.
+    Returns the snapshot path. The timestamp marks when the data was read.
+    """
+    generated_at = datetime.utcnow()
+    ref_df = load_reference_frame()
+    if ref_df is None:
+        html = "<h3>Reference dataset not found. Please pre-generate the reference CSV.</h3>"
+    else:
+        curr_df = load_current_data(database_url, kind, since=since)
+        html = REPORT_BUILDERS[kind](ref_df, curr_df)
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{name or kind}_{generated_at.strftime('%Y%m%dT%H%M%S')}.html")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp_path, path)
+    return path
+
+if __name__ == "__main__":
+    name = sys.argv[3] if len(sys.argv) > 3 else None
+    since = datetime.fromisoformat(sys.argv[4]) if len(sys.argv) > 4 else None
+    print(generate_report(sys.argv[1], os.environ["DATABASE_URL"], sys.argv[2], name=name, since=since))
@@ -0,0 +1,130 @@
+"""Image storage backends and a background queue that deletes uploaded images in batches."""
+import os
+import time
+import threading
+from urllib.parse import urlparse
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")  # 'cloudinary' or 'local'
+DELETE_BATCH_SIZE = 100  # Cloudinary's limit per delete_resources call
+DELETE_MAX_RETRIES = int(os.getenv("DELETE_MAX_RETRIES", 5))
+DELETE_RETRY_BACKOFF = float(os.getenv("DELETE_RETRY_BACKOFF", 5))  # Seconds, doubled per attempt
+
+
+def public_id_from_url(image_url, folder="wheat_disease"):
+    """
+    Cloudinary delivery URL -> public id, e.g. .../image/upload/v1712/wheat_disease/abc.jpg ->
+    'wheat_disease/abc'. Returns None for local uploads.
+    """
+    if not image_url or not image_url.startswith("http"):
+        return None
+    path = urlparse(image_url).path
+    if "/upload/" not in path:
+        return f"{folder}/{os.path.splitext(os.path.basename(path))[0]}"
+    parts = path.split("/upload/", 1)[1].split("/")
+    # Drop any transformation and version segments ahead of the public id
+    while len(parts) > 1 and ("," in parts[0] or (parts[0].startswith("v") and parts[0][1:].isdigit())):
+        parts = parts[1:]
+    return os.path.splitext("/".join(parts))[0]
+
+
+class CloudinaryStorage:
+    def delete(self, public_ids):
+        """Deletes up to 100 images in one API call; returns the ids that failed."""
+        import cloudinary.api
+
+        result = cloudinary.api.delete_resources(list(public_ids))
+        statuses = result.get("deleted", {})
+        # 'not_found' means the image is already gone, which is what we wanted
+        return [pid for pid in public_ids if statuses.get(pid) not in ("deleted", "not_found")]
+
+
+class LocalStorage:
+    """Stand-in for tests and local development: records deletions, optionally failing some."""
+
+    def __init__(self, fail_ids=None):
+        self.deleted = []
+        self.calls = 0
+        self.fail_ids = set(fail_ids or [])
+
+    def delete(self, public_ids):
+        self.calls += 1
+        failed = [pid for pid in public_ids if pid in self.fail_ids]
+        self.deleted.extend(pid for pid in public_ids if pid not in self.fail_ids)
+        return failed
+
+
+def get_storage(backend=STORAGE_BACKEND):
+    return LocalStorage() if backend == "local" else CloudinaryStorage()
+
+
+class DeletionQueue:
+    """
+    Background deleter: ids are grouped into batches of DELETE_BATCH_SIZE, and failed ids are
+    retried after DELETE_RETRY_BACKOFF * 2**attempt seconds, up to DELETE_MAX_RETRIES times.
+    """
+
+    def __init__(self, storage, batch_size=DELETE_BATCH_SIZE, max_retries=DELETE_MAX_RETRIES, backoff=DELETE_RETRY_BACKOFF):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pending = []  # (ready_at, attempt, public_id)
+        self.failed = []  # Ids given up on after max_retries
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def enqueue(self, public_ids):
+        now = time.monotonic()
+        with self.lock:
+            self.pending.extend((now, 0, pid) for pid in public_ids if pid)
+        self.wakeup.set()
+
+    def run_once(self):
+        """Deletes one batch of ready ids; returns how many were deleted."""
+        now = time.monotonic()
+        with self.lock:
+            ready = [item for item in self.pending if item[0] <= now][: self.batch_size]
+            for item in ready:
+                self.pending.remove(item)
+        if not ready:
+            return 0
+
+        ids = [pid for _, _, pid in ready]
+        try:
+            failed = set(self.storage.delete(ids))
+        except Exception as e:
+            print(f"Image deletion failed: {e}")
+            failed = set(ids)
+
+        with self.lock:
+            for _, attempt, pid in ready:
+                if pid not in failed:
+                    continue
+                if attempt + 1 >= self.max_retries:
+                    self.failed.append(pid)
+                    print(f"Giving up deleting image {pid} after {attempt + 1} attempts")
+                else:
+                    self.pending.append((now + self.backoff * 2 ** attempt, attempt + 1, pid))
+        return len(ids) - len(failed)
+
+    def next_wait(self):
+        """Seconds until the earliest pending id is due, or None when the queue is empty."""
+        with self.lock:
+            if not self.pending:
+                return None
+            return max(0.0, min(item[0] for item in self.pending) - time.monotonic())
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.next_wait())
+            self.wakeup.clear()
+            while self.run_once():
+                pass
+
+    def start(self):
+        """Starts the daemon worker thread once and returns it."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True, name="image-deleter")
+            self.thread.start()
+        return self.thread
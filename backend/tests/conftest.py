@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.fixture
+def app_context():
+    """Flask app context with the models created in an in-memory SQLite database."""
+    flask = pytest.importorskip("flask")
+    pytest.importorskip("flask_sqlalchemy")
+    from models import db
+
+    app = flask.Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+        db.drop_all()
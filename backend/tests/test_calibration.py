@@ -0,0 +1,52 @@
+"""Tests for the stored probability vectors and calibration analytics."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from calibration import get_calibration_summary, pack_probabilities, reliability_diagram
+from models import Feedback, db
+
+CLASSES = ["Brown Rust", "Healthy", "Septoria"]
+
+
+def test_ece_is_the_weighted_confidence_gap():
+    """ECE is the count-weighted gap between accuracy and confidence per bin."""
+    confidence = np.full(10, 0.75)
+    correct = np.arange(10) < 8  # 8 of 10 correct at 75% confidence -> gap 0.05
+    diagram = reliability_diagram(confidence, correct)
+    assert diagram["counts"][7] == 10
+    assert diagram["ece"] == pytest.approx(0.05)
+
+
+def test_summary_from_stored_blobs(app_context):
+    """Probability vectors round-trip as 2 bytes per class and drive top-k and ECE."""
+    rows = [
+        ([0.9, 0.05, 0.05], "Brown Rust", None, True),
+        ([0.6, 0.3, 0.1], "Brown Rust", "Healthy", False),
+        ([1 / 3, 1 / 3, 1 / 3], "Brown Rust", None, True),
+    ]
+    for probabilities, predicted, correct_class, is_correct in rows:
+        blob = pack_probabilities(probabilities)
+        assert len(blob) == 2 * len(CLASSES)
+        db.session.add(
+            Feedback(
+                image_url="leaf.jpg",
+                predicted_class=predicted,
+                correct_class=correct_class,
+                is_correct=is_correct,
+                is_verified=True,
+                probabilities=blob,
+            )
+        )
+    db.session.add(Feedback(image_url="old.jpg", predicted_class="Healthy"))
+    db.session.commit()
+
+    summary = get_calibration_summary(CLASSES)
+    assert summary["rows"] == summary["verified_rows"] == 3
+    assert summary["top_k"]["top_1"] == pytest.approx(2 / 3)
+    assert summary["top_k"]["top_3"] == 1.0
+    assert summary["entropy"]["counts"][-1] == 1  # the uniform vector
+    assert 0 < summary["reliability"]["ece"] < 1
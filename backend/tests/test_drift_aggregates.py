@@ -0,0 +1,124 @@
+"""Tests for the incrementally maintained drift aggregates."""
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from drift_aggregates import (
+    discount_feedback,
+    get_current_histograms,
+    get_drift_summary,
+    get_recent_histograms,
+    rollup_aggregates,
+)
+from models import DriftAggregate, Feedback, db
+
+
+def add_feedback(predicted_class, confidence, model_version="v1"):
+    feedback = Feedback(
+        image_url="leaf.jpg",
+        predicted_class=predicted_class,
+        confidence=confidence,
+        model_version=model_version,
+    )
+    db.session.add(feedback)
+    db.session.commit()
+    return feedback
+
+
+def test_inserts_update_aggregates_and_match_rollup(app_context):
+    """Each insert is counted once, and a full rollup reproduces the same table."""
+    add_feedback("Brown Rust", 99.95)
+    add_feedback("Brown Rust", 72.0)
+    add_feedback("Healthy", 100.0, model_version="v2")
+
+    histograms = get_current_histograms()
+    assert histograms["prediction"] == {"Brown Rust": 2, "Healthy": 1}
+    assert sum(histograms["confidence"].values()) == 3
+
+    before = sorted((a.day, a.model_version, a.feature, a.bucket, a.count) for a in DriftAggregate.query)
+    assert rollup_aggregates() == 6
+    after = sorted((a.day, a.model_version, a.feature, a.bucket, a.count) for a in DriftAggregate.query)
+    assert before == after
+
+    summary = get_drift_summary()
+    assert summary["total"] == 3
+    assert summary["model_versions"] == {"v1": 2, "v2": 1}
+    assert summary["features"]["prediction"]["psi"] > 0
+
+
+def test_deletes_are_uncounted(app_context):
+    """Both session.delete and a bulk DELETE with discount_feedback take rows out of the aggregates."""
+    from sqlalchemy import delete
+
+    first = add_feedback("Brown Rust", 90.0)
+    second = add_feedback("Brown Rust", 80.0)
+    third = add_feedback("Healthy", 70.0)
+
+    db.session.delete(first)
+    db.session.commit()
+    assert get_current_histograms()["prediction"] == {"Brown Rust": 1, "Healthy": 1}
+
+    ids = [second.id, third.id]
+    discount_feedback(ids)
+    db.session.execute(delete(Feedback).where(Feedback.id.in_(ids)), execution_options={"synchronize_session": False})
+    db.session.commit()
+    assert get_current_histograms()["prediction"] == {}
+    assert DriftAggregate.query.count() == 0
+
+
+def test_recent_window_is_rolling_not_calendar(app_context):
+    """The 24h view counts rows from the last 24 hours, including yesterday's."""
+    from datetime import datetime, timedelta
+
+    now = datetime.utcnow()
+    for hours, predicted_class in [(1, "Septoria"), (23, "Healthy"), (30, "Smut")]:
+        db.session.add(Feedback(
+            image_url="leaf.jpg", predicted_class=predicted_class, confidence=90.0,
+            model_version="v1", created_at=now - timedelta(hours=hours),
+        ))
+    db.session.commit()
+
+    recent = get_recent_histograms(now - timedelta(hours=24))
+    assert recent["prediction"] == {"Septoria": 1, "Healthy": 1}
+    assert get_recent_histograms(now - timedelta(hours=24), model_version="v2")["prediction"] == {}
+
+
+def test_drift_metrics_on_binned_counts():
+    """Identical histograms show no drift; a shifted one is flagged by every metric."""
+    from drift_aggregates import CONFIDENCE_BIN_EDGES
+    from drift_metrics import categorical_drift, numeric_drift
+
+    reference = {"Brown Rust": 50, "Healthy": 30, "Septoria": 20}
+    same = categorical_drift(reference, {"Brown Rust": 100, "Healthy": 60, "Septoria": 40})
+    assert same["psi"] < 1e-9 and same["jensen_shannon"] < 1e-6
+    assert same["chi_square_p_value"] > 0.99 and not same["drifted"]
+
+    shifted = categorical_drift(reference, {"Brown Rust": 10, "Healthy": 90, "Mildew": 100})
+    assert shifted["drifted"] and shifted["status"] == "significant"
+    assert shifted["chi_square_p_value"] < 0.05
+
+    confident = {"8": 90, "7": 10}
+    unsure = {"1": 60, "2": 40}
+    result = numeric_drift(confident, unsure, CONFIDENCE_BIN_EDGES)
+    assert result["ks"] == 1.0 and result["ks_p_value"] < 0.05
+    assert result["wasserstein"] > 30
+    assert numeric_drift(confident, confident, CONFIDENCE_BIN_EDGES)["wasserstein"] == 0
+
+
+def test_image_stats_feed_the_aggregates(app_context):
+    """Input statistics are stored as a 40-byte blob and counted as drift features."""
+    import numpy as np
+    from image_stats import compute_image_stats, image_stats_dict, pack_image_stats
+
+    dark = np.full((3, 224, 224), -2.0, dtype=np.float32)
+    blob = pack_image_stats(compute_image_stats(dark))
+    assert len(blob) == 40
+    assert image_stats_dict(blob)["brightness"] < 0.05
+
+    db.session.add(Feedback(image_url="leaf.jpg", predicted_class="Smut", confidence=80.0, image_stats=blob))
+    db.session.commit()
+    histograms = get_current_histograms()
+    assert histograms["brightness"] == {"0": 1}
+    assert histograms["blur"] == {"0": 1}
@@ -0,0 +1,74 @@
+"""Tests for the column-projected feedback data access layer."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from feedback_queries import (
+    admin_page,
+    count_admin_rows,
+    count_feedback,
+    load_feedback_frame,
+    parse_admin_filters,
+    resolve_window,
+)
+from models import Feedback, db
+
+
+def test_windows_and_chunked_loading(app_context):
+    """Only rows inside the window are read, and chunking does not change the result."""
+    now = datetime.utcnow()
+    for age_days, predicted_class in [(0, "Septoria"), (3, "Healthy"), (20, "Mildew"), (90, "Smut")]:
+        db.session.add(
+            Feedback(
+                image_url="leaf.jpg",
+                predicted_class=predicted_class,
+                confidence=90.0,
+                created_at=now - timedelta(days=age_days, minutes=1),
+                is_verified=predicted_class == "Healthy",
+            )
+        )
+    db.session.commit()
+
+    since, _ = resolve_window("7d")
+    frame = load_feedback_frame(["predicted_class", "confidence"], since=since, chunk_size=1)
+    assert sorted(frame["predicted_class"]) == ["Healthy", "Septoria"]
+
+    frame = load_feedback_frame(["predicted_class"], since=resolve_window("30d")[0], chunk_size=2)
+    assert len(frame) == 3
+    assert count_feedback() == 4
+    assert count_feedback(verified_only=True) == 1
+    assert load_feedback_frame(["confidence"], since=now + timedelta(days=1)).empty
+
+
+def test_admin_keyset_pages_and_filters(app_context):
+    """Pages never overlap or skip rows, even with identical timestamps, and filters apply server-side."""
+    now = datetime(2026, 5, 1, 12, 0)
+    for i in range(7):
+        db.session.add(
+            Feedback(
+                image_url=f"leaf{i}.jpg",
+                predicted_class="Septoria" if i % 2 else "Healthy",
+                confidence=40.0 + 10 * i,
+                created_at=now - timedelta(hours=i // 2),
+                is_verified=i < 2,
+            )
+        )
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = admin_page({}, cursor, limit=3)
+        seen.extend(row.image_url for row in rows)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(f"leaf{i}.jpg" for i in range(7))
+
+    filters = parse_admin_filters({"class": "Septoria", "confidence": "high", "status": "bogus", "from": "2026-13-01"})
+    assert filters == {"class": "Septoria", "confidence": "high"}
+    rows, cursor = admin_page(filters)
+    assert [row.confidence for row in rows] == [90.0] and cursor is None
+    assert count_admin_rows({"status": "verified"}) == 2
@@ -0,0 +1,36 @@
+"""Tests for the write-behind journal behind the JSON user and questionnaire stores."""
+
+import json
+
+from json_journal import JournaledJsonStore
+from user_data import UserData
+
+
+def test_changes_are_coalesced_and_replayed(tmp_path):
+    """Repeated writes to one key become one journal line, and a torn last line is ignored."""
+    path = tmp_path / "users.json"
+    store = JournaledJsonStore(str(path), flush_interval=60)
+    store.set("1", {"name": "a"})
+    store.set("1", {"name": "b"})
+    store.set("2", {"name": "c"})
+    store.flush()
+    assert len((tmp_path / "users.json.journal").read_text().splitlines()) == 2
+    assert not path.exists()
+
+    with open(tmp_path / "users.json.journal", "a") as f:
+        f.write('{"key": "3", "val')  # crash mid-append
+    assert JournaledJsonStore(str(path)).load() == {"1": {"name": "b"}, "2": {"name": "c"}}
+
+
+def test_compaction_rewrites_snapshot_and_empties_journal(tmp_path):
+    """Once the journal is long enough the snapshot is replaced atomically."""
+    path = tmp_path / "user_responses.json"
+    responses = UserData(str(path))
+    responses.store.compact_after = 3
+    for i in range(3):
+        responses.save_response(f"user{i}", {"soil_type": "Clay"})
+    responses.store.flush()
+
+    assert (tmp_path / "user_responses.json.journal").read_text() == ""
+    assert set(json.loads(path.read_text())) == {"user0", "user1", "user2"}
+    assert UserData(str(path)).get_user_responses("user1")[0]["soil_type"] == "Clay"
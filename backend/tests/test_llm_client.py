@@ -0,0 +1,75 @@
+"""Tests for retries, the concurrency limit and deadlines in the shared LLM client."""
+
+import asyncio
+import threading
+
+import pytest
+
+import llm_client
+from llm_client import LLMBusyError, LLMTimeoutError, with_retries
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+
+
+def run(coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, llm_client.get_loop()).result(timeout=10)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(llm_client, "LLM_QUEUE_TIMEOUT", 0.2)
+
+
+def test_rate_limits_are_retried_other_errors_are_not():
+    """429/503 are retried with backoff up to the limit; a 400 fails on the first attempt."""
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise StatusError(429 if len(calls) == 1 else 503)
+        return "ok"
+
+    assert run(with_retries(flaky, deadline=5)) == "ok"
+    assert len(calls) == 3
+
+    async def bad_request():
+        calls.append(1)
+        raise StatusError(400)
+
+    calls.clear()
+    with pytest.raises(StatusError):
+        run(with_retries(bad_request, deadline=5))
+    assert len(calls) == 1
+
+
+def test_deadline_and_busy_slots():
+    """A slow call hits its deadline, and callers beyond the concurrency limit fail fast."""
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(LLMTimeoutError):
+        run(with_retries(slow, deadline=0.05))
+
+    release = threading.Event()
+
+    async def hold():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    holders = [
+        asyncio.run_coroutine_threadsafe(with_retries(hold, deadline=5), llm_client.get_loop())
+        for _ in range(llm_client.LLM_MAX_CONCURRENCY)
+    ]
+    try:
+        with pytest.raises(LLMBusyError):
+            run(with_retries(hold, deadline=5))
+    finally:
+        release.set()
+        for holder in holders:
+            holder.result(timeout=5)
@@ -0,0 +1,161 @@
+"""Tests for the declarative highlight engine."""
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from overlay_utils import DISPATCHER, MaskContext, build_mask, highlight
+
+
+@pytest.fixture
+def leaf_image():
+    """Synthetic green leaf with a few rusty spots on a dark background."""
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+    cv2.ellipse(image, (160, 120), (130, 60), 0, 0, 360, (40, 160, 60), -1)
+    for center in [(100, 110), (150, 130), (210, 115)]:
+        cv2.circle(image, center, 6, (30, 80, 160), -1)
+    return image
+
+
+def test_every_class_renders(leaf_image):
+    """Every spec produces an annotated image of the same shape."""
+    for predicted_class in DISPATCHER:
+        output = highlight(leaf_image, predicted_class)
+        assert output.shape == leaf_image.shape
+
+
+def test_healthy_returns_original(leaf_image):
+    """Healthy predictions are passed through unchanged."""
+    assert highlight(leaf_image, "Healthy") is leaf_image
+
+
+def test_context_is_shared_across_specs(leaf_image):
+    """HSV and the leaf mask are computed once and reused by every spec."""
+    context = MaskContext(leaf_image)
+    build_mask(context, "Brown Rust")
+    hsv, leaf_mask = context.hsv, context.leaf_mask
+    build_mask(context, "Septoria")
+    assert context.hsv is hsv
+    assert context.leaf_mask is leaf_mask
+
+
+def test_brown_rust_mask_stays_on_leaf(leaf_image):
+    """Leaf-clipped specs never mark pixels outside the detected leaf."""
+    context = MaskContext(leaf_image)
+    mask = build_mask(context, "Brown Rust")
+    assert mask.any()
+    assert not np.any(mask[context.leaf_mask == 0])
+
+
+def test_large_upload_is_processed_at_working_size(leaf_image):
+    """Phone-size uploads are masked on the working image and drawn at display size."""
+    from overlay_utils import DISPLAY_MAX_SIDE, WORK_MAX_SIDE
+
+    large = cv2.resize(leaf_image, (4000, 3000), interpolation=cv2.INTER_NEAREST)
+    context = MaskContext(large)
+    assert max(context.work.shape[:2]) == WORK_MAX_SIDE
+    assert build_mask(context, "Brown Rust").shape == context.work.shape[:2]
+
+    output = highlight(large, "Brown Rust", context=context)
+    assert max(output.shape[:2]) == DISPLAY_MAX_SIDE
+
+
+def test_lesions_survive_downscaling(leaf_image):
+    """The same lesions are found regardless of the upload resolution."""
+    large = cv2.resize(leaf_image, (3200, 2400), interpolation=cv2.INTER_NEAREST)
+    small_context = MaskContext(leaf_image)
+    large_context = MaskContext(large)
+    small_contours = small_context.find_contours(build_mask(small_context, "Brown Rust"))
+    large_contours = large_context.find_contours(build_mask(large_context, "Brown Rust"))
+    assert len(small_contours) == len(large_contours) == 3
+
+
+def test_highlight_cache_renders_once_and_evicts(tmp_path):
+    """Overlays are rendered on the first miss only, and old entries are evicted."""
+    from highlight_cache import HighlightCache
+
+    cache = HighlightCache(str(tmp_path), max_entries=2)
+    renders = []
+
+    def render():
+        renders.append(1)
+        return b"overlay"
+
+    first, data = cache.get_or_render("a.webp", render)
+    assert data == b"overlay"
+    assert cache.get_or_render("a.webp", render) == (first, None)
+    assert len(renders) == 1
+
+    cache.get_or_render("b.webp", render)
+    cache.get_or_render("c.webp", render)
+    assert cache.get("a.webp") is None
+    assert not (tmp_path / "a.webp").exists()
+
+
+def test_render_highlight_returns_webp_bytes(leaf_image):
+    """Overlays are encoded in memory as WebP by default."""
+    from overlay_utils import render_highlight
+
+    data = render_highlight(leaf_image, "Brown Rust")
+    assert data[:4] == b"RIFF" and data[8:12] == b"WEBP"
+    assert render_highlight(leaf_image, "Not a class") is None
+
+
+def test_analyze_lesions_reports_vector_results(leaf_image):
+    """Lesion stats report one polygon and box per spot, in output coordinates."""
+    from overlay_utils import analyze_lesions
+
+    stats = analyze_lesions(leaf_image, "Brown Rust")
+    assert stats["lesion_count"] == 3
+    assert 0 < stats["infected_area_pct"] < 100
+    assert all(len(lesion["polygon"]) >= 3 for lesion in stats["lesions"])
+
+    doubled = analyze_lesions(leaf_image, "Brown Rust", output_size=(640, 480))
+    assert (doubled["width"], doubled["height"]) == (640, 480)
+    x, y, w, h = doubled["lesions"][0]["bbox"]
+    assert x + w <= 640 and y + h <= 480
+    assert analyze_lesions(leaf_image, "Healthy")["lesion_count"] == 0
+
+
+def test_cam_round_trip_and_render(leaf_image):
+    """CAMs are built from the feature map, survive URL packing and render as overlays."""
+    from overlay_utils import compute_cam, pack_cam, unpack_cam, render_highlight
+
+    features = np.zeros((4, 7, 7), dtype=np.float32)
+    features[0, 3, 3] = 1.0
+    cam = compute_cam(features, np.array([1.0, 0.0, 0.0, 0.0]))
+    assert cam.shape == (7, 7)
+    assert cam[3, 3] == 1.0 and cam.sum() == 1.0
+
+    restored = unpack_cam(pack_cam(cam))
+    assert np.allclose(restored, cam, atol=1 / 255)
+    assert unpack_cam("not-a-cam") is None
+
+    for mode in ("cam", "both"):
+        assert render_highlight(leaf_image, "Brown Rust", mode=mode, cam=restored)
+
+
+def test_lut_matches_in_range(leaf_image):
+    """The HSV lookup table reproduces cv2.inRange for every class range."""
+    from overlay_utils import CLASS_BITS
+
+    context = MaskContext(leaf_image)
+    for predicted_class, spec in DISPATCHER.items():
+        if spec is None:
+            continue
+        expected = np.zeros(context.hsv.shape[:2], dtype=np.uint8)
+        for lower, upper in spec["ranges"]:
+            expected |= cv2.inRange(context.hsv, np.array(lower), np.array(upper))
+        assert np.array_equal(context.color_mask(predicted_class), expected), predicted_class
+    assert len(set(CLASS_BITS.values())) == len(CLASS_BITS)
+
+
+def test_top_k_overlay_shares_one_lookup(leaf_image):
+    """Several classes are drawn from a single per-image lookup."""
+    context = MaskContext(leaf_image)
+    output = highlight(leaf_image, ["Brown Rust", "Septoria", "Healthy"], context=context)
+    assert output.shape == leaf_image.shape
+    bits = context.class_bits
+    highlight(leaf_image, ["Leaf Blight"], context=context)
+    assert context.class_bits is bits
@@ -0,0 +1,64 @@
+"""Tests for the bucketed recommendation cache."""
+
+import time
+
+from recommendation_cache import (
+    RecommendationCache,
+    generalize_recommendation,
+    personalize_recommendation,
+    recommendation_key,
+)
+
+
+def user_data(temp_c=28.5, humidity=65, loc="18.52,73.86", answers=None):
+    return {
+        "disease_detected": "Yellow Rust",
+        "location": {"city": "Pune", "loc": loc},
+        "weather": {"temp_c": temp_c, "humidity": humidity, "precip_mm": 0.0},
+        "questionnaire_answers": answers if answers is not None else {"soil_type": "Clay", "notes": ""},
+    }
+
+
+def test_key_buckets_similar_requests_together():
+    """Nearby farms in the same weather band with equivalent answers share a key."""
+    base = recommendation_key(user_data())
+    assert recommendation_key(user_data(temp_c=26, humidity=79, loc="18.7,73.6", answers={"Soil_Type": " clay "})) == base
+    assert recommendation_key(user_data(temp_c=31)) != base
+    assert recommendation_key(user_data(loc="28.6,77.2")) != base
+    assert recommendation_key(user_data(answers={"soil_type": "Sandy"})) != base
+
+
+def test_ttl_lru_and_persistence(tmp_path):
+    """Entries expire, the least recently used is evicted, and the journal restores the rest."""
+    path = str(tmp_path / "recommendations.json")
+    cache = RecommendationCache(ttl=3600, max_entries=2, path=path)
+    cache.put("a", "<p>A</p>")
+    cache.put("b", "<p>B</p>")
+    assert cache.get("a") == "<p>A</p>"
+    cache.put("c", "<p>C</p>")  # evicts b
+    assert cache.get("b") is None
+
+    cache.entries["c"] = (time.time() - 7200, "<p>C</p>")
+    assert cache.get("c") is None
+    cache.store.flush()
+
+    restored = RecommendationCache(ttl=3600, max_entries=2, path=path)
+    assert list(restored.entries) == ["a"]
+    assert cache.metrics()["hits"] == 1
+
+
+def test_cached_text_does_not_leak_another_farms_place_or_weather():
+    """A neighbour sharing the key sees their own town and readings, not the first requester's."""
+    first = user_data(temp_c=26.5)
+    first["location"]["city"] = "Hadapsar"
+    neighbour = user_data(temp_c=27.4, loc="18.61,73.77")
+    neighbour["location"]["city"] = "Khadakwasla"
+    assert recommendation_key(first) == recommendation_key(neighbour)
+
+    html = "<p>In Hadapsar it is 26.5°C at 65% humidity. Budget $5 per acre.</p>"
+    cached = generalize_recommendation(html, first)
+    assert "Hadapsar" not in cached and "26" not in cached
+    assert personalize_recommendation(cached, first) == html
+    assert personalize_recommendation(cached, neighbour) == (
+        "<p>In Khadakwasla it is 27.4°C at 65% humidity. Budget $5 per acre.</p>"
+    )
@@ -0,0 +1,140 @@
+"""Tests for streamed recommendations: the OpenAI stream helpers and the SSE route."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import llm_client
+import openai_integration
+
+CHUNKS = ["```html\n<div>", "<h3>Scientific", " Analysis</h3>", "</div>\n`", "``"]
+
+
+class FakeStreamingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for content in CHUNKS:
+            event = {
+                "id": "chatcmpl-test",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_openai():
+    pytest.importorskip("openai")
+    server = HTTPServer(("127.0.0.1", 0), FakeStreamingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm_client.configure(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    yield
+    llm_client.configure()
+    server.shutdown()
+
+
+def test_stream_yields_chunks_without_code_fence(fake_openai):
+    """Chunks arrive incrementally and the markdown fence is stripped on the fly."""
+    chunks = list(openai_integration.stream_openai_recommendation(openai_integration.sample_user_data))
+    assert len(chunks) > 1
+    assert "".join(chunks).strip() == "<div><h3>Scientific Analysis</h3></div>"
+
+
+def parse_sse(body):
+    """[(event, payload)] from an SSE body; plain data events have event None."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = None, None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client for the real app, logged in, with a fresh recommendation cache and one template."""
+    for module in ("onnxruntime", "cloudinary", "dotenv", "reportlab", "asgiref", "uvicorn", "flask_cors", "flask_login"):
+        pytest.importorskip(module)
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv("REPORT_SCHEDULER_ENABLED", "false")
+    monkeypatch.setenv("WEATHER_PREFETCH_ENABLED", "false")
+    import app as app_module
+    import recommendation_templates
+    from recommendation_cache import RecommendationCache
+
+    templates = tmp_path / "recommendation_templates.json"
+    templates.write_text(json.dumps({"templates": {"Yellow Rust": "<div>Yellow Rust in $city</div>"}}))
+    monkeypatch.setattr(recommendation_templates, "TEMPLATES_PATH", str(templates))
+    monkeypatch.setattr(app_module, "recommendation_cache", RecommendationCache(path=""))
+
+    with app_module.app.app_context():
+        user = app_module.user_db.get_user_by_username("streamer") or app_module.user_db.add_user("streamer", "secret")
+        user_id = user.id
+    test_client = app_module.app.test_client()
+    with test_client.session_transaction() as session:
+        session["_user_id"] = user_id
+        session["_fresh"] = True
+    return test_client, app_module
+
+
+def test_stream_route_sends_base_chunks_and_caches(client, monkeypatch):
+    """Template first, then the personalised chunks; the assembled page is cached for export and repeats."""
+    test_client, app_module = client
+    calls = []
+
+    def fake_stream(messages, **kwargs):
+        calls.append(messages)
+        yield from ["<p>Spray ", "after the rain</p>"]
+
+    monkeypatch.setattr(llm_client, "stream", fake_stream)
+    body = {"disease": "Yellow Rust", "weather_data": {"temperature": 18, "humidity": 85}}
+
+    response = test_client.post("/get-recommendations/stream", json=body)
+    assert response.mimetype == "text/event-stream"
+    events = parse_sse(response.get_data(as_text=True))
+    assert events[0][0] == "base" and "Yellow Rust in" in events[0][1]
+    assert [data for event, data in events if event is None] == ["<p>Spray ", "after the rain</p>"]
+    assert events[-1] == ("done", {"cached": False})
+
+    with test_client.session_transaction() as session:
+        key = session["last_recommendation_key"]
+    cached = app_module.recommendation_cache.get(key)
+    assert "Yellow Rust in" in cached and "<p>Spray after the rain</p>" in cached
+
+    events = parse_sse(test_client.post("/get-recommendations/stream", json=body).get_data(as_text=True))
+    assert events[-1] == ("done", {"cached": True})
+    assert "<p>Spray after the rain</p>" in events[0][1]
+    assert len(calls) == 1
+
+
+def test_stream_route_reports_llm_failures(client, monkeypatch):
+    """A failing LLM ends the stream with an error event and nothing is cached."""
+    test_client, app_module = client
+
+    def failing_stream(messages, **kwargs):
+        raise llm_client.LLMBusyError("LLM capacity exhausted")
+        yield
+
+    monkeypatch.setattr(llm_client, "stream", failing_stream)
+    response = test_client.post("/get-recommendations/stream", json={"disease": "Smut"})
+    events = parse_sse(response.get_data(as_text=True))
+    assert events[-1][0] == "error" and "unavailable" in events[-1][1]["message"]
+    assert app_module.recommendation_cache.metrics()["entries"] == 0
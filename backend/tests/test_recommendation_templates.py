@@ -0,0 +1,29 @@
+"""Tests for filling the prebuilt per-disease recommendation templates."""
+
+import json
+
+import recommendation_templates
+from recommendation_templates import PERSONALIZED_SLOT, render_base_recommendation
+
+
+def test_template_is_filled_and_escaped(tmp_path, monkeypatch):
+    """Placeholders take the farm's values (escaped), with defaults for unanswered questions."""
+    path = tmp_path / "recommendation_templates.json"
+    path.write_text(json.dumps({"templates": {
+        "Yellow Rust": "<p>$city: $temp_c°C, $humidity%. Soil: $soil_type. Irrigation: $irrigation_method. $5 spray</p>",
+    }}))
+    monkeypatch.setattr(recommendation_templates, "TEMPLATES_PATH", str(path))
+    user_data = {
+        "disease_detected": "Yellow Rust",
+        "location": {"city": "Pune <script>"},
+        "weather": {"temp_c": 18.5, "humidity": 85},
+        "questionnaire_answers": {"soil_type": "Clay"},
+    }
+
+    html = render_base_recommendation(user_data)
+    assert "<p>Pune &lt;script&gt;: 18.5°C, 85%. Soil: Clay. Irrigation: not specified. $5 spray</p>" in html
+    assert PERSONALIZED_SLOT in html
+
+    filled = render_base_recommendation(user_data, personalized="<ul><li>Spray after the rain</li></ul>")
+    assert '<div id="personalizedSection"><ul><li>Spray after the rain</li></ul></div>' in filled
+    assert render_base_recommendation({**user_data, "disease_detected": "Smut"}) is None
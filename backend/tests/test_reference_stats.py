@@ -0,0 +1,49 @@
+"""Tests for the cached reference dataset statistics."""
+
+import os
+
+import pytest
+
+pytest.importorskip("pandas")
+
+import reference_stats
+
+
+def test_stats_are_cached_until_the_content_changes(tmp_path, monkeypatch):
+    """Touching the file keeps the cache; new content or a sidecar reloads it."""
+    csv_path = tmp_path / "reference_data.csv"
+    csv_path.write_text(
+        "target,prediction,confidence,created_at\n"
+        "Septoria,Septoria,99.95,2026-06-11\n"
+        "Healthy,Septoria,55.0,2026-06-12\n"
+    )
+    monkeypatch.setattr(reference_stats, "REFERENCE_PATH", str(csv_path))
+    monkeypatch.setattr(reference_stats, "REFERENCE_SIDECAR_PATH", str(tmp_path / "reference_data.npz"))
+    monkeypatch.setattr(reference_stats, "_cached", None)
+
+    stats = reference_stats.get_reference_stats()
+    assert stats.class_counts == {"Septoria": 2}
+    assert stats.confidence_histogram == {"1": 1, "8": 1}
+    assert stats.accuracy == 0.5
+    assert stats.classes.tolist() == ["Healthy", "Septoria"]
+    assert stats.confusion.tolist() == [[0, 1], [0, 1]]
+
+    os.utime(csv_path, (1, 1))
+    assert reference_stats.get_reference_stats() is stats
+
+    with open(csv_path, "a") as f:
+        f.write("Mildew,Mildew,100.0,2026-06-13\n")
+    os.utime(csv_path, (2, 2))
+    reloaded = reference_stats.get_reference_stats()
+    assert reloaded is not stats and reloaded.rows == 3
+
+    reference_stats.write_reference_sidecar(str(csv_path), reference_stats.REFERENCE_SIDECAR_PATH)
+    from_sidecar = reference_stats.get_reference_stats()
+    assert from_sidecar.source.endswith(".npz")
+    assert from_sidecar.class_counts == reloaded.class_counts
+    assert from_sidecar.confidence_histogram == reloaded.confidence_histogram
+    assert from_sidecar.confusion_dict() == reloaded.confusion_dict()
+    assert from_sidecar.confusion.shape == (3, 3)
+
+    frame = reference_stats.load_reference_frame()
+    assert list(frame.columns) == ["target", "prediction", "confidence"] and len(frame) == 3
@@ -0,0 +1,31 @@
+"""Tests for background-generated report snapshots."""
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+import observability
+from report_worker import generate_report
+
+
+def test_snapshot_is_written_and_served_as_latest(tmp_path, monkeypatch):
+    """Generated reports land on disk with their timestamp and the newest one is picked."""
+    database = tmp_path / "feedback.db"
+    database_url = f"sqlite:///{database}"
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE feedback (predicted_class TEXT, confidence REAL)"))
+    engine.dispose()
+
+    reports_dir = tmp_path / "reports"
+    monkeypatch.setattr(observability, "REPORTS_DIR", str(reports_dir))
+    assert observability.get_latest_snapshot("drift") == (None, None)
+
+    path = generate_report("drift", database_url, str(reports_dir))
+    assert "No production predictions" in open(path).read()
+
+    latest, generated_at = observability.get_latest_snapshot("drift")
+    assert latest == path
+    assert generated_at is not None
@@ -0,0 +1,26 @@
+"""Tests for batched background image deletion."""
+
+from storage import DeletionQueue, LocalStorage, public_id_from_url
+
+
+def test_public_id_from_delivery_urls():
+    """Version and transformation segments are stripped; local uploads have no public id."""
+    url = "https://res.cloudinary.com/demo/image/upload/v1712345/wheat_disease/abc123.jpg"
+    assert public_id_from_url(url) == "wheat_disease/abc123"
+    thumb = "https://res.cloudinary.com/demo/image/upload/c_fill,w_160/v1/wheat_disease/x.png"
+    assert public_id_from_url(thumb) == "wheat_disease/x"
+    assert public_id_from_url("leaf.jpg") is None
+
+
+def test_ids_are_batched_and_failures_retried():
+    """Ids go out in batches; a failing id is retried and given up on after max_retries."""
+    storage = LocalStorage(fail_ids={"bad"})
+    queue = DeletionQueue(storage, batch_size=3, max_retries=2, backoff=0)
+    queue.enqueue(["a", "b", "bad", "c", None])
+
+    while queue.next_wait() is not None:
+        queue.run_once()
+
+    assert sorted(storage.deleted) == ["a", "b", "c"]
+    assert storage.calls == 2  # [a, b, bad], then [c, bad]
+    assert queue.failed == ["bad"]
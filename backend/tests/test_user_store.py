@@ -0,0 +1,53 @@
+"""Tests for the SQL-backed user store and the users.json migrator."""
+
+import json
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from models import SQLUserDB, User, db, migrate_users_json
+
+
+def test_users_are_stored_and_updated_per_row(app_context):
+    """Signup, lookup, duplicate names and in-place profile updates go through the table."""
+    store = SQLUserDB()
+    user = store.add_user("farmer", "secret", "farmer@example.com")
+    assert store.get_user_by_username("farmer").id == user.id
+    assert store.get_user_by_id(user.id).check_password("secret")
+    assert store.add_user("farmer", "other") is None
+
+    user.questionnaire_responses.update({"soil_type": "Clay"})
+    store.save_user(user)
+    db.session.expire_all()
+    assert store.get_user_by_id(user.id).questionnaire_responses == {"soil_type": "Clay"}
+
+    store.update_user(user.id, manual_location="Pune", location_consent=True)
+    assert store.get_user_by_username("farmer").manual_location == "Pune"
+
+
+def test_users_json_is_imported_once(app_context, tmp_path):
+    """Existing ids and hashes are kept, and a second run imports nothing."""
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps({
+        "1": {"id": "1", "username": "admin", "password_hash": "hash", "email": "admin@example.com"},
+        "2": {"id": "2", "username": "grower", "password_hash": "hash2", "email": "", "latitude": 18.5},
+    }))
+    assert migrate_users_json(str(path)) == 2
+    assert migrate_users_json(str(path)) == 0
+    assert db.session.get(User, "2").latitude == 18.5
+    assert db.session.get(User, "2").email is None
+
+
+def test_users_sharing_an_email_are_all_imported(app_context, tmp_path):
+    """The second user with a taken email keeps their account, just without the email."""
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps({
+        "2": {"id": "2", "username": "grower", "password_hash": "hash2", "email": "farm@example.com"},
+        "3": {"id": "3", "username": "grower2", "password_hash": "hash3", "email": "farm@example.com"},
+    }))
+    assert migrate_users_json(str(path)) == 2
+    assert db.session.get(User, "2").email == "farm@example.com"
+    assert db.session.get(User, "3").email is None
+    assert SQLUserDB().get_user_by_email("farm@example.com").username == "grower"
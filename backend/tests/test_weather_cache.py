@@ -0,0 +1,57 @@
+"""Tests for the geo-bucketed weather cache."""
+
+import time
+
+from weather_cache import WeatherCache, normalize_location
+from weather_prefetch import WeatherPrefetcher
+
+
+def test_nearby_coordinates_and_spellings_share_a_key():
+    """Coordinates snap to the grid cell centre and place names are canonicalised."""
+    assert normalize_location("18.5204,73.8567") == ("grid:18.5,73.9", "18.5,73.9")
+    assert normalize_location("18.54, 73.88")[0] == "grid:18.5,73.9"
+    assert normalize_location("  Pune ,India")[0] == normalize_location("pune, india")[0]
+    assert normalize_location(None)[0] == "place:pune, india"
+
+
+def test_ttl_stale_refresh_and_negative_caching():
+    """Fresh hits skip the fetch, stale hits refresh in the background, failures are cached."""
+    calls = []
+
+    def fetch(query):
+        calls.append(query)
+        return None if query == "Nowhere" else {"temperature": len(calls)}
+
+    cache = WeatherCache(fetch, ttl=60, stale_ttl=3600, negative_ttl=60)
+    assert cache.get("18.52,73.87") == {"temperature": 1}
+    assert cache.get("18.53,73.86") == {"temperature": 1}
+    assert cache.get("Nowhere") is None
+    assert cache.get("nowhere") is None
+    assert len(calls) == 2
+
+    key, _ = normalize_location("18.52,73.87")
+    cache.entries[key] = (time.monotonic() - 120, {"temperature": 1})
+    assert cache.get("18.52,73.87") == {"temperature": 1}  # stale value served immediately
+    for _ in range(100):
+        if cache.lookup(key)[1] == {"temperature": 3}:
+            break
+        time.sleep(0.01)
+    assert cache.get("18.52,73.87") == {"temperature": 3}
+
+    metrics = cache.metrics()
+    assert (metrics["misses"], metrics["negative_hits"], metrics["stale_hits"], metrics["refreshes"]) == (2, 1, 1, 1)
+
+
+def test_prefetcher_warms_active_locations_once_per_cell():
+    """Active users sharing a grid cell cost one fetch, and handlers then read without fetching."""
+    calls = []
+    cache = WeatherCache(lambda query: calls.append(query) or {"query": query}, ttl=900)
+    prefetcher = WeatherPrefetcher(cache, interval=60, concurrency=2, rate=0)
+    prefetcher.touch("1", "18.52,73.87")
+    prefetcher.touch("2", "18.53,73.88")
+    prefetcher.touch("3", "Nashik")
+
+    assert prefetcher.run_once() == 2
+    assert prefetcher.run_once() == 0  # still fresh
+    assert cache.peek("18.52,73.87") == {"query": "18.5,73.9"}
+    assert sorted(calls) == ["18.5,73.9", "Nashik"]
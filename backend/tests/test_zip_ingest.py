@@ -0,0 +1,106 @@
+"""Tests for streaming ZIP ingestion with background decoding and batched inference."""
+
+import csv
+import threading
+import time
+import zipfile
+from io import BytesIO, StringIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import zip_ingest
+from zip_ingest import classify_archive, manifest_csv, prefetch
+
+CLASS_NAMES = {0: "Healthy", 1: "Brown Rust"}
+
+
+def png_bytes(color):
+    buffer = BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def preprocess(image):
+    return np.zeros((1, 3, 224, 224), dtype=np.float32) + (image.getpixel((0, 0))[0] > 0)
+
+
+def infer(batch):
+    # Red images are "Brown Rust", black ones "Healthy"
+    return np.array([[0.2, 0.8] if item[0, 0, 0] else [0.9, 0.1] for item in batch])
+
+
+def build_archive(members):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, payload in members.items():
+            zf.writestr(name, payload)
+    buffer.seek(0)
+    return buffer
+
+
+def test_manifest_reports_each_member(monkeypatch):
+    """Good images are classified in batches; corrupt, oversized and non-image members fail per file."""
+    monkeypatch.setattr(zip_ingest, "ZIP_MAX_MEMBER_SIZE", 4096)
+    archive = build_archive({
+        "a.png": png_bytes("red"),
+        "b.png": png_bytes("black"),
+        "c.jpg": png_bytes("red"),
+        "broken.jpg": b"not an image",
+        "huge.png": b"\0" * 5000,
+        "notes.txt": b"field notes",
+        "__MACOSX/._a.png": b"",
+    })
+
+    results = classify_archive(archive, preprocess, infer, CLASS_NAMES, batch_size=2)
+    by_name = {row["file_name"]: row for row in results}
+    assert len(results) == 6
+    assert by_name["a.png"]["label"] == "Brown Rust"
+    assert by_name["a.png"]["confidence"] == "80.00%"
+    assert by_name["b.png"]["label"] == "Healthy"
+    assert by_name["c.jpg"]["status"] == "completed"
+    assert by_name["broken.jpg"]["error"] == "Invalid image file"
+    assert by_name["huge.png"]["error"] == "File too large"
+    assert by_name["notes.txt"]["error"] == "Invalid file type"
+
+    rows = list(csv.DictReader(StringIO(manifest_csv(results))))
+    assert [row["file_name"] for row in rows] == [row["file_name"] for row in results]
+    assert rows[0].keys() == {"file_name", "status", "label", "confidence", "error"}
+
+
+def test_invalid_archive_raises_bad_zip():
+    """The route turns this into a 400."""
+    with pytest.raises(zipfile.BadZipFile):
+        classify_archive(BytesIO(b"not a zip"), preprocess, infer, CLASS_NAMES)
+
+
+def test_prefetch_stops_producer_when_consumer_quits():
+    """Abandoning the generator drains the buffer so the producer thread exits."""
+    produced = []
+
+    def items():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    before = threading.active_count()
+    stream = prefetch(items(), depth=2)
+    assert [next(stream), next(stream)] == [0, 1]
+    stream.close()
+    deadline = time.monotonic() + 5
+    while threading.active_count() > before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() == before
+    assert len(produced) < 1000
+
+
+def test_prefetch_reraises_producer_errors():
+    def items():
+        yield 1
+        raise ValueError("decode failed")
+
+    stream = prefetch(items(), depth=2)
+    assert next(stream) == 1
+    with pytest.raises(ValueError):
+        next(stream)
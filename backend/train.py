@@ -60,6 +60,20 @@ def replace_layernorm(model):
             replace_layernorm(module)
     return model
 
+class ClassifierWithFeatures(nn.Module):
+    """
+    Export wrapper that returns the logits plus the head-normalized final feature map,
+    so the server can build class activation maps from the same forward pass.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        features = self.model.forward_features(x)
+        logits = self.model.forward_head(features)
+        return logits, self.model.head.norm(features)
+
 def freeze_backbone(model):
     """Freeze all layers except the classification head."""
     for p in model.parameters():
@@ -304,11 +318,20 @@ def main():
         dummy_input = torch.randn(1, 3, 224, 224)
         print("Exporting raw ONNX model...")
         torch.onnx.export(
-            model, dummy_input, raw_onnx_path,
+            ClassifierWithFeatures(model), dummy_input, raw_onnx_path,
             opset_version=16,
-            input_names=["input"], output_names=["output"],
-            dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}}
+            input_names=["input"], output_names=["output", "features"],
+            dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}, "features": {0: "batch"}}
+        )
+
+        # Classifier weights turn the exported feature map into a CAM for any class
+        cam_head_path = os.path.join(onnx_dir, "convnext_tiny_cam_head.npz")
+        np.savez(
+            cam_head_path,
+            weight=model.head.fc.weight.detach().numpy(),
+            bias=model.head.fc.bias.detach().numpy(),
         )
+        print(f"CAM head weights saved to: {cam_head_path}")
 
         # 5. Simplify ONNX model
         simp_onnx_path = os.path.join(onnx_dir, "convnext_tiny_simplified.onnx")
@@ -335,6 +358,7 @@ def main():
         print(f"Quantized INT8 ONNX model saved to: {quantized_onnx_path}")
         
         mlflow.log_artifact(quantized_onnx_path)
+        mlflow.log_artifact(cam_head_path)
         print("Model retraining and export successfully logged to MLflow!")
 
 if __name__ == "__main__":
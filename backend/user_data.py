@@ -1,34 +1,33 @@
-import json
-import os
+import threading
 from datetime import datetime
 
+from json_journal import JournaledJsonStore
+
 
 class UserData:
+    """Questionnaire answers per user; each new answer journals only that user's list."""
+
     def __init__(self, filename="user_responses.json"):
         self.filename = filename
         self.responses = {}
+        self.store = JournaledJsonStore(filename)
+        self.lock = threading.Lock()
         self.load_responses()
 
     def load_responses(self):
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, "r") as f:
-                    self.responses = json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                self.responses = {}
+        self.responses = self.store.load()
 
     def save_responses(self):
-        with open(self.filename, "w") as f:
-            json.dump(self.responses, f, indent=2)
+        for user_id, responses in self.responses.items():
+            self.store.set(user_id, responses)
 
     def save_response(self, user_id, response_data):
-        if user_id not in self.responses:
-            self.responses[user_id] = []
-
+        user_id = str(user_id)
         # Add timestamp to the response
         response_data["timestamp"] = datetime.now().isoformat()
-        self.responses[user_id].append(response_data)
-        self.save_responses()
+        with self.lock:
+            self.responses.setdefault(user_id, []).append(response_data)
+            self.store.set(user_id, self.responses[user_id])
 
     def get_user_responses(self, user_id):
         return self.responses.get(str(user_id), [])
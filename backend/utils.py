@@ -2,44 +2,30 @@ import os
 import json
 import requests
 from dotenv import load_dotenv
-from openai import OpenAI
+
+import llm_client
+from weather_cache import WeatherCache
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI API in a safe way so import errors
-# don't crash the whole app (e.g. if library/env mismatch)
-openai_api_key = os.getenv("OPENAI_API_KEY")
-client = None
-# Using gpt-4o-mini as a stable default
-model_name = "gpt-4o-mini"
-
-if openai_api_key:
-    try:
-        client = OpenAI(api_key=openai_api_key)
-    except Exception as e:
-        # Log the error but allow the app to start without LLM support
-        print(f"Failed to initialize OpenAI client: {e}")
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", 5))  # Seconds
 
 
-def get_weather_data(location=None):
+def fetch_weather_data(location):
     """
-    Fetch weather data using WeatherAPI
-    If location is None, defaults to Pune, India
+    Fetch weather data using WeatherAPI, bypassing the cache.
+    Returns None when the key is missing or the request fails.
     """
     weather_api_key = os.getenv("WEATHER_API_KEY")
     if not weather_api_key:
         return None
 
-    # Default to Pune if no location is provided
-    if not location:
-        location = "Pune, India"
-
     try:
         base_url = "http://api.weatherapi.com/v1/current.json"
         params = {"key": weather_api_key, "q": location, "aqi": "no"}
 
-        response = requests.get(base_url, params=params)
+        response = requests.get(base_url, params=params, timeout=WEATHER_TIMEOUT)
         if response.status_code == 200:
             data = response.json()
             current = data.get("current", {})
@@ -63,11 +49,22 @@ def get_weather_data(location=None):
     return None
 
 
+weather_cache = WeatherCache(fetch_weather_data)
+
+
+def get_weather_data(location=None):
+    """
+    Current weather for a location, served from the geo-bucketed cache.
+    If location is None, defaults to Pune, India
+    """
+    return weather_cache.get(location)
+
+
 def get_llm_recommendation(disease, questionnaire_data=None, weather_data=None):
     """
     Get treatment recommendations from OpenAI LLM
     """
-    if not openai_api_key or client is None:
+    if not llm_client.is_configured():
         return (
             "LLM integration is currently unavailable. "
             "Please ensure OPENAI_API_KEY is set and the OpenAI client is compatible."
@@ -116,10 +113,9 @@ Example structure:
 </div>
 """
 
-        # Generate content using OpenAI
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
+        # Generate content through the shared client (concurrency limit, backoff, deadline)
+        text = llm_client.chat(
+            [
                 {"role": "system", "content": "You are a helpful agricultural expert."},
                 {"role": "user", "content": prompt}
             ],
@@ -128,8 +124,8 @@ Example structure:
         )
 
         # Extract the generated text
-        if response and response.choices:
-            return response.choices[0].message.content
+        if text:
+            return text
         else:
             return "Failed to generate recommendations. Please try again later."
 
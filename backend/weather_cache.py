@@ -0,0 +1,197 @@
+"""In-process cache for current weather, keyed by a 0.1 degree grid cell or canonical place name."""
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+WEATHER_TTL = int(os.getenv("WEATHER_TTL", 15 * 60))  # Seconds an entry is served as fresh
+WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", 2 * 3600))  # Served while refreshing up to this age
+WEATHER_NEGATIVE_TTL = int(os.getenv("WEATHER_NEGATIVE_TTL", 120))  # Failed lookups are not retried sooner
+WEATHER_GRID_DEGREES = float(os.getenv("WEATHER_GRID_DEGREES", 0.1))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", 2000))
+DEFAULT_LOCATION = "Pune, India"
+
+COORDINATES_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def normalize_location(location, grid=WEATHER_GRID_DEGREES):
+    """
+    Returns (cache_key, query). 'lat,lon' strings snap to the centre of their grid cell, which
+    is also what gets sent upstream; anything else is treated as a place name.
+    """
+    location = location or DEFAULT_LOCATION
+    match = COORDINATES_PATTERN.match(str(location))
+    if match:
+        lat, lon = (round(float(value) / grid) * grid for value in match.groups())
+        decimals = max(0, len(f"{grid:f}".rstrip("0").split(".")[1]))
+        query = f"{lat:.{decimals}f},{lon:.{decimals}f}"
+        return f"grid:{query}", query
+
+    place = re.sub(r"\s*,\s*", ", ", re.sub(r"\s+", " ", str(location).strip().lower()))
+    return f"place:{place}", location.strip()
+
+
+class WeatherCache:
+    """
+    TTL cache around a fetch function that returns a weather dict, or None on failure.
+    Stale entries are served immediately while one background thread refreshes them, and
+    failures are cached for WEATHER_NEGATIVE_TTL so an outage does not add a timeout to every page.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        ttl=WEATHER_TTL,
+        stale_ttl=WEATHER_STALE_TTL,
+        negative_ttl=WEATHER_NEGATIVE_TTL,
+        max_entries=WEATHER_CACHE_MAX_ENTRIES,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (fetched_at, value); value None for a cached failure
+        self.failed_refreshes = {}  # key -> time of the last failed background refresh
+        self.refreshing = set()
+        self.key_locks = {}
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                self.key_locks.pop(evicted, None)
+
+    def get(self, location=None):
+        key, query = normalize_location(location)
+        entry = self.lookup(key)
+        if entry is not None:
+            fetched_at, value = entry
+            age = time.monotonic() - fetched_at
+            if value is None and age < self.negative_ttl:
+                self.count("negative_hits")
+                return None
+            if value is not None and age < self.ttl:
+                self.count("hits")
+                return value
+            if value is not None and age < self.stale_ttl:
+                self.count("stale_hits")
+                self.refresh_in_background(key, query)
+                return value
+
+        # Miss: one request per key, concurrent callers wait for it
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self.lookup(key)
+            if entry is not None:
+                # Filled by another thread while this one waited
+                fetched_at, value = entry
+                if time.monotonic() - fetched_at < (self.ttl if value is not None else self.negative_ttl):
+                    self.count("hits")
+                    return value
+            self.count("misses")
+            value = self.fetch_safely(query)
+            self.store(key, value)
+            return value
+
+    def fetch_safely(self, query):
+        try:
+            value = self.fetch(query)
+        except Exception as e:
+            print(f"Weather fetch failed for {query}: {e}")
+            value = None
+        if value is None:
+            self.count("errors")
+        return value
+
+    def peek(self, location=None):
+        """
+        Non-blocking read for request handlers: returns whatever is cached, even if stale, and
+        schedules a background fetch when the entry is missing or past its TTL.
+        """
+        key, query = normalize_location(location)
+        entry = self.lookup(key)
+        if entry is None:
+            self.count("misses")
+            self.refresh_in_background(key, query)
+            return None
+        fetched_at, value = entry
+        age = time.monotonic() - fetched_at
+        if value is None:
+            self.count("negative_hits")
+            if age >= self.negative_ttl:
+                self.refresh_in_background(key, query)
+            return None
+        if age < self.ttl:
+            self.count("hits")
+        else:
+            self.count("stale_hits")
+            self.refresh_in_background(key, query)
+        return value
+
+    def age(self, key):
+        """Seconds since the entry for a normalised key was fetched, or None if it isn't cached."""
+        entry = self.lookup(key)
+        return None if entry is None else time.monotonic() - entry[0]
+
+    def refresh(self, key, query):
+        """Fetches and stores one key; a failure keeps any stale value that is already cached."""
+        self.count("refreshes")
+        value = self.fetch_safely(query)
+        with self.lock:
+            if value is not None:
+                self.failed_refreshes.pop(key, None)
+            else:
+                self.failed_refreshes[key] = time.monotonic()
+            keep_stale = value is None and self.entries.get(key, (0, None))[1] is not None
+        if not keep_stale:
+            self.store(key, value)
+        return value
+
+    def refresh_in_background(self, key, query, executor=None):
+        """
+        Starts at most one refresh per key, backing off after a failed one. Runs on `executor`
+        when given (returning its future), otherwise on a new daemon thread.
+        """
+        with self.lock:
+            failed_at = self.failed_refreshes.get(key)
+            if key in self.refreshing or (failed_at and time.monotonic() - failed_at < self.negative_ttl):
+                return None
+            self.refreshing.add(key)
+
+        def run():
+            try:
+                return self.refresh(key, query)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        if executor is not None:
+            return executor.submit(run)
+        threading.Thread(target=run, daemon=True, name="weather-refresh").start()
+        return None
+
+    def metrics(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["entries"] = len(self.entries)
+        lookups = counters["hits"] + counters["stale_hits"] + counters["negative_hits"] + counters["misses"]
+        counters["hit_ratio"] = round(1 - counters["misses"] / lookups, 4) if lookups else None
+        return counters
@@ -0,0 +1,96 @@
+"""Background refresh of cached weather for recently active users' locations."""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from weather_cache import normalize_location
+
+WEATHER_PREFETCH_INTERVAL = int(os.getenv("WEATHER_PREFETCH_INTERVAL", 60))  # Seconds between passes
+WEATHER_ACTIVE_WINDOW = int(os.getenv("WEATHER_ACTIVE_WINDOW", 24 * 3600))  # Users seen within this are active
+WEATHER_PREFETCH_CONCURRENCY = int(os.getenv("WEATHER_PREFETCH_CONCURRENCY", 4))
+WEATHER_PREFETCH_RATE = float(os.getenv("WEATHER_PREFETCH_RATE", 2))  # Upstream requests per second
+
+
+class WeatherPrefetcher:
+    """Refreshes active locations shortly before their cache entries expire, with bounded concurrency and rate."""
+
+    def __init__(
+        self,
+        cache,
+        interval=WEATHER_PREFETCH_INTERVAL,
+        active_window=WEATHER_ACTIVE_WINDOW,
+        concurrency=WEATHER_PREFETCH_CONCURRENCY,
+        rate=WEATHER_PREFETCH_RATE,
+    ):
+        self.cache = cache
+        self.interval = interval
+        self.active_window = active_window
+        self.rate = rate
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="weather-prefetch")
+        self.active = {}  # user id -> (location query, last seen)
+        self.lock = threading.Lock()
+        self.prefetched = 0
+        self.thread = None
+
+    def touch(self, user_id, location):
+        """Records that a user with this saved location was just active."""
+        with self.lock:
+            self.active[str(user_id)] = (location, time.monotonic())
+
+    def due_locations(self):
+        """
+        {cache key: query} for active users whose entry is missing or expires before the next
+        pass. Users idle for longer than the active window are dropped.
+        """
+        now = time.monotonic()
+        with self.lock:
+            for user_id, (_, seen) in list(self.active.items()):
+                if now - seen > self.active_window:
+                    del self.active[user_id]
+            locations = [location for location, _ in self.active.values()]
+
+        due = {}
+        for location in locations:
+            key, query = normalize_location(location)
+            age = self.cache.age(key)
+            if age is None or age > self.cache.ttl - self.interval:
+                due[key] = query
+        return due
+
+    def run_once(self):
+        """Submits one pass of refreshes, paced to the rate limit; returns how many were submitted."""
+        due = self.due_locations()
+        futures = []
+        for key, query in due.items():
+            # Skipped if a handler already triggered a refresh for this key
+            future = self.cache.refresh_in_background(key, query, self.executor)
+            if future is None:
+                continue
+            futures.append(future)
+            if self.rate > 0:
+                time.sleep(1 / self.rate)
+        for future in futures:
+            future.result()
+        self.prefetched += len(futures)
+        return len(futures)
+
+    def run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Weather prefetch error: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        """Starts the daemon thread once and returns it."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True, name="weather-prefetcher")
+            self.thread.start()
+        return self.thread
+
+    def metrics(self):
+        with self.lock:
+            active_users = len(self.active)
+        return {"active_users": active_users, "prefetched": self.prefetched}